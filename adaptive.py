@@ -0,0 +1,254 @@
+import numpy as np
+
+from metrics import DEFAULT_TOLERANCE
+from simulation import G, PROGRESS_STEPS
+
+# Domyślny budżet błędu wysokości [m] na krok (interpolacja i przełączenia nasycenia)
+DEFAULT_ERROR_TOLERANCE = 1e-3
+
+# Granice długości kroku [s]; kroki są z drabinki MAX_STEP / 2**k
+MAX_STEP = 0.5
+MIN_STEP = 1e-4
+
+# Krok początkowy - przebieg zaczyna się od skoku wartości zadanej
+FIRST_STEP = 0.01
+
+# Krok siatki wyjściowej [s]
+DEFAULT_OUTPUT_DT = 0.01
+
+
+def continuous_matrices(drone, target_height, Kp, Ti, Td):
+    """
+    Macierze układu ciągłego z regulatorem PID dla trzech trybów ciągu
+
+    Stan rozszerzony y = [h, v, I, 1], gdzie I to całka uchybu. Regulator
+    ciągły liczy pochodną z pomiaru (de/dt = -v przy stałej wartości
+    zadanej), więc ciąg u = Kp * (r - h + I / Ti - Td * v) jest liniową
+    funkcją stanu. W każdym trybie (ciąg obcięty do 0, liniowy, obcięty
+    do max_thrust) układ jest liniowy: dy/dt = M y.
+
+    Zwraca: słownik tryb -> M (4x4) oraz wektor c, dla którego u = c @ y.
+    """
+    r = float(target_height)
+    mass = drone.mass
+    c = np.array([-Kp, -Kp * Td, Kp / Ti, Kp * r])
+
+    matrices = {}
+    for mode, thrust in (('min', 0.0), ('max', drone.max_thrust)):
+        M = np.zeros((4, 4))
+        M[0, 1] = 1.0
+        M[1, 3] = thrust / mass - G
+        M[2, 0], M[2, 3] = -1.0, r
+        matrices[mode] = M
+    M = matrices['min'].copy()
+    M[1] = c / mass
+    M[1, 3] -= G
+    matrices['linear'] = M
+    return matrices, c
+
+
+def _mode(thrust, max_thrust):
+    if thrust < 0:
+        return 'min'
+    if thrust > max_thrust:
+        return 'max'
+    return 'linear'
+
+
+def _locate_switch(M, y, c, bound, lo, hi, time_tolerance=1e-10):
+    """
+    Chwila przekroczenia granicy ciągu w przedziale (lo, hi] metodą regula falsi (Illinois)
+
+    Zwraca koniec przedziału po stronie przekroczenia, dzięki czemu stan
+    w zwróconej chwili należy już do nowego trybu.
+    """
+    from scipy.linalg import expm
+
+    def g(tau):
+        return c @ (expm(M * tau) @ y) - bound
+
+    g_lo, g_hi = g(lo), g(hi)
+    side = 0
+    while hi - lo > time_tolerance:
+        mid = hi - g_hi * (hi - lo) / (g_hi - g_lo) if g_hi != g_lo else 0.5 * (lo + hi)
+        if not lo < mid < hi:
+            mid = 0.5 * (lo + hi)
+        g_mid = g(mid)
+        if (g_mid > 0) == (g_hi > 0):
+            hi, g_hi = mid, g_mid
+            if side == 1:
+                g_lo /= 2
+            side = 1
+        else:
+            lo, g_lo = mid, g_mid
+            if side == -1:
+                g_hi /= 2
+            side = -1
+    return hi
+
+
+def simulate_adaptive(drone, target_height, initial_height, Kp, Ti, Td, duration=60,
+                      tolerance=DEFAULT_ERROR_TOLERANCE, hold_time=None, band=DEFAULT_TOLERANCE,
+                      output_dt=DEFAULT_OUTPUT_DT, max_step=MAX_STEP, min_step=MIN_STEP, reference=False,
+                      return_velocity=False, progress=None):
+    """
+    Symulacja modelu ciągłego ze zmiennym krokiem sterowanym budżetem błędu
+
+    To inny model niż w silnikach o stałym kroku: regulator jest ciągły
+    (analogowy) i liczy pochodną z pomiaru (continuous_matrices), a nie
+    dyskretnym PID z pochodną uchybu próbkowanym co dt
+    (simulation.PIDController). Dyskretnego regulatora nie da się
+    symulować z krokiem dłuższym niż okres próbkowania, więc silnik
+    adaptacyjny pozostaje modelem ciągłym, a różnicę względem modelu
+    dyskretnego można zmierzyć (reference=True).
+
+    W obrębie kroku tryb ciągu jest stały, a układ liniowy, więc stan na
+    końcu kroku liczony jest dokładnie (exp(M * dt), z pamięcią dla każdej
+    długości kroku z drabinki). Błąd pochodzi z dwóch źródeł:
+    - interpolacji na siatkę wyjściową (wielomian Hermite'a na węzłach
+      kroków) - szacowany w połowie kroku i utrzymywany poniżej tolerance,
+    - położenia przełączeń nasycenia - krok, w którym zmienia się tryb
+      ciągu, jest skracany, dopóki różnica wyników obu trybów przekracza
+      tolerance (albo do min_step).
+    W spokojnych fragmentach krok rośnie do max_step, przy zmianach trybu
+    i na początku przebiegu maleje.
+
+    Parametry:
+    tolerance: dopuszczalny błąd wysokości na krok [m]
+    hold_time: przy podaniu symulacja kończy się, gdy wysokość pozostaje
+        w tunelu ±band * |target_height| przez hold_time sekund
+    output_dt: krok jednorodnej siatki wyjściowej
+    reference: policz też największą różnicę wysokości względem modelu
+        dyskretnego o stałym kroku output_dt (simulate_hybrid)
+    return_velocity: zwróć też prędkość v z interpolacji (t, h, v, u, info)
+    progress: funkcja progress(fraction) wywoływana co PROGRESS_STEPS
+        kroków (może przerwać obliczenia wyjątkiem, np. jobs.JobCancelled)
+
+    Zwraca: t, h, u na siatce output_dt oraz słownik z liczbą kroków
+    (steps, rejected), oszacowaniem błędu całkowania modelu ciągłego
+    (error_estimate - suma lokalnych oszacowań), czasem końca symulacji
+    (stop_time), a przy reference=True - różnicą względem modelu
+    dyskretnego (reference_error) [m].
+    """
+    from scipy.interpolate import CubicHermiteSpline
+    from scipy.linalg import expm
+
+    matrices, c = continuous_matrices(drone, target_height, Kp, Ti, Td)
+    max_thrust = drone.max_thrust
+    mass = drone.mass
+    r = float(target_height)
+    width = band * abs(r)
+
+    transitions = {}
+
+    def transition(mode, level):
+        key = (mode, level)
+        if key not in transitions:
+            transitions[key] = expm(matrices[mode] * (max_step / 2 ** level))
+        return transitions[key]
+
+    def derivative(y):
+        thrust = min(max(c @ y, 0.0), max_thrust)
+        return [y[1], thrust / mass - G, r - y[0]]
+
+    max_level = max(int(np.ceil(np.log2(max_step / min_step))), 0)
+    level = min(max(int(round(np.log2(max_step / FIRST_STEP))), 0), max_level)
+
+    y = np.array([float(initial_height), 0.0, 0.0, 1.0])
+    time = 0.0
+    nodes_t = [time]
+    nodes_y = [y[:3]]
+    nodes_dy = [derivative(y)]
+    steps = rejected = switches = 0
+    error_estimate = 0.0
+    in_band_since = None
+    while time < duration - 1e-12:
+        while level < max_level and time + max_step / 2 ** level > duration + 1e-12:
+            level += 1
+        dt = min(max_step / 2 ** level, duration - time)
+        mode = _mode(c @ y, max_thrust)
+        if dt == max_step / 2 ** level:
+            half = transition(mode, level + 1)
+        else:
+            half = expm(matrices[mode] * (dt / 2))
+        y_mid = half @ y
+        y_end = half @ y_mid
+
+        mid_mode = _mode(c @ y_mid, max_thrust)
+        end_mode = _mode(c @ y_end, max_thrust)
+        if mid_mode != mode or end_mode != mode:
+            # Zmiana trybu w kroku - krok kończy się dokładnie w chwili przełączenia
+            # Z nasycenia wychodzi się przez tę samą granicę; z trybu liniowego - przez pierwszą przekroczoną
+            other = mid_mode if mid_mode != mode else end_mode
+            bound = 0.0 if mode == 'min' or (mode == 'linear' and other == 'min') else max_thrust
+            lo, hi = (0.0, dt / 2) if mid_mode != mode else (dt / 2, dt)
+            dt = _locate_switch(matrices[mode], y, c, bound, lo, hi)
+            y_mid = expm(matrices[mode] * (dt / 2)) @ y
+            y_end = expm(matrices[mode] * dt) @ y
+            switches += 1
+
+        # Błąd interpolacji Hermite'a w połowie kroku
+        hermite_mid = 0.5 * (y[0] + y_end[0]) + dt / 8 * (y[1] - y_end[1])
+        error = abs(hermite_mid - y_mid[0])
+        if error > tolerance and level < max_level:
+            level += 1
+            rejected += 1
+            continue
+
+        steps += 1
+        error_estimate += error
+        if steps % PROGRESS_STEPS == 0 and progress is not None:
+            progress(time / duration)
+        # Przełączenie tuż po początku kroku - pomijalnie krótki krok nie dostaje węzłów interpolacji
+        if dt > 1e-9:
+            for node_time, node in ((time + dt / 2, y_mid), (time + dt, y_end)):
+                nodes_t.append(node_time)
+                nodes_y.append(node[:3])
+                nodes_dy.append(derivative(node))
+        time += dt
+        y = y_end
+
+        if hold_time is not None:
+            for node_time, node in ((time - dt / 2, y_mid), (time, y_end)):
+                if abs(node[0] - r) <= width:
+                    if in_band_since is None:
+                        in_band_since = node_time
+                else:
+                    in_band_since = None
+            if in_band_since is not None and time - in_band_since >= hold_time:
+                break
+
+        # Mały błąd - dłuższy krok (błąd interpolacji rośnie jak dt^4)
+        if level > 0 and error < tolerance / 16:
+            level -= 1
+
+    nodes_t = np.array(nodes_t)
+    spline = CubicHermiteSpline(nodes_t, np.array(nodes_y), np.array(nodes_dy), axis=0)
+    t = np.arange(0, time + 1e-9, output_dt)
+    t = t[t <= time + 1e-9]
+    h, v, integral = spline(t).T
+    u = np.clip(c[0] * h + c[1] * v + c[2] * integral + c[3], 0, max_thrust)
+    info = {
+        'steps': steps,
+        'rejected': rejected,
+        'switches': switches,
+        'error_estimate': error_estimate,
+        'stop_time': time,
+    }
+    if reference:
+        info['reference_error'] = reference_error(drone, target_height, initial_height, Kp, Ti, Td, t, h)
+    if return_velocity:
+        return t, h, v, u, info
+    return t, h, u, info
+
+
+def reference_error(drone, target_height, initial_height, Kp, Ti, Td, t, h):
+    """Największa różnica wysokości [m] względem modelu dyskretnego o stałym kroku t[1] - t[0] na siatce t"""
+    from hybrid import simulate_hybrid
+
+    if len(t) < 2:
+        return 0.0
+    dt = t[1] - t[0]
+    _, h_ref, _ = simulate_hybrid(drone, target_height, initial_height, Kp, Ti, Td, duration=len(t) * dt, dt=dt)
+    n = min(len(h), len(h_ref))
+    return float(np.max(np.abs(h[:n] - h_ref[:n])))
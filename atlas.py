@@ -0,0 +1,284 @@
+"""
+Atlas odpowiedzi - przebiegi policzone wcześniej na gęstej siatce parametrów
+
+Budowa (offline, raz po zmianie modelu lub siatki):
+    python atlas.py atlas/ --workers 8
+
+Atlas to katalog z plikami .npy (trajectories.npy, metrics.npy) i opisem
+siatki (atlas.json). Pliki otwierane są przez np.load(mmap_mode='r'), więc
+wszystkie procesy serwera współdzielą te same strony pamięci systemu
+operacyjnego, a odczyt przebiegu to tylko dostęp do kilku węzłów siatki.
+
+Model jest niezmienniczy względem przesunięcia wysokości (regulator widzi
+tylko uchyb, brak ograniczenia h >= 0), dlatego siatka obejmuje skok
+wysokości (target - initial), a przebiegi zapisywane są względem
+wysokości początkowej.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from metrics import step_response_metrics
+from parallel import default_workers
+from simulation import DRONES, simulate_batch
+
+ATLAS_VERSION = 1
+
+# Domyślna siatka: skok wysokości [m] i nastawy z zakresów suwaków
+DEFAULT_STEPS = (-50.0, -20.0, -10.0, -5.0, -1.0, 1.0, 5.0, 10.0, 20.0, 50.0, 100.0)
+DEFAULT_KP = tuple(float(k) for k in range(0, 101, 10))
+DEFAULT_TI = (0.5, 1.0, 2.0, 3.0, 4.0, 6.0, 8.0, 10.0)
+DEFAULT_TD = (0.25, 0.5, 1.0, 1.5, 3.0, 5.0)
+AXES = ('step', 'Kp', 'Ti', 'Td')
+
+# Co który krok symulacji zapisywana jest próbka przebiegu
+DEFAULT_SAMPLE_EVERY = 10
+
+METRIC_FIELDS = ('settling_time', 'overshoot_percent', 'rise_time', 'peak_time', 'steady_state_error',
+                 'iae', 'ise', 'itae', 'control_effort', 'saturation_time', 'saturation_fraction')
+
+# Metryki powiązane z indeksami próbek (settling_index, peak_index, peak_value) - w atlasie
+# liczone zawsze z próbek, żeby czas i punkt na wykresie pochodziły z tego samego przebiegu
+SAMPLED_FIELDS = ('settling_time', 'peak_time', 'overshoot_percent')
+
+# Względna tolerancja uznania parametru za węzeł siatki
+NODE_TOLERANCE = 1e-9
+
+
+def _simulate_slice(drone, step, kp_values, ti_values, td_values, duration, dt, sample_every):
+    """Wszystkie nastawy dla jednego drona i skoku: próbki (n_kp, n_ti, n_td, 2, n_samples) i metryki"""
+    Kp, Ti, Td = (axis.ravel() for axis in np.meshgrid(kp_values, ti_values, td_values, indexing='ij'))
+    t, h, u = simulate_batch(drone, step, 0.0, Kp, Ti, Td, duration=duration, dt=dt)
+    metrics = step_response_metrics(t, h, step, 0.0, u=u, max_thrust=drone.max_thrust)
+    shape = (len(kp_values), len(ti_values), len(td_values))
+    samples = np.stack([h[:, ::sample_every], u[:, ::sample_every]], axis=1).astype(np.float32)
+    values = np.column_stack([metrics[name] for name in METRIC_FIELDS])
+    return samples.reshape(shape + samples.shape[1:]), values.reshape(shape + (len(METRIC_FIELDS),))
+
+
+def build_atlas(path, drone_keys=None, steps=DEFAULT_STEPS, kp_values=DEFAULT_KP, ti_values=DEFAULT_TI,
+                td_values=DEFAULT_TD, duration=60, dt=0.01, sample_every=DEFAULT_SAMPLE_EVERY, workers=None,
+                progress=None):
+    """
+    Budowa atlasu w katalogu path
+
+    Jednostką pracy jest para (dron, skok) - wszystkie nastawy liczone są
+    jednym simulate_batch w osobnym procesie, a wynik od razu trafia do
+    pliku mapowanego w pamięci (pamięć procesu nie zależy od rozmiaru
+    atlasu). Opis siatki zapisywany jest na końcu, więc przerwana budowa
+    nie zostawia atlasu, który dałoby się otworzyć.
+
+    Zwraca: opis atlasu (zawartość atlas.json)
+    """
+    drone_keys = list(DRONES) if drone_keys is None else list(drone_keys)
+    drones = [DRONES[key] for key in drone_keys]
+    axes = {name: [float(x) for x in values]
+            for name, values in zip(AXES, (steps, kp_values, ti_values, td_values))}
+    for name, values in axes.items():
+        if list(values) != sorted(set(values)):
+            raise ValueError(f"Oś {name} musi być rosnąca i bez powtórzeń")
+    if min(axes['Ti']) <= 0:
+        raise ValueError("Wartości Ti muszą być dodatnie")
+
+    n_samples = len(range(0, len(np.arange(0, duration, dt)), sample_every))
+    grid_shape = (len(drones),) + tuple(len(values) for values in axes.values())
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, 'atlas.json')
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    trajectories = np.lib.format.open_memmap(os.path.join(path, 'trajectories.npy'), mode='w+',
+                                             dtype=np.float32, shape=grid_shape + (2, n_samples))
+    metrics = np.lib.format.open_memmap(os.path.join(path, 'metrics.npy'), mode='w+',
+                                        dtype=np.float64, shape=grid_shape + (len(METRIC_FIELDS),))
+
+    units = [(d, s) for d in range(len(drones)) for s in range(len(axes['step']))]
+    with ProcessPoolExecutor(max_workers=workers or default_workers(),
+                             mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(_simulate_slice, drones[d], axes['step'][s], axes['Kp'], axes['Ti'], axes['Td'],
+                               duration, dt, sample_every): (d, s) for d, s in units}
+        for done, future in enumerate(futures, 1):
+            d, s = futures[future]
+            trajectories[d, s], metrics[d, s] = future.result()
+            if progress is not None:
+                progress(done, len(units))
+    trajectories.flush()
+    metrics.flush()
+    del trajectories, metrics
+
+    meta = {
+        'version': ATLAS_VERSION,
+        'drones': [{'label': key, 'mass': drone.mass, 'max_thrust': drone.max_thrust}
+                   for key, drone in zip(drone_keys, drones)],
+        'axes': axes,
+        'duration': float(duration),
+        'dt': float(dt),
+        'sample_every': int(sample_every),
+        'metrics': list(METRIC_FIELDS),
+    }
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    return meta
+
+
+def _bracket(axis, value):
+    """Indeksy sąsiednich węzłów i waga górnego; None poza zakresem osi"""
+    scale = NODE_TOLERANCE * max(abs(axis[0]), abs(axis[-1]), 1.0)
+    if value < axis[0] - scale or value > axis[-1] + scale:
+        return None
+    upper = int(np.clip(np.searchsorted(axis, value), 1, len(axis) - 1)) if len(axis) > 1 else 0
+    for index in (upper - 1, upper):
+        if abs(axis[index] - value) <= scale:
+            return index, index, 0.0
+    lower = upper - 1
+    return lower, upper, (value - axis[lower]) / (axis[upper] - axis[lower])
+
+
+class ResponseAtlas:
+    """
+    Atlas otwarty tylko do odczytu (tablice mapowane w pamięci)
+
+    lookup() zwraca przebieg dla dokładnego węzła siatki albo interpolację
+    wieloliniową z 2**k sąsiednich węzłów (k - liczba parametrów spoza
+    węzłów); poza siatką, dla innego drona lub innych dt / duration - None.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'atlas.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != ATLAS_VERSION:
+            raise ValueError(f"Nieobsługiwana wersja atlasu: {meta.get('version')}")
+        self.path = path
+        self.meta = meta
+        self.axes = {name: np.asarray(meta['axes'][name]) for name in AXES}
+        self.duration = meta['duration']
+        self.dt = meta['dt']
+        self.trajectories = np.load(os.path.join(path, 'trajectories.npy'), mmap_mode='r')
+        self.metrics = np.load(os.path.join(path, 'metrics.npy'), mmap_mode='r')
+        self.t = np.arange(0, self.duration, self.dt)[::meta['sample_every']]
+        self._drones = [(entry['mass'], entry['max_thrust']) for entry in meta['drones']]
+
+    def _drone_index(self, drone):
+        # Dron rozpoznawany po parametrach, a nie etykiecie - dron własny o tych samych parametrach też trafia
+        try:
+            return self._drones.index((drone.mass, drone.max_thrust))
+        except ValueError:
+            return None
+
+    def lookup(self, drone, target_height, initial_height, Kp, Ti, Td, duration=60, dt=0.01, interpolate=True):
+        """
+        Przebieg z atlasu
+
+        Przebiegi przechowywane są co sample_every kroków, więc metryki
+        liczone są z próbek (dokładność czasów rzędu kroku próbkowania);
+        w węzłach startujących z ziemi metryki bez indeksu próbki (całkowe,
+        czas narastania, nasycenie) zastępowane są wartościami zapisanymi
+        przy budowie z pełnej rozdzielczości. Czas ustalania i szczyt
+        (SAMPLED_FIELDS) zawsze pochodzą z próbek, razem ze swoimi indeksami.
+
+        Zwraca: t, h, u, metryki i rodzaj odpowiedzi ('exact' lub
+        'interpolated') albo None, gdy zapytanie wykracza poza atlas
+        (lub wymaga interpolacji przy interpolate=False).
+        """
+        if not (np.isclose(duration, self.duration) and np.isclose(dt, self.dt)):
+            return None
+        drone_index = self._drone_index(drone)
+        if drone_index is None:
+            return None
+        brackets = [_bracket(self.axes[name], float(value))
+                    for name, value in zip(AXES, (target_height - initial_height, Kp, Ti, Td))]
+        if any(bracket is None for bracket in brackets):
+            return None
+
+        # Węzły narożne z niezerową wagą (w węźle dokładnym - jeden)
+        if not interpolate and any(weight for _, _, weight in brackets):
+            return None
+        corners = [((), 1.0)]
+        for lower, upper, weight in brackets:
+            options = [(lower, 1.0 - weight)] if lower == upper or weight == 0 else \
+                [(lower, 1.0 - weight), (upper, weight)]
+            corners = [(index + (node,), w * node_weight) for index, w in corners
+                       for node, node_weight in options if node_weight > 0]
+
+        samples = np.zeros(self.trajectories.shape[-2:])
+        for index, weight in corners:
+            samples += weight * self.trajectories[(drone_index,) + index]
+        h = samples[0] + initial_height
+        u = samples[1]
+        metrics = step_response_metrics(self.t, h, target_height, initial_height, u=u,
+                                        max_thrust=drone.max_thrust)
+        if len(corners) == 1 and initial_height == 0:
+            # Węzeł dokładny przy starcie z ziemi - metryki bez indeksu próbki z pełnej rozdzielczości
+            values = self.metrics[(drone_index,) + corners[0][0]]
+            metrics.update((name, float(value)) for name, value in zip(self.meta['metrics'], values)
+                           if name not in SAMPLED_FIELDS)
+        return self.t, h, u, metrics, 'exact' if len(corners) == 1 else 'interpolated'
+
+
+_atlas = None
+_atlas_lock = threading.Lock()
+
+
+def get_atlas():
+    """
+    Atlas wskazany zmienną środowiskową DRONE_SIM_ATLAS (otwierany przy pierwszym użyciu)
+
+    Zwraca: ResponseAtlas albo None, gdy atlas nie jest skonfigurowany
+    lub nie daje się otworzyć.
+    """
+    global _atlas
+    with _atlas_lock:
+        if _atlas is None:
+            path = os.environ.get('DRONE_SIM_ATLAS')
+            try:
+                _atlas = ResponseAtlas(path) if path else False
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Nie można otworzyć atlasu {path}: {e}", file=sys.stderr)
+                _atlas = False
+        return _atlas or None
+
+
+def _parse_axis(text):
+    return [float(value) for value in text.replace(',', ' ').split()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Budowa atlasu odpowiedzi skokowych")
+    parser.add_argument('output', help="katalog atlasu")
+    parser.add_argument('--drones', nargs='*', help="etykiety lub nazwy dronów (domyślnie wszystkie)")
+    parser.add_argument('--steps', type=_parse_axis, default=DEFAULT_STEPS, help="skoki wysokości [m]")
+    parser.add_argument('--kp', type=_parse_axis, default=DEFAULT_KP)
+    parser.add_argument('--ti', type=_parse_axis, default=DEFAULT_TI)
+    parser.add_argument('--td', type=_parse_axis, default=DEFAULT_TD)
+    parser.add_argument('--duration', type=float, default=60.0)
+    parser.add_argument('--dt', type=float, default=0.01)
+    parser.add_argument('--sample-every', type=int, default=DEFAULT_SAMPLE_EVERY)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+
+    def progress(done, total):
+        print(f"\r{done}/{total}", end='', file=sys.stderr, flush=True)
+
+    try:
+        meta = build_atlas(args.output, args.drones or None, args.steps, args.kp, args.ti, args.td, args.duration,
+                           args.dt, args.sample_every, args.workers, progress)
+    except (KeyError, ValueError) as e:
+        print(f"Błąd: {e.args[0]}", file=sys.stderr)
+        return 1
+    size = sum(os.path.getsize(os.path.join(args.output, name)) for name in ('trajectories.npy', 'metrics.npy'))
+    runs = int(np.prod([len(meta['drones'])] + [len(values) for values in meta['axes'].values()]))
+    print(f"\nAtlas: {runs} przebiegów, {size / 2**20:.1f} MB, {time.perf_counter() - started:.1f} s",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""
+Wsadowe uruchamianie symulacji bez interfejsu Dash
+
+Przykład:
+    python batch_runner.py scenariusze.csv -o wyniki/ --format npz --workers 8
+
+Plik scenariuszy (CSV, JSON Lines lub tablica JSON) zawiera kolumny:
+drone, initial_height, target_height, Kp, Ti, Td oraz opcjonalnie
+duration i dt. Wyniki zapisywane są przyrostowo, fragment po fragmencie:
+przebiegi do part-XXXXX.npz (lub trajectories.parquet), a metryki do
+summary.csv (lub summary.parquet).
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+import numpy as np
+
+from metrics import step_response_metrics
+from parallel import default_workers
+from simulation import find_drone, simulate_drone_with_params
+
+SCENARIO_FIELDS = ('drone', 'initial_height', 'target_height', 'Kp', 'Ti', 'Td')
+DEFAULTS = {'duration': 60.0, 'dt': 0.01}
+METRIC_FIELDS = ('settling_time', 'overshoot_percent', 'rise_time', 'peak_time', 'steady_state_error',
+                 'iae', 'ise', 'itae', 'control_effort', 'saturation_time', 'saturation_fraction')
+SUMMARY_FIELDS = ('id',) + SCENARIO_FIELDS + tuple(DEFAULTS) + METRIC_FIELDS
+
+
+def _parse_scenario(row, line):
+    missing = [name for name in SCENARIO_FIELDS if row.get(name) in (None, '')]
+    if missing:
+        raise ValueError(f"Scenariusz {line}: brak pól {', '.join(missing)}")
+    scenario = {'drone': str(row['drone'])}
+    try:
+        for name in SCENARIO_FIELDS[1:]:
+            scenario[name] = float(row[name])
+        for name, default in DEFAULTS.items():
+            value = row.get(name)
+            scenario[name] = default if value in (None, '') else float(value)
+    except ValueError as e:
+        raise ValueError(f"Scenariusz {line}: {e}") from None
+    return scenario
+
+
+def read_scenarios(path):
+    """
+    Leniwe czytanie scenariuszy: zwraca iterator (id, scenariusz)
+
+    CSV i JSON Lines czytane są wiersz po wierszu; plik .json musi być
+    tablicą obiektów i jest wczytywany w całości.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8') as f:
+        if ext == '.csv':
+            rows = csv.DictReader(f)
+        elif ext in ('.jsonl', '.ndjson'):
+            rows = (json.loads(line) for line in f if line.strip())
+        elif ext == '.json':
+            rows = json.load(f)
+        else:
+            raise ValueError(f"Nieobsługiwany format pliku scenariuszy: {ext}")
+        for i, row in enumerate(rows):
+            yield i, _parse_scenario(row, i + 1)
+
+
+def run_chunk(chunk, with_trajectories=True):
+    """Symulacja fragmentu scenariuszy - uruchamiana w procesie roboczym"""
+    results = []
+    for scenario_id, scenario in chunk:
+        drone = find_drone(scenario['drone'])
+        t, h, u = simulate_drone_with_params(drone, scenario['target_height'], scenario['initial_height'],
+                                             scenario['Kp'], scenario['Ti'], scenario['Td'],
+                                             duration=scenario['duration'], dt=scenario['dt'])
+        metrics = step_response_metrics(t, h, scenario['target_height'], scenario['initial_height'], u=u,
+                                        max_thrust=drone.max_thrust)
+        trajectory = (t, h, u) if with_trajectories else None
+        results.append((scenario_id, scenario, metrics, trajectory))
+    return results
+
+
+class NpzWriter:
+    """Przebiegi jako osobne, skompresowane pliki NPZ dla każdego fragmentu"""
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.parts = 0
+
+    def write(self, results):
+        arrays = {}
+        for scenario_id, _, _, (t, h, u) in results:
+            arrays[f"t_{scenario_id}"] = t
+            arrays[f"h_{scenario_id}"] = h
+            arrays[f"u_{scenario_id}"] = u
+        np.savez_compressed(os.path.join(self.out_dir, f"part-{self.parts:05d}.npz"), **arrays)
+        self.parts += 1
+
+    def close(self):
+        pass
+
+
+class ParquetWriter:
+    """Przebiegi w jednym pliku Parquet, dopisywane grupami wierszy (wymaga pyarrow)"""
+
+    def __init__(self, out_dir):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema([('id', pa.int64()),
+                                  ('t', pa.list_(pa.float64())),
+                                  ('h', pa.list_(pa.float64())),
+                                  ('u', pa.list_(pa.float64()))])
+        self._writer = pq.ParquetWriter(os.path.join(out_dir, 'trajectories.parquet'), self._schema,
+                                        compression='zstd')
+
+    def write(self, results):
+        pa = self._pa
+        columns = [pa.array([r[0] for r in results], pa.int64())]
+        for k in range(3):
+            values = [r[3][k] for r in results]
+            offsets = np.concatenate([[0], np.cumsum([len(v) for v in values])]).astype(np.int32)
+            columns.append(pa.ListArray.from_arrays(pa.array(offsets), pa.array(np.concatenate(values))))
+        self._writer.write_table(pa.Table.from_arrays(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class SummaryWriter:
+    """Tabela metryk zapisywana przyrostowo (CSV albo Parquet)"""
+
+    def __init__(self, out_dir, fmt):
+        self.fmt = fmt
+        if fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            self._pa = pa
+            types = {'id': pa.int64(), 'drone': pa.string()}
+            self._schema = pa.schema([(name, types.get(name, pa.float64())) for name in SUMMARY_FIELDS])
+            self._writer = pq.ParquetWriter(os.path.join(out_dir, 'summary.parquet'), self._schema)
+        else:
+            self._file = open(os.path.join(out_dir, 'summary.csv'), 'w', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._file, fieldnames=SUMMARY_FIELDS)
+            self._writer.writeheader()
+
+    def write(self, results):
+        rows = []
+        for scenario_id, scenario, metrics, _ in results:
+            row = {'id': scenario_id}
+            row.update(scenario)
+            row.update({name: metrics.get(name) for name in METRIC_FIELDS})
+            rows.append(row)
+        if self.fmt == 'parquet':
+            self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+        else:
+            self._writer.writerows(rows)
+            self._file.flush()
+
+    def close(self):
+        if self.fmt == 'parquet':
+            self._writer.close()
+        else:
+            self._file.close()
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_batch(scenarios, out_dir, fmt='npz', workers=None, chunk_size=64, with_trajectories=True):
+    """
+    Symulacja strumienia scenariuszy w puli procesów z zapisem przyrostowym
+
+    W locie jest najwyżej 2 * workers fragmentów, więc zużycie pamięci nie
+    zależy od liczby scenariuszy. Zwraca liczbę zasymulowanych scenariuszy.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or default_workers()
+    summary = SummaryWriter(out_dir, fmt)
+    trajectories = None
+    if with_trajectories:
+        trajectories = ParquetWriter(out_dir) if fmt == 'parquet' else NpzWriter(out_dir)
+
+    done = 0
+    chunks = _chunks(scenarios, chunk_size)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        pending = set()
+        try:
+            while True:
+                while len(pending) < 2 * workers:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending.add(pool.submit(run_chunk, chunk, with_trajectories))
+                if not pending:
+                    break
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results = future.result()
+                    summary.write(results)
+                    if trajectories is not None:
+                        trajectories.write(results)
+                    done += len(results)
+        finally:
+            for future in pending:
+                future.cancel()
+            summary.close()
+            if trajectories is not None:
+                trajectories.close()
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Wsadowa symulacja regulatora wysokości drona")
+    parser.add_argument('scenarios', help="plik scenariuszy (.csv, .jsonl lub .json)")
+    parser.add_argument('-o', '--output', required=True, help="katalog wyników")
+    parser.add_argument('--format', choices=('npz', 'parquet'), default='npz',
+                        help="format przebiegów i tabeli metryk (parquet wymaga pyarrow)")
+    parser.add_argument('--workers', type=int, default=None, help="liczba procesów (domyślnie liczba rdzeni)")
+    parser.add_argument('--chunk-size', type=int, default=64, help="liczba scenariuszy w jednym zadaniu")
+    parser.add_argument('--summary-only', action='store_true', help="zapisz tylko tabelę metryk, bez przebiegów")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        count = run_batch(read_scenarios(args.scenarios), args.output, fmt=args.format, workers=args.workers,
+                          chunk_size=args.chunk_size, with_trajectories=not args.summary_only)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Błąd: {e}", file=sys.stderr)
+        return 1
+    except ImportError:
+        print("Błąd: format parquet wymaga pakietu pyarrow", file=sys.stderr)
+        return 1
+    print(f"Zasymulowano {count} scenariuszy w {time.perf_counter() - start:.1f} s -> {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,393 @@
+"""
+Pomiary wydajności gorących ścieżek symulatora i aplikacji
+
+Przykład:
+    python benchmark.py --save wyniki.json
+    python benchmark.py --compare wyniki.json --threshold 1.3
+
+Wyniki (mediana i minimum czasu w ms) zapisywane są do pliku JSON; przy
+porównaniu z poprzednim zapisem skrypt kończy się kodem 1, gdy któryś
+pomiar zwolnił ponad próg.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """Rejestracja pomiaru; udekorowana funkcja przygotowuje dane i zwraca funkcję do mierzenia"""
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+def measure(fn, min_time=0.2, min_repeats=3, max_repeats=200):
+    """Czasy kolejnych wywołań fn (s) - co najmniej min_repeats i min_time łącznie"""
+    times = []
+    total = 0.0
+    while len(times) < min_repeats or (total < min_time and len(times) < max_repeats):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+    return times
+
+
+def _drone(index=0):
+    from simulation import DRONES
+    return list(DRONES.values())[index]
+
+
+def _register_simulation_benchmarks():
+    from simulation import DRONES, simulate_batch, simulate_drone_with_params
+
+    for duration, dt in ((10, 0.01), (60, 0.01), (300, 0.01), (60, 0.001)):
+        @benchmark(f"simulate/zoh/duration={duration}/dt={dt}")
+        def _(duration=duration, dt=dt):
+            drone = _drone()
+            return lambda: simulate_drone_with_params(drone, 10, 0, 20, 4, 1.5, duration=duration, dt=dt)
+
+    for index, drone in enumerate(DRONES.values()):
+        @benchmark(f"simulate/zoh/drone={drone.name}")
+        def _(index=index):
+            drone = _drone(index)
+            return lambda: simulate_drone_with_params(drone, 10, 0, 20, 4, 1.5)
+
+    for duration, dt in ((60, 0.01), (60, 0.001)):
+        @benchmark(f"simulate/hybrid/duration={duration}/dt={dt}")
+        def _(duration=duration, dt=dt):
+            drone = _drone()
+            return lambda: simulate_drone_with_params(drone, 10, 0, 20, 4, 1.5, duration=duration, dt=dt,
+                                                      integrator='hybrid')
+
+    for tolerance, hold_time in ((1e-3, None), (1e-5, None), (1e-3, 3)):
+        @benchmark(f"simulate/adaptive/tolerance={tolerance:g}/hold={hold_time}")
+        def _(tolerance=tolerance, hold_time=hold_time):
+            from adaptive import simulate_adaptive
+
+            drone = _drone()
+            return lambda: simulate_adaptive(drone, 10, 0, 20, 4, 1.5, tolerance=tolerance, hold_time=hold_time)
+
+    @benchmark("simulate/odeint/duration=10")
+    def _():
+        drone = _drone()
+        return lambda: simulate_drone_with_params(drone, 10, 0, 20, 4, 1.5, duration=10, integrator='odeint')
+
+    @benchmark("simulate_batch/n=1000")
+    def _():
+        drone = _drone()
+        kp = np.linspace(1, 100, 1000)
+        return lambda: simulate_batch(drone, 10, 0, kp, 4, 1.5)
+
+    # Pełne środowisko: podmuch, szum kolorowy, czujnik 50 Hz z opóźnieniem i kwantyzacją
+    environment = {'gust': ('one_minus_cosine', 3.0, 20.0, 2.0), 'noise': ('colored', 0.05, 0.2),
+                   'sensor_rate': 50, 'latency': 0.02, 'quantization': 0.01}
+
+    @benchmark("simulate/zoh/environment")
+    def _():
+        drone = _drone()
+        return lambda: simulate_drone_with_params(drone, 10, 0, 20, 4, 1.5, environment=environment,
+                                                  derivative_filter=10, anti_windup='clamp')
+
+    @benchmark("simulate_batch/environment/n=1000")
+    def _():
+        drone = _drone()
+        kp = np.linspace(1, 100, 1000)
+        return lambda: simulate_batch(drone, 10, 0, kp, 4, 1.5, environment=environment, derivative_filter=10,
+                                      anti_windup='clamp')
+
+
+def _register_analysis_benchmarks():
+    from metrics import step_response_metrics
+    from simulation import simulate_batch, simulate_drone_with_params
+
+    @benchmark("metrics/single")
+    def _():
+        t, h, u = simulate_drone_with_params(_drone(), 10, 0, 20, 4, 1.5)
+        return lambda: step_response_metrics(t, h, 10, 0, u=u, max_thrust=10)
+
+    @benchmark("metrics/batch/n=1000")
+    def _():
+        t, h, u = simulate_batch(_drone(), 10, 0, np.linspace(1, 100, 1000), 4, 1.5)
+        return lambda: step_response_metrics(t, h, 10, 0, u=u, max_thrust=10)
+
+
+def _register_frequency_benchmarks():
+    from cache import ResultCache
+    from frequency import frequency_analysis, margin_grid
+
+    @benchmark("frequency/analysis")
+    def _():
+        drone = _drone()
+        # Pamięć podręczna o zerowym limicie - każde wywołanie liczy analizę od nowa
+        no_cache = ResultCache(max_bytes=0)
+        return lambda: frequency_analysis(drone, 20, 4, 1.5, cache=no_cache)
+
+    @benchmark("frequency/margin_grid/n=1001")
+    def _():
+        drone = _drone()
+        kp = np.linspace(0, 100, 1001)
+        return lambda: margin_grid(drone, kp, 4, 1.5)
+
+
+def _register_export_benchmarks():
+    from export import comparison_export, export_chunks
+    from simulation import DRONES
+
+    for fmt in ('csv', 'arrow'):
+        @benchmark(f"export/{fmt}/runs=6")
+        def _(fmt=fmt):
+            # Dane liczone raz - mierzony jest tylko zapis strumienia
+            export = comparison_export(list(DRONES), [(20, 4, 1.5), (10, 4, 1)], 10, 0)
+            return lambda: sum(len(chunk) for chunk in export_chunks(export, fmt))
+
+
+def _register_atlas_benchmarks():
+    import functools
+    import tempfile
+
+    from atlas import ResponseAtlas, build_atlas
+    from simulation import DRONES
+
+    @functools.lru_cache(maxsize=None)
+    def small_atlas():
+        # Mała siatka wokół domyślnego scenariusza (budowa trwa kilka sekund)
+        path = tempfile.mkdtemp(prefix='atlas-')
+        build_atlas(path, drone_keys=list(DRONES)[:1], steps=(5, 10, 20), kp_values=(10, 20, 30),
+                    ti_values=(2, 4), td_values=(1, 1.5, 2), workers=1)
+        return ResponseAtlas(path)
+
+    @benchmark("atlas/lookup/exact")
+    def _():
+        atlas = small_atlas()
+        return lambda: atlas.lookup(_drone(), 10, 0, 20, 4, 1.5)
+
+    @benchmark("atlas/lookup/interpolated")
+    def _():
+        atlas = small_atlas()
+        return lambda: atlas.lookup(_drone(), 12, 3, 23.3, 3.1, 1.2)
+
+
+def _register_figure_benchmarks():
+    from plotly.io.json import to_json_plotly
+
+    from figures import build_full_figure, build_light_figure, lttb_indices, patch_light_figure
+    from metrics import step_response_metrics
+    from simulation import simulate_drone_with_params
+
+    def scenario():
+        t, h, u = simulate_drone_with_params(_drone(), 10, 0, 20, 4, 1.5)
+        return t, h, u, step_response_metrics(t, h, 10, 0, u=u, max_thrust=10)
+
+    @benchmark("figure/lttb/6000->1500")
+    def _():
+        t, h, _, _ = scenario()
+        return lambda: lttb_indices(t, h, 1500)
+
+    for name, build in (('full', build_full_figure), ('light', build_light_figure)):
+        @benchmark(f"figure/build/{name}")
+        def _(build=build):
+            t, h, u, metrics = scenario()
+            return lambda: build(t, h, u, 10, metrics)
+
+        @benchmark(f"figure/serialize/{name}")
+        def _(build=build):
+            t, h, u, metrics = scenario()
+            fig = build(t, h, u, 10, metrics)
+            return lambda: to_json_plotly(fig.to_plotly_json())
+
+    @benchmark("figure/patch")
+    def _():
+        t, h, u, metrics = scenario()
+        return lambda: to_json_plotly(patch_light_figure(t, h, u, 10, metrics, False).to_plotly_json())
+
+
+def _graph_request(kp, signature=None):
+    from simulation import DRONES
+
+    inputs = [('drone-select', 'value', list(DRONES)[0]), ('initial-height', 'data', 0),
+              ('target-height', 'data', 10), ('kp-slider', 'value', kp), ('ti-slider', 'value', 4),
+              ('td-slider', 'value', 1.5), ('render-mode', 'value', 'light'), ('sim-duration', 'value', 60),
+              ('sim-method', 'value', 'fixed'), ('sim-dt', 'value', 0.01), ('sim-tolerance', 'value', 1e-3),
+              ('sim-hold', 'value', 0), ('env-gust', 'value', 'none'), ('env-gust-amplitude', 'value', 2),
+              ('env-noise', 'value', 'none'), ('env-noise-std', 'value', 0.05), ('env-sensor-rate', 'value', 0),
+              ('env-latency', 'value', 0), ('env-quantization', 'value', 0), ('env-seed', 'value', 0),
+              ('pid-filter', 'value', 0), ('pid-anti-windup', 'value', 'none')]
+    outputs = [('simulation-graphs', 'figure'), ('figure-signature', 'data'), ('render-stats', 'children'),
+               ('graph-job', 'data'), ('graph-poll', 'disabled')]
+    return {
+        'output': '..' + '...'.join(f"{i}.{p}" for i, p in outputs) + '..',
+        'outputs': [{'id': i, 'property': p} for i, p in outputs],
+        'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in inputs],
+        'state': [{'id': 'figure-signature', 'property': 'data', 'value': signature},
+                  {'id': 'session-id', 'property': 'data', 'value': 'benchmark'},
+                  {'id': 'graph-job', 'property': 'data', 'value': None}],
+        'changedPropIds': ['kp-slider.value'],
+    }
+
+
+def _register_callback_benchmarks():
+    import main
+
+    client = main.create_app().server.test_client()
+
+    def post(body):
+        response = client.post('/_dash-update-component', json=body)
+        if response.status_code != 200:
+            raise RuntimeError(f"Callback zwrócił {response.status_code}")
+
+    @benchmark("callback/update_graphs/uncached")
+    def _():
+        # Każde wywołanie z innym Kp, żeby ominąć pamięć podręczną wyników
+        kp_values = itertools.count(1.0, 0.001)
+        return lambda: post(_graph_request(next(kp_values)))
+
+    @benchmark("callback/update_graphs/cached")
+    def _():
+        body = _graph_request(20)
+        post(body)
+        return lambda: post(body)
+
+    @benchmark("callback/update_graphs/patch")
+    def _():
+        body = _graph_request(20, {'mode': 'light', 'n': 6000, 'target': 10})
+        post(body)
+        return lambda: post(body)
+
+
+# Skrypty uruchamiane w świeżym procesie do pomiaru zimnego startu
+_COLD_START_SCRIPTS = {
+    'import_main': "import main",
+    'create_app': "import main; main.create_app()",
+    'create_app_warm': "import main; main.create_app(warm=True)",
+    'first_request': (
+        "import benchmark, main\n"
+        "client = main.create_app().server.test_client()\n"
+        "response = client.post('/_dash-update-component', json=benchmark._graph_request(20))\n"
+        "assert response.status_code == 200\n"
+    ),
+    'first_request_warm': (
+        "import benchmark, main\n"
+        "client = main.create_app(warm=True).server.test_client()\n"
+        "response = client.post('/_dash-update-component', json=benchmark._graph_request(20))\n"
+        "assert response.status_code == 200\n"
+    ),
+}
+
+
+def _register_startup_benchmarks():
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    for name, script in _COLD_START_SCRIPTS.items():
+        @benchmark(f"startup/{name}")
+        def _(script=script):
+            return lambda: subprocess.run([sys.executable, '-c', script], cwd=here, check=True)
+
+
+def import_times(module='main'):
+    """Najdroższe importy modułu (python -X importtime), posortowane malejąco po czasie łącznym [ms]"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"], cwd=here,
+                            capture_output=True, text=True, check=True).stderr
+    times = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len('import time:'):].split('|'))
+        times.append((name, int(cumulative) / 1000))
+    return sorted(times, key=lambda item: item[1], reverse=True)
+
+
+def run(pattern=None, min_time=0.2):
+    """Uruchamia zarejestrowane pomiary (opcjonalnie tylko o nazwach zawierających pattern)"""
+    results = {}
+    for name, setup in BENCHMARKS:
+        if pattern and pattern not in name:
+            continue
+        fn = setup()
+        fn()  # rozgrzewka (importy, pamięć podręczna kodu)
+        times = measure(fn, min_time=min_time)
+        results[name] = {
+            'median_ms': statistics.median(times) * 1000,
+            'min_ms': min(times) * 1000,
+            'repeats': len(times),
+        }
+        print(f"{name:50s} {results[name]['median_ms']:10.3f} ms  (min {results[name]['min_ms']:.3f} ms, "
+              f"n={len(times)})")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Lista pomiarów, których mediana wzrosła ponad threshold * wartość bazowa"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            continue
+        ratio = result['median_ms'] / reference['median_ms']
+        if ratio > threshold:
+            regressions.append((name, reference['median_ms'], result['median_ms'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pomiary wydajności symulatora wysokości drona")
+    parser.add_argument('-k', '--filter', default=None, help="uruchom tylko pomiary zawierające ten tekst")
+    parser.add_argument('--save', default=None, help="zapisz wyniki do pliku JSON")
+    parser.add_argument('--compare', default=None, help="porównaj z wynikami zapisanymi wcześniej")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="dopuszczalny względny wzrost mediany (domyślnie 1.25)")
+    parser.add_argument('--min-time', type=float, default=0.2, help="minimalny łączny czas pomiaru [s]")
+    parser.add_argument('--import-times', type=int, nargs='?', const=15, default=0,
+                        help="wypisz N najdroższych importów modułu main (domyślnie 15)")
+    args = parser.parse_args(argv)
+
+    _register_simulation_benchmarks()
+    _register_analysis_benchmarks()
+    _register_frequency_benchmarks()
+    _register_export_benchmarks()
+    _register_atlas_benchmarks()
+    _register_figure_benchmarks()
+    _register_callback_benchmarks()
+    _register_startup_benchmarks()
+
+    results = run(args.filter, args.min_time)
+
+    if args.import_times:
+        print("\nNajdroższe importy (czas łączny):")
+        for name, ms in import_times()[:args.import_times]:
+            print(f"  {name:50s} {ms:10.1f} ms")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(),
+                       'machine': platform.machine(),
+                       'results': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESJA {name}: {before:.3f} ms -> {after:.3f} ms (x{ratio:.2f})")
+        if regressions:
+            return 1
+        print(f"Brak regresji powyżej x{args.threshold:.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
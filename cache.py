@@ -0,0 +1,213 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from instrumentation import note, phase
+from metrics import step_response_metrics
+from simulation import simulate_drone_with_params
+
+# Wersja formatu klucza - zmiana modelu lub metryk powinna ją podbić
+CACHE_VERSION = 4
+
+# Domyślny limit pamięci podręcznej w RAM (bajty)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _canonical(value):
+    """Liczba w postaci niezależnej od typu (int/float/np.float64) i szumu zaokrągleń"""
+    return round(float(value), 9)
+
+
+def _option_value(value):
+    """Kanoniczna wartość opcji: liczba, tekst, None lub zagnieżdżona krotka/słownik"""
+    if value is None or isinstance(value, (str, bool)):
+        return value
+    if isinstance(value, dict):
+        return tuple(sorted((name, _option_value(item)) for name, item in value.items()))
+    if isinstance(value, (tuple, list)):
+        return tuple(_option_value(item) for item in value)
+    return _canonical(value)
+
+
+def simulation_key(drone, target_height, initial_height, Kp, Ti, Td, duration=60, dt=0.01, integrator='zoh',
+                   **options):
+    """Kanoniczny klucz scenariusza symulacji (options - dodatkowe parametry metody, np. tolerancja)"""
+    return (CACHE_VERSION, drone.name, _canonical(drone.mass), _canonical(drone.max_thrust),
+            _canonical(initial_height), _canonical(target_height),
+            _canonical(Kp), _canonical(Ti), _canonical(Td),
+            _canonical(duration), _canonical(dt), str(integrator),
+            tuple(sorted((name, _option_value(value)) for name, value in options.items())))
+
+
+def _entry_size(entry):
+    return sum(value.nbytes for value in entry.values() if isinstance(value, np.ndarray)) + 512
+
+
+class ResultCache:
+    """
+    Pamięć podręczna LRU wyników symulacji ograniczona rozmiarem w bajtach
+
+    Opcjonalnie wyniki są też zapisywane w katalogu disk_dir (pliki .npz),
+    dzięki czemu kilka procesów serwera może współdzielić obliczenia.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_dir=None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Liczniki trafień/chybień i zajętość pamięci"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def get(self, key):
+        """Zwraca zapisany wynik lub None (liczy trafienia i chybienia)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        for value in entry.values():
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+        with self._lock:
+            self._insert(key, entry)
+        self._store(key, entry)
+
+    def _insert(self, key, entry):
+        if key in self._entries:
+            self.current_bytes -= _entry_size(self._entries.pop(key))
+        size = _entry_size(entry)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self.current_bytes += size
+        # Usuwanie najdawniej używanych wpisów po przekroczeniu limitu
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= _entry_size(evicted)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.npz")
+
+    def _load(self, key):
+        if not self.disk_dir:
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                entry = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+        metrics = {name[len('metric_'):]: entry.pop(name).item()
+                   for name in list(entry) if name.startswith('metric_')}
+        entry['metrics'] = metrics
+        for value in entry.values():
+            if isinstance(value, np.ndarray):
+                value.setflags(write=False)
+        return entry
+
+    def _store(self, key, entry):
+        if not self.disk_dir:
+            return
+        arrays = {name: value for name, value in entry.items() if isinstance(value, np.ndarray)}
+        arrays.update({f"metric_{name}": np.asarray(value) for name, value in entry.get('metrics', {}).items()})
+        # Zapis atomowy - inne procesy nigdy nie widzą niekompletnego pliku
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+# Wspólna pamięć podręczna aplikacji; katalog dyskowy ustawiany zmienną środowiskową
+SIMULATION_CACHE = ResultCache(disk_dir=os.environ.get('DRONE_SIM_CACHE_DIR'))
+
+
+def cached_simulation(drone, target_height, initial_height, Kp, Ti, Td, duration=60, dt=0.01,
+                      integrator='hybrid', cache=None, return_velocity=False, progress=None,
+                      **options):
+    """
+    Symulacja z pamięcią podręczną (domyślnie silnikiem hybrydowym, patrz hybrid.py)
+
+    Dla integrator='adaptive' (model ciągły) dt jest krokiem siatki
+    wyjściowej, a options (tolerance, hold_time) trafiają do
+    adaptive.simulate_adaptive; liczba kroków, oszacowanie błędu i różnica
+    względem modelu dyskretnego dołączane są do metryk (solver_steps,
+    error_estimate, stop_time, reference_error). Dla pozostałych metod options (environment,
+    seed, derivative_filter, anti_windup) trafiają do simulate_drone_with_params.
+    progress trafia do symulacji (punkt anulowania długiego przebiegu), nie do klucza.
+
+    Zwraca: t, h, u (tablice tylko do odczytu) oraz słownik metryk,
+    a przy return_velocity=True - t, h, v, u i metryki
+    """
+    cache = SIMULATION_CACHE if cache is None else cache
+    key = simulation_key(drone, target_height, initial_height, Kp, Ti, Td, duration, dt, integrator, **options)
+    entry = cache.get(key)
+    note('cache_hit', entry is not None)
+    if entry is None:
+        solver = {}
+        with phase('simulation'):
+            if integrator == 'adaptive':
+                from adaptive import simulate_adaptive
+                t, h, v, u, info = simulate_adaptive(drone, target_height, initial_height, Kp, Ti, Td,
+                                                     duration=duration, output_dt=dt, reference=True,
+                                                     return_velocity=True, progress=progress, **options)
+                solver = {'solver_steps': info['steps'], 'error_estimate': info['error_estimate'],
+                          'stop_time': info['stop_time'], 'reference_error': info['reference_error']}
+            else:
+                t, h, v, u = simulate_drone_with_params(drone, target_height, initial_height, Kp, Ti, Td,
+                                                        duration=duration, dt=dt, integrator=integrator,
+                                                        return_velocity=True, progress=progress, **options)
+        note('simulation_steps', solver.get('solver_steps', len(t)))
+        with phase('metrics'):
+            metrics = step_response_metrics(t, h, target_height, initial_height, u=u,
+                                            max_thrust=drone.max_thrust)
+        metrics.update(solver)
+        entry = {'t': t, 'h': h, 'v': v, 'u': u, 'metrics': metrics}
+        cache.put(key, entry)
+    if return_velocity:
+        return entry['t'], entry['h'], entry['v'], entry['u'], entry['metrics']
+    return entry['t'], entry['h'], entry['u'], entry['metrics']
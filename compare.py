@@ -0,0 +1,72 @@
+import numpy as np
+
+from metrics import step_response_metrics
+from parallel import run_in_pool
+from simulation import DRONES, simulate_batch
+
+# Górna granica liczby przebiegów w jednym porównaniu (drony × zestawy nastaw)
+MAX_COMPARE_RUNS = 60
+
+
+def parse_gain_sets(text):
+    """Zestawy nastaw z tekstu: jeden wiersz "Kp Ti Td" na zestaw (# rozpoczyna komentarz)"""
+    gain_sets = []
+    for line_number, line in enumerate((text or '').splitlines(), 1):
+        fields = line.split('#', 1)[0].replace(',', ' ').replace(';', ' ').split()
+        if not fields:
+            continue
+        if len(fields) != 3:
+            raise ValueError(f"Wiersz {line_number}: oczekiwano trzech liczb (Kp Ti Td)")
+        try:
+            kp, ti, td = (float(value) for value in fields)
+        except ValueError:
+            raise ValueError(f"Wiersz {line_number}: niepoprawna liczba") from None
+        if not np.all(np.isfinite([kp, ti, td])):
+            raise ValueError(f"Wiersz {line_number}: nastawy muszą być skończonymi liczbami")
+        if ti <= 0:
+            raise ValueError(f"Wiersz {line_number}: Ti musi być dodatnie")
+        gain_sets.append((kp, ti, td))
+    return gain_sets
+
+
+def compare_runs(drone_keys, gain_sets, target_height, initial_height, duration=60, dt=0.01, progress=None):
+    """
+    Porównanie dronów i zestawów nastaw dla tego samego skoku wysokości
+
+    Wszystkie kombinacje (dron, nastawy) symulowane są jednym wywołaniem
+    simulate_batch, a metryki liczone wektorowo dla całej paczki. progress
+    trafia do simulate_batch (punkt anulowania, patrz jobs.py).
+
+    Zwraca: słownik z t, h, v i u (n_runs, n_steps), opisami przebiegów
+    (labels, drones, gains) i metrykami (tablice n_runs).
+    """
+    runs = [(key, gains) for key in drone_keys for gains in gain_sets]
+    if not runs:
+        raise ValueError("Wybierz co najmniej jednego drona i jeden zestaw nastaw")
+    if len(runs) > MAX_COMPARE_RUNS:
+        raise ValueError(f"Za dużo przebiegów ({len(runs)}), limit to {MAX_COMPARE_RUNS}")
+
+    drones = DRONES.select([key for key, _ in runs])
+    Kp, Ti, Td = np.array([gains for _, gains in runs], dtype=float).T
+    t, h, v, u = simulate_batch(drones, target_height, initial_height, Kp, Ti, Td, duration=duration, dt=dt,
+                                return_velocity=True, progress=progress)
+    metrics = step_response_metrics(t, h, target_height, initial_height, u=u, max_thrust=drones.max_thrust)
+    labels = [f"{name}, Kp={kp:g}, Ti={ti:g}, Td={td:g}" for name, (_, (kp, ti, td)) in zip(drones.names, runs)]
+    return {
+        't': t, 'h': h, 'v': v, 'u': u,
+        'labels': labels,
+        'drones': drones.names,
+        'gains': np.column_stack([Kp, Ti, Td]),
+        'metrics': metrics,
+    }
+
+
+def compare_runs_in_pool(*args, progress=None, **kwargs):
+    """
+    compare_runs w procesie roboczym wspólnej puli (parallel.run_in_pool)
+
+    Wątek serwera tylko czeka na wynik, więc pętla symulacji nie konkuruje
+    o GIL z interaktywnymi callbackami; anulowanie zadania (progress)
+    przerywa też obliczenia w procesie roboczym.
+    """
+    return run_in_pool(compare_runs, *args, progress=progress, **kwargs)
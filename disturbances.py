@@ -0,0 +1,179 @@
+import numpy as np
+
+# Opis środowiska symulacji: nazwa -> wartość (None - wyłączone)
+#   gust - zakłócenie siłowe [N]:
+#       ('step', siła, początek [s])
+#       ('one_minus_cosine', amplituda, początek [s], czas trwania [s]) - podmuch 1-cos
+#       ('sine', amplituda, okres [s])
+#       ('turbulence', odchylenie standardowe, czas korelacji [s]) - szum kolorowy
+#   noise - szum pomiaru wysokości [m]:
+#       ('gaussian', odchylenie standardowe)
+#       ('colored', odchylenie standardowe, czas korelacji [s])
+#   sensor_rate - częstotliwość odczytu czujnika [Hz] (None - w każdym kroku)
+#   latency - opóźnienie pomiaru [s]
+#   quantization - rozdzielczość czujnika [m] (0 - bez kwantyzacji)
+DEFAULT_ENVIRONMENT = {
+    'gust': None,
+    'noise': None,
+    'sensor_rate': None,
+    'latency': 0.0,
+    'quantization': 0.0,
+}
+
+GUST_KINDS = ('step', 'one_minus_cosine', 'sine', 'turbulence')
+NOISE_KINDS = ('gaussian', 'colored')
+
+# Liczba parametrów liczbowych każdego rodzaju zakłócenia i szumu
+_PARAMETER_COUNTS = {'step': 2, 'one_minus_cosine': 3, 'sine': 2, 'turbulence': 2, 'gaussian': 1, 'colored': 2}
+
+# Numery strumieni losowych - każde źródło losowości ma własny, niezależny strumień
+GUST_STREAM = 0
+NOISE_STREAM = 1
+
+
+def _generators(seed, stream, members):
+    """
+    Generatory losowe dla kolejnych scenariuszy paczki
+
+    Ziarno scenariusza to (seed, stream, numer scenariusza), więc wynik nie
+    zależy od podziału paczki między procesy ani od kolejności obliczeń.
+    """
+    if members is None:
+        return [np.random.default_rng([seed, stream])]
+    return [np.random.default_rng([seed, stream, member]) for member in members]
+
+
+def colored_noise(n_steps, dt, std, correlation_time, rngs):
+    """
+    Szum kolorowy (proces AR(1), dyskretny odpowiednik filtru pierwszego rzędu)
+
+    x[k] = a x[k-1] + sqrt(1 - a^2) std w[k], a = exp(-dt / correlation_time);
+    pierwsza próbka pochodzi z rozkładu stacjonarnego.
+
+    Zwraca: tablicę (len(rngs), n_steps)
+    """
+    from scipy.signal import lfilter
+
+    white = np.stack([rng.standard_normal(n_steps) for rng in rngs])
+    if correlation_time <= 0:
+        return std * white
+    a = np.exp(-dt / correlation_time)
+    first = std * white[:, :1]
+    rest = lfilter([np.sqrt(1 - a * a) * std], [1.0, -a], white[:, 1:], axis=-1, zi=a * first)[0]
+    return np.concatenate([first, rest], axis=-1)
+
+
+def gust_profile(t, gust, rngs):
+    """Siła zakłócenia [N] w kolejnych krokach dla każdego scenariusza: tablica (len(rngs), n_steps)"""
+    kind, *params = gust
+    n = len(rngs)
+    if kind == 'step':
+        force, start = params
+        return np.broadcast_to(np.where(t >= start, float(force), 0.0), (n, len(t)))
+    if kind == 'one_minus_cosine':
+        amplitude, start, length = params
+        phase = np.clip((t - start) / length, 0.0, 1.0)
+        return np.broadcast_to(0.5 * amplitude * (1 - np.cos(2 * np.pi * phase)), (n, len(t)))
+    if kind == 'sine':
+        amplitude, period = params
+        return np.broadcast_to(amplitude * np.sin(2 * np.pi * t / period), (n, len(t)))
+    if kind == 'turbulence':
+        std, correlation_time = params
+        dt = t[1] - t[0] if len(t) > 1 else 1.0
+        return colored_noise(len(t), dt, std, correlation_time, rngs)
+    raise ValueError(f"Nieznany rodzaj zakłócenia: {kind!r} (dostępne: {', '.join(GUST_KINDS)})")
+
+
+def measurement_noise(t, noise, rngs):
+    """Szum pomiaru wysokości [m] w kolejnych krokach: tablica (len(rngs), n_steps)"""
+    kind, *params = noise
+    dt = t[1] - t[0] if len(t) > 1 else 1.0
+    if kind == 'gaussian':
+        return colored_noise(len(t), dt, params[0], 0.0, rngs)
+    if kind == 'colored':
+        return colored_noise(len(t), dt, params[0], params[1], rngs)
+    raise ValueError(f"Nieznany rodzaj szumu: {kind!r} (dostępne: {', '.join(NOISE_KINDS)})")
+
+
+def sensor_indices(n_steps, dt, rate=None, latency=0.0):
+    """
+    Indeks próbki stanu widzianej przez regulator w kolejnych krokach
+
+    Czujnik próbkuje co 1 / rate sekund (z podtrzymaniem), a pomiar dociera
+    po latency sekundach; przed pierwszym pomiarem regulator widzi stan
+    początkowy.
+
+    Zwraca: tablicę int (n_steps,) albo None, gdy czujnik jest idealny
+    """
+    delay = int(round(latency / dt)) if latency else 0
+    period = max(int(round(1 / (rate * dt))), 1) if rate else 1
+    if delay == 0 and period == 1:
+        return None
+    seen = np.arange(n_steps) - delay
+    return np.maximum(seen // period * period, 0)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def check_environment(environment):
+    """
+    Sprawdza opis środowiska z niezaufanego źródła (np. JSON z zapytania)
+
+    Wyjątek ValueError przy nieznanym kluczu, rodzaju zakłócenia lub szumu
+    albo niepoprawnej liczbie czy typie parametrów.
+    """
+    if not isinstance(environment, dict):
+        raise ValueError("Opis środowiska musi być słownikiem")
+    unknown = sorted(set(environment) - set(DEFAULT_ENVIRONMENT))
+    if unknown:
+        raise ValueError(f"Nieznane klucze środowiska: {', '.join(map(str, unknown))} "
+                         f"(dostępne: {', '.join(DEFAULT_ENVIRONMENT)})")
+    for name, kinds in (('gust', GUST_KINDS), ('noise', NOISE_KINDS)):
+        model = environment.get(name)
+        if model is None:
+            continue
+        if not isinstance(model, (list, tuple)) or not model or model[0] not in kinds:
+            raise ValueError(f"{name}: oczekiwano [rodzaj, parametry...], rodzaj jeden z: {', '.join(kinds)}")
+        if len(model) != _PARAMETER_COUNTS[model[0]] + 1 or not all(map(_is_number, model[1:])):
+            raise ValueError(f"{name}: {model[0]!r} wymaga {_PARAMETER_COUNTS[model[0]]} parametrów liczbowych")
+    for name in ('sensor_rate', 'latency', 'quantization'):
+        value = environment.get(name)
+        if value is not None and (not _is_number(value) or value < 0):
+            raise ValueError(f"{name}: oczekiwano nieujemnej liczby")
+
+
+def environment_streams(t, environment=None, seed=0, members=None):
+    """
+    Strumienie zakłóceń i niedoskonałości czujnika dla całego horyzontu
+
+    Wszystkie wartości losowe generowane są z góry, więc pętla symulacji
+    tylko odczytuje tablice.
+
+    Parametry:
+    environment: słownik jak DEFAULT_ENVIRONMENT (brakujące klucze - domyślne)
+    seed: ziarno strumieni losowych
+    members: numery scenariuszy paczki (None - pojedynczy przebieg, wynik 1D)
+
+    Zwraca: słownik z disturbance i sensor_noise (tablice (n_steps,) lub
+    (len(members), n_steps), albo None), sensor_index i quantization.
+    """
+    environment = dict(DEFAULT_ENVIRONMENT, **(environment or {}))
+    single = members is None
+    t = np.asarray(t, dtype=float)
+
+    streams = {'disturbance': None, 'sensor_noise': None,
+               'sensor_index': sensor_indices(len(t), t[1] - t[0] if len(t) > 1 else 1.0,
+                                              environment['sensor_rate'], environment['latency']),
+               'quantization': float(environment['quantization'] or 0.0)}
+    if environment['gust'] is not None:
+        streams['disturbance'] = gust_profile(t, environment['gust'], _generators(seed, GUST_STREAM, members))
+    if environment['noise'] is not None:
+        streams['sensor_noise'] = measurement_noise(t, environment['noise'],
+                                                    _generators(seed, NOISE_STREAM, members))
+    if single:
+        for name in ('disturbance', 'sensor_noise'):
+            if streams[name] is not None:
+                streams[name] = streams[name][0]
+    return streams
@@ -0,0 +1,317 @@
+import io
+import json
+
+import numpy as np
+
+from cache import cached_simulation
+from compare import compare_runs, parse_gain_sets
+from disturbances import check_environment
+from jobs import JOBS, JobCancelled, JobRejected
+from simulation import ANTI_WINDUP, DRONES
+
+# Formaty eksportu: nazwa -> (typ MIME, rozszerzenie pliku)
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+# Limit oczekiwania na obliczenie danych eksportu w kolejce zadań [s]
+EXPORT_TIMEOUT = 120
+
+# Liczba wierszy w jednym fragmencie odpowiedzi (pamięć serwera nie rośnie z długością przebiegu)
+EXPORT_CHUNK_ROWS = 65536
+
+# Górna granica liczby próbek eksportu (przebiegi × duration / dt) - pamięć serwera przy jednym żądaniu
+MAX_EXPORT_SAMPLES = 2_000_000
+
+# Opcje symulacji dozwolone w parametrze options zapytania eksportu
+EXPORT_OPTIONS = ('environment', 'seed', 'derivative_filter', 'anti_windup')
+
+COLUMNS = ('t', 'h', 'v', 'u')
+# Formaty np.savetxt (zapis CSV bez pyarrow) - pełna dokładność float64
+CSV_FORMATS = {'run': '%d', 't': '%.17g', 'h': '%.17g', 'v': '%.17g', 'u': '%.17g'}
+
+
+def scenario_export(drone, target_height, initial_height, Kp, Ti, Td, duration=60, dt=0.01,
+                    integrator='hybrid', progress=None, **options):
+    """
+    Dane bieżącego scenariusza do eksportu (pełna rozdzielczość, bez decymacji)
+
+    Zwraca: słownik z runs - listą (etykieta, kolumny t, h, v, u) i metrics -
+    listą słowników metryk (po jednym na przebieg).
+    """
+    t, h, v, u, metrics = cached_simulation(drone, target_height, initial_height, Kp, Ti, Td, duration=duration,
+                                            dt=dt, integrator=integrator, return_velocity=True, progress=progress,
+                                            **options)
+    columns = {'t': t, 'h': h, 'v': v, 'u': u}
+    label = f"{drone.name}, Kp={Kp:g}, Ti={Ti:g}, Td={Td:g}"
+    return {'runs': [(label, columns)], 'metrics': [metrics]}
+
+
+def comparison_export(drone_keys, gain_sets, target_height, initial_height, duration=60, dt=0.01, progress=None):
+    """Dane porównania (compare_runs) do eksportu - format jak w scenario_export"""
+    result = compare_runs(drone_keys, gain_sets, target_height, initial_height, duration=duration, dt=dt,
+                          progress=progress)
+    t = result['t']
+    runs = [(label, {'t': t, 'h': result['h'][k], 'v': result['v'][k], 'u': result['u'][k]})
+            for k, label in enumerate(result['labels'])]
+    metrics = [{name: values[k].item() for name, values in result['metrics'].items()}
+               for k in range(len(runs))]
+    return {'runs': runs, 'metrics': metrics}
+
+
+def _run_chunks(runs, chunk_rows):
+    """Kolejne fragmenty (numer przebiegu, słownik wycinków kolumn) - wycinki to widoki, bez kopiowania"""
+    for k, (_, columns) in enumerate(runs):
+        n = len(columns['t'])
+        for start in range(0, n, chunk_rows):
+            yield k, {name: columns[name][start:start + chunk_rows] for name in COLUMNS}
+
+
+def _metric_header(export):
+    """Metryki jako linie komentarza CSV (# przebieg, etykieta, nazwa=wartość)"""
+    lines = []
+    for k, ((label, _), metrics) in enumerate(zip(export['runs'], export['metrics'])):
+        values = ', '.join(f"{name}={value}" for name, value in metrics.items())
+        lines.append(f"# run={k}; {label}; {values}\n")
+    return ''.join(lines)
+
+
+def csv_chunks(export, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Strumień CSV w fragmentach (bajty)
+
+    Z pakietem pyarrow wiersze zapisuje jego pisarz CSV (C++, najkrótszy
+    zapis liczby bez utraty dokładności), bez niego - np.savetxt; w obu
+    przypadkach prosto z wycinków tablic NumPy.
+    """
+    yield (_metric_header(export) + ','.join(('run',) + COLUMNS) + '\n').encode('utf-8')
+    try:
+        from pyarrow import csv
+    except ImportError:
+        csv = None
+    if csv is not None:
+        options = csv.WriteOptions(include_header=False)
+        for batch in _record_batches(export, chunk_rows):
+            buffer = io.BytesIO()
+            csv.write_csv(batch, buffer, options)
+            yield buffer.getvalue()
+        return
+
+    fmt = [CSV_FORMATS[name] for name in ('run',) + COLUMNS]
+    for k, chunk in _run_chunks(export['runs'], chunk_rows):
+        block = np.empty((len(chunk['t']), len(COLUMNS) + 1))
+        block[:, 0] = k
+        for column, name in enumerate(COLUMNS, 1):
+            block[:, column] = chunk[name]
+        buffer = io.BytesIO()
+        np.savetxt(buffer, block, fmt=fmt, delimiter=',')
+        yield buffer.getvalue()
+
+
+def _schema(export):
+    import pyarrow as pa
+
+    labels = [label for label, _ in export['runs']]
+    return pa.schema([('run', pa.int32())] + [(name, pa.float64()) for name in COLUMNS],
+                     metadata={'labels': json.dumps(labels), 'metrics': json.dumps(export['metrics'])})
+
+
+def _record_batches(export, chunk_rows, schema=None):
+    """Kolejne fragmenty jako pyarrow.RecordBatch - kolumny bez kopiowania z wycinków tablic NumPy"""
+    import pyarrow as pa
+
+    schema = _schema(export) if schema is None else schema
+    for k, chunk in _run_chunks(export['runs'], chunk_rows):
+        n = len(chunk['t'])
+        arrays = [pa.array(np.full(n, k, dtype=np.int32))] + \
+                 [pa.array(np.ascontiguousarray(chunk[name], dtype=float)) for name in COLUMNS]
+        yield pa.record_batch(arrays, schema=schema)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Plik tylko do zapisu zbierający bajty do oddania w kolejnym fragmencie odpowiedzi"""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def arrow_chunks(export, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Strumień Arrow IPC (format strumieniowy) w fragmentach (bajty)
+
+    Każdy fragment to jeden RecordBatch zbudowany bez kopiowania z wycinków
+    tablic NumPy; metryki i etykiety przebiegów zapisane są w metadanych
+    schematu (JSON).
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError("Eksport Arrow wymaga pakietu pyarrow") from None
+
+    schema = _schema(export)
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in _record_batches(export, chunk_rows, schema):
+            writer.write_batch(batch)
+            yield sink.take()
+    yield sink.take()
+
+
+def export_chunks(export, fmt, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Fragmenty pliku eksportu w podanym formacie ('csv' lub 'arrow')"""
+    if fmt == 'csv':
+        return csv_chunks(export, chunk_rows)
+    if fmt == 'arrow':
+        return arrow_chunks(export, chunk_rows)
+    raise ValueError(f"Nieznany format eksportu: {fmt!r} (dostępne: {', '.join(EXPORT_FORMATS)})")
+
+
+def _float(args, name, default=None, positive=False):
+    value = args.get(name, default)
+    if value is None:
+        raise ValueError(f"Brak parametru {name}")
+    try:
+        value = float(value)
+    except ValueError:
+        raise ValueError(f"{name}: niepoprawna liczba") from None
+    if not np.isfinite(value):
+        raise ValueError(f"{name}: oczekiwano skończonej liczby")
+    if positive and value <= 0:
+        raise ValueError(f"{name}: oczekiwano dodatniej liczby")
+    return value
+
+
+def check_export_size(duration, dt, runs=1):
+    """Wyjątek ValueError, gdy eksport miałby więcej niż MAX_EXPORT_SAMPLES próbek"""
+    samples = runs * duration / dt
+    if samples > MAX_EXPORT_SAMPLES:
+        raise ValueError(f"Za dużo próbek eksportu ({samples:.3g}), limit to {MAX_EXPORT_SAMPLES} "
+                         f"(przebiegi × czas symulacji / dt)")
+
+
+def parse_options(text):
+    """
+    Opcje symulacji z parametru options (JSON) - tylko klucze EXPORT_OPTIONS o poprawnych typach
+
+    Wyjątek ValueError przy niepoprawnym JSON-ie, wartości innej niż
+    obiekt, nieznanym kluczu lub złej wartości opcji.
+    """
+    try:
+        options = json.loads(text or '{}')
+    except ValueError:
+        raise ValueError("Parametr options nie jest poprawnym JSON-em") from None
+    if not isinstance(options, dict):
+        raise ValueError("Parametr options musi być obiektem JSON")
+    unknown = sorted(set(options) - set(EXPORT_OPTIONS))
+    if unknown:
+        raise ValueError(f"Nieznane opcje symulacji: {', '.join(unknown)} (dostępne: {', '.join(EXPORT_OPTIONS)})")
+    if 'environment' in options:
+        check_environment(options['environment'])
+    if not isinstance(options.get('seed', 0), int) or isinstance(options.get('seed'), bool):
+        raise ValueError("seed: oczekiwano liczby całkowitej")
+    derivative_filter = options.get('derivative_filter')
+    if derivative_filter is not None and (not isinstance(derivative_filter, (int, float)) or
+                                          isinstance(derivative_filter, bool) or
+                                          not np.isfinite(derivative_filter) or derivative_filter <= 0):
+        raise ValueError("derivative_filter: oczekiwano dodatniej liczby")
+    if options.get('anti_windup') not in (None,) + ANTI_WINDUP:
+        raise ValueError(f"anti_windup: oczekiwano jednej z wartości: {', '.join(ANTI_WINDUP)}")
+    return options
+
+
+def export_from_query(args, progress=None):
+    """
+    Dane eksportu z parametrów zapytania
+
+    kind=scenario: drone, target, initial, kp, ti, td, duration, dt, method
+    (fixed/adaptive), tolerance, hold, options (obiekt JSON z opcjami
+    symulacji EXPORT_OPTIONS, patrz parse_options); kind=comparison: drones (parametr powtarzany), gains
+    (tekst jak w parse_gain_sets), target, initial, duration, dt. progress
+    trafia do symulacji (punkt anulowania zadania eksportu).
+
+    Wyjątek ValueError przy niepoprawnym parametrze (liczby muszą być
+    skończone, duration, dt i ti dodatnie) albo eksporcie ponad
+    MAX_EXPORT_SAMPLES próbek.
+    """
+    kind = args.get('kind', 'scenario')
+    target_height = _float(args, 'target')
+    initial_height = _float(args, 'initial')
+    duration = _float(args, 'duration', 60, positive=True)
+    dt = _float(args, 'dt', 0.01, positive=True)
+    if kind == 'comparison':
+        drone_keys = [key for key in args.getlist('drones') if key]
+        gain_sets = parse_gain_sets(args.get('gains', ''))
+        check_export_size(duration, dt, max(len(drone_keys) * len(gain_sets), 1))
+        return comparison_export(drone_keys, gain_sets, target_height, initial_height, duration=duration, dt=dt,
+                                 progress=progress)
+    if kind != 'scenario':
+        raise ValueError(f"Nieznany rodzaj eksportu: {kind!r}")
+
+    try:
+        drone = DRONES[args.get('drone', '')]
+    except KeyError:
+        raise ValueError(f"Nieznany dron: {args.get('drone')!r}") from None
+    check_export_size(duration, dt)
+    options = parse_options(args.get('options'))
+    if args.get('method') == 'adaptive' and not options:
+        hold = args.get('hold')
+        options = {'tolerance': _float(args, 'tolerance', 1e-3, positive=True),
+                   'hold_time': _float(args, 'hold', positive=True) if hold else None}
+        integrator = 'adaptive'
+    else:
+        integrator = 'hybrid'
+    return scenario_export(drone, target_height, initial_height, _float(args, 'kp'),
+                           _float(args, 'ti', positive=True), _float(args, 'td'), duration=duration, dt=dt,
+                           integrator=integrator, progress=progress, **options)
+
+
+def register_export_endpoint(server, path='/export'):
+    """
+    Dodaje do serwera Flask endpoint pobierania przebiegów (CSV lub Arrow IPC, odpowiedź strumieniowa)
+
+    Dane liczone są w kolejce zadań (JOBS) w kanale sesji z parametru
+    session, z tą samą kontrolą przyjęć co pozostałe ciężkie obliczenia.
+    """
+    from flask import Response, request
+
+    def export_endpoint():
+        fmt = request.args.get('format', 'csv')
+        try:
+            if fmt not in EXPORT_FORMATS:
+                raise ValueError(f"Nieznany format eksportu: {fmt!r} (dostępne: {', '.join(EXPORT_FORMATS)})")
+            session = request.args.get('session') or request.remote_addr
+            export = JOBS.run((session, 'export'), export_from_query, request.args, timeout=EXPORT_TIMEOUT)
+            chunks = export_chunks(export, fmt)
+            # Pierwszy fragment od razu - błędy (np. brak pyarrow) trafiają do odpowiedzi 400
+            first = next(chunks)
+        except (KeyError, ValueError) as e:
+            return f"Błąd: {e.args[0]}", 400, {'Content-Type': 'text/plain; charset=utf-8'}
+        except (JobRejected, TimeoutError) as e:
+            return f"Błąd: {e.args[0]}", 503, {'Content-Type': 'text/plain; charset=utf-8', 'Retry-After': '5'}
+        except JobCancelled:
+            return "Eksport zastąpiony nowszym żądaniem", 409, {'Content-Type': 'text/plain; charset=utf-8'}
+        mimetype, extension = EXPORT_FORMATS[fmt]
+
+        def body():
+            yield first
+            yield from chunks
+
+        name = request.args.get('kind', 'scenario')
+        return Response(body(), mimetype=mimetype,
+                        headers={'Content-Disposition': f'attachment; filename="drone-{name}.{extension}"'})
+
+    server.add_url_rule(path, 'drone_export', export_endpoint)
@@ -0,0 +1,435 @@
+import base64
+import time
+
+import numpy as np
+import plotly.graph_objects as go
+from dash import Patch
+from plotly.io.json import to_json_plotly
+from plotly.subplots import make_subplots
+
+from metrics import DEFAULT_TOLERANCE
+
+# Maksymalna liczba punktów przebiegu wysyłana do przeglądarki w trybie lekkim
+MAX_POINTS = 1500
+
+# Od tylu punktów przebiegi rysowane są przez WebGL (Scattergl)
+WEBGL_THRESHOLD = 1000
+
+# Kolejność śladów w figurze lekkiej - stała, żeby aktualizacje częściowe trafiały we właściwe ślady
+LIGHT_TRACES = ('height', 'settling', 'overshoot', 'thrust')
+
+# Kolory kolejnych przebiegów w trybie porównania
+COMPARISON_COLORS = ('#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+                     '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf')
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Indeksy punktów wybranych algorytmem LTTB (Largest-Triangle-Three-Buckets)
+
+    Zachowuje kształt przebiegu (ekstrema, załamania przy nasyceniu ciągu)
+    przy redukcji liczby punktów do n_out. Pierwszy i ostatni punkt są
+    zawsze zachowane.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (n_out - 2)
+    edges = (np.floor(np.arange(n_out - 1) * every).astype(int) + 1).tolist() + [n]
+    x_sums = np.add.reduceat(x, edges[:-1]).tolist()
+    y_sums = np.add.reduceat(y, edges[:-1]).tolist()
+    xs = x.tolist()
+    ys = y.tolist()
+
+    idx = [0] * n_out
+    idx[-1] = n - 1
+    a = 0
+    for k in range(n_out - 2):
+        start, end = edges[k], edges[k + 1]
+        # Średni punkt kolejnego kubełka
+        count = edges[k + 2] - end
+        avg_x = x_sums[k + 1] / count
+        avg_y = y_sums[k + 1] / count
+
+        xa, ya = xs[a], ys[a]
+        cx = xa - avg_x
+        cy = avg_y - ya
+        best_area = -1.0
+        for j in range(start, end):
+            area = abs(cx * (ys[j] - ya) - (xa - xs[j]) * cy)
+            if area > best_area:
+                best_area = area
+                a = j
+        idx[k + 1] = a
+    return np.array(idx)
+
+
+def downsample(t, *series, max_points=MAX_POINTS):
+    """Wspólne przerzedzenie kilku przebiegów (indeksy LTTB liczone po pierwszym)"""
+    idx = lttb_indices(t, series[0], max_points)
+    return (t[idx],) + tuple(s[idx] for s in series)
+
+
+def _typed_array(values):
+    """Tablica w formacie binarnym plotly.js (base64), używana w obiektach Patch"""
+    values = np.ascontiguousarray(values, dtype='<f4')
+    return {'dtype': 'f4', 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+
+
+def payload_stats(fig):
+    """Rozmiar odpowiedzi (bajty) i czas serializacji (ms) figury lub obiektu Patch"""
+    start = time.perf_counter()
+    payload = to_json_plotly(fig.to_plotly_json())
+    elapsed = time.perf_counter() - start
+    return {'bytes': len(payload.encode('utf-8')), 'serialize_ms': elapsed * 1000}
+
+
+def figure_signature(mode, t, target_height):
+    """Opis struktury figury - częściowa aktualizacja jest możliwa tylko przy tej samej strukturze"""
+    return {'mode': mode, 'n': len(t), 'target': target_height}
+
+
+def build_full_figure(t, h, u, target_height, metrics):
+    """Pełna figura: wszystkie próbki, linie stałe jako ślady (tryb pierwotny)"""
+    upper_bound = target_height * (1 + DEFAULT_TOLERANCE)
+    lower_bound = target_height * (1 - DEFAULT_TOLERANCE)
+
+    max_overshoot_value = metrics['peak_value']
+    max_overshoot_time = metrics['peak_time']
+    overshoot_percent = metrics['overshoot_percent']
+
+    settling_index = metrics['settling_index']
+    settling_time = metrics['settling_time'] if settling_index >= 0 else None
+
+    fig = make_subplots(rows=2, cols=1,
+                        subplot_titles=('Wysokość', 'Sygnał sterujący'))
+
+    # Podstawowe wykresy
+    fig.add_trace(
+        go.Scatter(x=t, y=h, name='Aktualna wysokość',
+                   line=dict(color='blue')),
+        row=1, col=1
+    )
+    fig.add_trace(
+        go.Scatter(x=t, y=[target_height] * len(t), name='Wysokość zadana',
+                   line=dict(color='red', dash='dash')),
+        row=1, col=1
+    )
+
+    # Dodanie tunelu akceptowalnego uchybu
+    fig.add_trace(
+        go.Scatter(x=t, y=[upper_bound] * len(t),
+                   name='Górna granica (2%)',
+                   line=dict(color='rgba(255,0,0,0.2)', dash='dot')),
+        row=1, col=1
+    )
+
+    # Wypełnienie tunelu
+    upper_line = [upper_bound] * len(t)
+    lower_line = [lower_bound] * len(t)
+    x_tunnel = list(t) + list(t)[::-1]
+    y_tunnel = upper_line + lower_line[::-1]
+
+    fig.add_trace(
+        go.Scatter(x=x_tunnel,
+                   y=y_tunnel,
+                   fill='toself',
+                   fillcolor='rgba(255,0,0,0.1)',
+                   line=dict(color='rgba(255,0,0,0)'),
+                   name='Tunel ±2%'),
+        row=1, col=1
+    )
+
+    fig.add_trace(
+        go.Scatter(x=t, y=[lower_bound] * len(t),
+                   name='Dolna granica (2%)',
+                   line=dict(color='rgba(255,0,0,0.2)', dash='dot')),
+        row=1, col=1
+    )
+
+    # Dodanie znacznika czasu ustalania
+    if settling_time is not None:
+        fig.add_trace(
+            go.Scatter(x=[settling_time], y=[h[settling_index]],
+                       mode='markers+text',
+                       name=f'Czas ustalania: {settling_time:.2f}s',
+                       text=[f't={settling_time:.2f}s'],
+                       textposition='top center',
+                       marker=dict(size=10, symbol='triangle-down'),
+                       textfont=dict(size=12)),
+            row=1, col=1
+        )
+
+    # Dodanie znacznika maksymalnego przeregulowania
+    if overshoot_percent > 0:
+        fig.add_trace(
+            go.Scatter(x=[max_overshoot_time], y=[max_overshoot_value],
+                       mode='markers+text',
+                       name=f'Przeregulowanie: {overshoot_percent:.1f}%',
+                       text=[f'MP={overshoot_percent:.1f}%'],
+                       textposition='top center',
+                       marker=dict(size=10, symbol='circle'),
+                       textfont=dict(size=12)),
+            row=1, col=1
+        )
+
+    fig.add_trace(
+        go.Scatter(x=t, y=u, name='Siła ciągu',
+                   line=dict(color='green')),
+        row=2, col=1
+    )
+
+    fig.update_layout(height=800, showlegend=True)
+    fig.update_xaxes(title_text="Czas [s]", row=2, col=1)
+    fig.update_yaxes(title_text="Wysokość [m]", row=1, col=1)
+    fig.update_yaxes(title_text="Siła ciągu [N]", row=2, col=1)
+
+    return fig
+
+
+def _tunnel_shapes(target_height, tolerance=DEFAULT_TOLERANCE):
+    """Linia zadana i tunel ±2% jako kształty układu (zamiast śladów o długości n)"""
+    upper_bound = target_height * (1 + tolerance)
+    lower_bound = target_height * (1 - tolerance)
+    common = dict(type='line', xref='x domain', yref='y', x0=0, x1=1)
+    return [
+        dict(type='rect', xref='x domain', yref='y', x0=0, x1=1, y0=lower_bound, y1=upper_bound,
+             fillcolor='rgba(255,0,0,0.1)', line=dict(width=0), layer='below',
+             name=f'Tunel ±{tolerance * 100:g}%', showlegend=True),
+        dict(common, y0=target_height, y1=target_height,
+             line=dict(color='red', dash='dash'), name='Wysokość zadana', showlegend=True),
+        dict(common, y0=upper_bound, y1=upper_bound,
+             line=dict(color='rgba(255,0,0,0.2)', dash='dot'), name=f'Górna granica ({tolerance * 100:g}%)'),
+        dict(common, y0=lower_bound, y1=lower_bound,
+             line=dict(color='rgba(255,0,0,0.2)', dash='dot'), name=f'Dolna granica ({tolerance * 100:g}%)'),
+    ]
+
+
+def _light_trace_data(t, h, u, metrics, max_points):
+    """Dane zmiennych śladów figury lekkiej, w kolejności LIGHT_TRACES"""
+    # float32 wystarcza do rysowania, a zmniejsza odpowiedź o połowę
+    t_h, h_ds = (a.astype(np.float32) for a in downsample(t, h, max_points=max_points))
+    t_u, u_ds = (a.astype(np.float32) for a in downsample(t, u, max_points=max_points))
+
+    settling_index = metrics['settling_index']
+    if settling_index >= 0:
+        settling_time = metrics['settling_time']
+        settling = dict(x=[settling_time], y=[h[settling_index]],
+                        name=f'Czas ustalania: {settling_time:.2f}s', text=[f't={settling_time:.2f}s'])
+    else:
+        settling = dict(x=[], y=[], name='Czas ustalania: -', text=[])
+
+    overshoot_percent = metrics['overshoot_percent']
+    if overshoot_percent > 0:
+        overshoot = dict(x=[metrics['peak_time']], y=[metrics['peak_value']],
+                         name=f'Przeregulowanie: {overshoot_percent:.1f}%', text=[f'MP={overshoot_percent:.1f}%'])
+    else:
+        overshoot = dict(x=[], y=[], name='Przeregulowanie: -', text=[])
+
+    return [dict(x=t_h, y=h_ds), settling, overshoot, dict(x=t_u, y=u_ds)]
+
+
+def build_light_figure(t, h, u, target_height, metrics, max_points=MAX_POINTS):
+    """
+    Lekka figura: przerzedzone przebiegi (LTTB), linie stałe i tunel jako
+    kształty układu, WebGL dla gęstych przebiegów
+    """
+    height, settling, overshoot, thrust = _light_trace_data(t, h, u, metrics, max_points)
+    line_trace = go.Scattergl if len(height['x']) >= WEBGL_THRESHOLD else go.Scatter
+
+    fig = make_subplots(rows=2, cols=1,
+                        subplot_titles=('Wysokość', 'Sygnał sterujący'))
+    fig.add_trace(line_trace(name='Aktualna wysokość', line=dict(color='blue'), **height), row=1, col=1)
+    fig.add_trace(go.Scatter(mode='markers+text', textposition='top center',
+                             marker=dict(size=10, symbol='triangle-down'), textfont=dict(size=12),
+                             **settling), row=1, col=1)
+    fig.add_trace(go.Scatter(mode='markers+text', textposition='top center',
+                             marker=dict(size=10, symbol='circle'), textfont=dict(size=12),
+                             **overshoot), row=1, col=1)
+    fig.add_trace(line_trace(name='Siła ciągu', line=dict(color='green'), **thrust), row=2, col=1)
+
+    fig.update_layout(height=800, showlegend=True, shapes=_tunnel_shapes(target_height))
+    fig.update_xaxes(title_text="Czas [s]", row=2, col=1)
+    fig.update_yaxes(title_text="Wysokość [m]", row=1, col=1)
+    fig.update_yaxes(title_text="Siła ciągu [N]", row=2, col=1)
+
+    return fig
+
+
+def patch_light_figure(t, h, u, target_height, metrics, update_shapes, max_points=MAX_POINTS):
+    """
+    Częściowa aktualizacja figury lekkiej (dash.Patch) - wysyłane są tylko
+    zmienione ślady, a kształty tunelu tylko po zmianie wysokości zadanej
+    """
+    patch = Patch()
+    for index, trace in enumerate(_light_trace_data(t, h, u, metrics, max_points)):
+        for key, value in trace.items():
+            patch['data'][index][key] = _typed_array(value) if isinstance(value, np.ndarray) else value
+    if update_shapes:
+        patch['layout']['shapes'] = _tunnel_shapes(target_height)
+    return patch
+
+
+def build_stream_figure(history):
+    """
+    Figura symulacji na żywo z historii bufora (słownik t, h, u, target)
+
+    Kolejność śladów (wysokość, wysokość zadana, ciąg) jest stała - kolejne
+    fragmenty dopisywane są przez extendData do śladów 0, 1 i 2.
+    """
+    fig = make_subplots(rows=2, cols=1, subplot_titles=('Wysokość (na żywo)', 'Sygnał sterujący'))
+    fig.add_trace(go.Scattergl(x=history['t'], y=history['h'], name='Aktualna wysokość',
+                               line=dict(color='blue')), row=1, col=1)
+    fig.add_trace(go.Scattergl(x=history['t'], y=history['target'], name='Wysokość zadana',
+                               line=dict(color='red', dash='dash')), row=1, col=1)
+    fig.add_trace(go.Scattergl(x=history['t'], y=history['u'], name='Siła ciągu',
+                               line=dict(color='green')), row=2, col=1)
+    fig.update_layout(height=600, showlegend=True, uirevision='live')
+    fig.update_xaxes(title_text="Czas [s]", row=2, col=1)
+    fig.update_yaxes(title_text="Wysokość [m]", row=1, col=1)
+    fig.update_yaxes(title_text="Siła ciągu [N]", row=2, col=1)
+    return fig
+
+
+def build_sweep_figure(kp_values, ti_values, grids, kp=None, ti=None):
+    """Mapy ciepła metryk przeglądu siatki Kp x Ti z zaznaczonymi bieżącymi nastawami"""
+    fig = make_subplots(rows=1, cols=3, horizontal_spacing=0.08,
+                        subplot_titles=('Czas ustalania [s]', 'Przeregulowanie [%]', 'Czas w nasyceniu [%]'))
+    panels = [
+        (grids['settling_time'], 'Viridis', 1),
+        (np.maximum(grids['overshoot_percent'], 0), 'Reds', 2),
+        (grids['saturation_fraction'] * 100, 'Oranges', 3),
+    ]
+    for z, colorscale, col in panels:
+        fig.add_trace(
+            go.Heatmap(x=kp_values, y=ti_values, z=z, colorscale=colorscale,
+                       colorbar=dict(x=col / 3 - 0.02, len=0.9, thickness=10),
+                       hovertemplate='Kp=%{x}<br>Ti=%{y}<br>%{z:.2f}<extra></extra>'),
+            row=1, col=col
+        )
+        if kp is not None and ti is not None:
+            fig.add_trace(
+                go.Scatter(x=[kp], y=[ti], mode='markers', showlegend=False,
+                           marker=dict(size=10, symbol='x', color='white', line=dict(width=1, color='black')),
+                           hoverinfo='skip'),
+                row=1, col=col
+            )
+        fig.update_xaxes(title_text='Kp', row=1, col=col)
+        fig.update_yaxes(title_text='Ti', row=1, col=col)
+
+    fig.update_layout(height=400, showlegend=False)
+    return fig
+
+
+def build_robustness_figure(result, target_height, tolerance=DEFAULT_TOLERANCE):
+    """Pasma percentylowe (5/50/95%) wysokości i ciągu z analizy Monte Carlo"""
+    t = result['t']
+    low, _, high = result['percentiles']
+    fig = make_subplots(rows=2, cols=1,
+                        subplot_titles=('Wysokość - zespół Monte Carlo', 'Siła ciągu - zespół Monte Carlo'))
+    for row, (name, values, color) in enumerate((('Wysokość', result['height'], '0,0,255'),
+                                                 ('Siła ciągu', result['thrust'], '0,128,0')), 1):
+        fig.add_trace(go.Scatter(x=t, y=values[2], line=dict(width=0), hoverinfo='skip', showlegend=False),
+                      row=row, col=1)
+        fig.add_trace(go.Scatter(x=t, y=values[0], fill='tonexty', fillcolor=f'rgba({color},0.2)',
+                                 line=dict(width=0), name=f'{name}: {low}-{high} percentyl'),
+                      row=row, col=1)
+        fig.add_trace(go.Scatter(x=t, y=values[1], line=dict(color=f'rgb({color})'),
+                                 name=f'{name}: mediana'),
+                      row=row, col=1)
+
+    fig.update_layout(height=600, showlegend=True, shapes=_tunnel_shapes(target_height, tolerance),
+                      title=f"Prawdopodobieństwo spełnienia wymagania ±{tolerance * 100:g}%: "
+                            f"{result['probability'] * 100:.1f}% "
+                            f"(n = {len(result['settling_time'])})")
+    fig.update_xaxes(title_text="Czas [s]", row=2, col=1)
+    fig.update_yaxes(title_text="Wysokość [m]", row=1, col=1)
+    fig.update_yaxes(title_text="Siła ciągu [N]", row=2, col=1)
+    return fig
+
+
+def build_mission_figure(result, max_points=MAX_POINTS):
+    """Przebieg misji: wysokość na tle harmonogramu wartości zadanej, ciąg i granice odcinków"""
+    t, h, u, r = result['t'], result['h'], result['u'], result['r']
+    t_h, h_ds = downsample(t, h, max_points=max_points)
+    t_u, u_ds = downsample(t, u, max_points=max_points)
+    # Harmonogram jest odcinkami liniowy - wystarczą punkty na granicach odcinków
+    breakpoints = sorted({index for _, _, start, end in result['bounds'] for index in (start, end - 1)
+                          if 0 <= index < len(t)})
+
+    fig = make_subplots(rows=2, cols=1, subplot_titles=('Wysokość - misja', 'Sygnał sterujący'))
+    fig.add_trace(go.Scatter(x=t[breakpoints], y=r[breakpoints], name='Wysokość zadana',
+                             line=dict(color='red', dash='dash')), row=1, col=1)
+    fig.add_trace(go.Scattergl(x=t_h, y=h_ds, name='Aktualna wysokość', line=dict(color='blue')), row=1, col=1)
+    fig.add_trace(go.Scattergl(x=t_u, y=u_ds, name='Siła ciągu', line=dict(color='green')), row=2, col=1)
+
+    shapes = [dict(type='line', xref='x', yref='paper', x0=t[start], x1=t[start], y0=0, y1=1,
+                   line=dict(color='rgba(0,0,0,0.25)', dash='dot'))
+              for _, _, start, _ in result['bounds'][1:] if start < len(t)]
+    fig.update_layout(height=700, showlegend=True, shapes=shapes)
+    fig.update_xaxes(title_text="Czas [s]", row=2, col=1)
+    fig.update_yaxes(title_text="Wysokość [m]", row=1, col=1)
+    fig.update_yaxes(title_text="Siła ciągu [N]", row=2, col=1)
+    return fig
+
+
+def build_comparison_figure(result, target_height, max_points=MAX_POINTS):
+    """Nałożone przebiegi wysokości i ciągu kilku dronów / zestawów nastaw"""
+    t = result['t']
+    # Przy wielu przebiegach każdy dostaje mniej punktów, żeby odpowiedź miała podobny rozmiar
+    points = max(max_points // max(len(result['labels']), 1), 200)
+    fig = make_subplots(rows=2, cols=1, subplot_titles=('Wysokość - porównanie', 'Sygnał sterujący - porównanie'))
+    for index, (label, h, u) in enumerate(zip(result['labels'], result['h'], result['u'])):
+        t_h, h_ds = downsample(t, h, max_points=points)
+        t_u, u_ds = downsample(t, u, max_points=points)
+        color = COMPARISON_COLORS[index % len(COMPARISON_COLORS)]
+        fig.add_trace(go.Scattergl(x=t_h, y=h_ds, name=label, legendgroup=label, line=dict(color=color)),
+                      row=1, col=1)
+        fig.add_trace(go.Scattergl(x=t_u, y=u_ds, name=label, legendgroup=label, showlegend=False,
+                                   line=dict(color=color)), row=2, col=1)
+    fig.update_layout(height=800, showlegend=True, shapes=_tunnel_shapes(target_height))
+    fig.update_xaxes(title_text="Czas [s]", row=2, col=1)
+    fig.update_yaxes(title_text="Wysokość [m]", row=1, col=1)
+    fig.update_yaxes(title_text="Siła ciągu [N]", row=2, col=1)
+    return fig
+
+
+def build_frequency_figure(analysis):
+    """Charakterystyki Bodego, wykres Nyquista i bieguny pętli zamkniętej (płaszczyzna z)"""
+    omega = analysis['omega']
+    fig = make_subplots(rows=2, cols=2, horizontal_spacing=0.12, vertical_spacing=0.15,
+                        subplot_titles=('Bode - moduł', 'Nyquist', 'Bode - faza', 'Bieguny pętli zamkniętej'))
+    fig.add_trace(go.Scatter(x=omega, y=analysis['magnitude_db'], name='|L| pętla otwarta',
+                             line=dict(color='blue')), row=1, col=1)
+    fig.add_trace(go.Scatter(x=omega, y=analysis['closed_loop_db'], name='|T| pętla zamknięta',
+                             line=dict(color='purple', dash='dash')), row=1, col=1)
+    fig.add_trace(go.Scatter(x=omega, y=analysis['phase_deg'], name='arg L', line=dict(color='blue'),
+                             showlegend=False), row=2, col=1)
+
+    # Nyquist w otoczeniu punktu -1 (przy niskich częstotliwościach |L| rośnie bez ograniczeń)
+    near = np.hypot(analysis['nyquist_real'], analysis['nyquist_imag']) < 10
+    for sign in (1, -1):
+        fig.add_trace(go.Scatter(x=analysis['nyquist_real'][near], y=sign * analysis['nyquist_imag'][near],
+                                 line=dict(color='blue', dash='solid' if sign > 0 else 'dot'),
+                                 name='L(e^{jωdt})', showlegend=False), row=1, col=2)
+    fig.add_trace(go.Scatter(x=[-1], y=[0], mode='markers', marker=dict(color='red', symbol='x', size=10),
+                             name='punkt -1'), row=1, col=2)
+
+    angle = np.linspace(0, 2 * np.pi, 181)
+    fig.add_trace(go.Scatter(x=np.cos(angle), y=np.sin(angle), line=dict(color='gray', dash='dot'),
+                             name='okrąg jednostkowy', showlegend=False), row=2, col=2)
+    fig.add_trace(go.Scatter(x=analysis['poles_real'], y=analysis['poles_imag'], mode='markers',
+                             marker=dict(color='red' if not analysis['stable'] else 'green', symbol='x', size=10),
+                             name='bieguny'), row=2, col=2)
+
+    for row in (1, 2):
+        fig.update_xaxes(type='log', title_text="ω [rad/s]" if row == 2 else None, row=row, col=1)
+    fig.update_yaxes(title_text="[dB]", row=1, col=1)
+    fig.update_yaxes(title_text="[°]", row=2, col=1)
+    fig.update_xaxes(title_text="Re", range=[-3, 1], row=1, col=2)
+    fig.update_yaxes(title_text="Im", range=[-2, 2], row=1, col=2)
+    fig.update_xaxes(title_text="Re z", row=2, col=2)
+    fig.update_yaxes(title_text="Im z", scaleanchor='x4', row=2, col=2)
+    fig.update_layout(height=700, showlegend=True)
+    return fig
@@ -0,0 +1,210 @@
+import numpy as np
+
+from cache import ResultCache, _canonical
+
+# Siatka częstotliwości [rad/s]: od MIN_FREQUENCY do tuż poniżej częstotliwości Nyquista pi / dt
+MIN_FREQUENCY = 1e-3
+FREQUENCY_POINTS = 600
+
+# Analizy pojedynczych nastaw (przeciąganie suwaka wraca do tych samych wartości)
+FREQUENCY_CACHE = ResultCache(max_bytes=16 * 1024 * 1024)
+
+
+def frequency_grid(dt, n=FREQUENCY_POINTS):
+    """Logarytmiczna siatka częstotliwości dla układu dyskretnego o kroku dt"""
+    return np.logspace(np.log10(MIN_FREQUENCY), np.log10(0.999 * np.pi / dt), n)
+
+
+def loop_response(drone, Kp, Ti, Td, dt, omega):
+    """
+    Transmitancja pętli otwartej L(e^{j omega dt}) wektorowo dla wielu nastaw
+
+    Regulator i obiekt są dokładnie tymi z simulate_drone_with_params:
+    całka z bieżącym uchybem (dt z / (z - 1)), pochodna różnicą wsteczną
+    ((z - 1) / (dt z)) i podwójny integrator dyskretyzowany ZOH
+    (dt^2 (z + 1) / (2 m (z - 1)^2)). Nasycenie ciągu jest pomijane.
+
+    Zwraca: tablicę zespoloną o kształcie rozgłoszonych nastaw + (len(omega),)
+    """
+    Kp, Ti, Td = (np.asarray(x, dtype=float)[..., None] for x in (Kp, Ti, Td))
+    z = np.exp(1j * np.asarray(omega) * dt)
+    plant = dt * dt * (z + 1) / (2 * drone.mass * (z - 1) ** 2)
+    controller = Kp * (1 + dt * z / (Ti * (z - 1)) + Td * (z - 1) / (dt * z))
+    return controller * plant
+
+
+def closed_loop_radius(drone, Kp, Ti, Td, dt):
+    """
+    Promień spektralny pętli zamkniętej dla wielu nastaw (stabilna, gdy < 1)
+
+    Macierze budowane są jak w hybrid.closed_loop_matrices, ale dla całej
+    paczki naraz, a wartości własne liczone jednym np.linalg.eigvals.
+    """
+    Kp, Ti, Td = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (Kp, Ti, Td)))
+    ke = Kp * (1 + dt / Ti + Td / dt)
+    c = np.stack([-ke, np.zeros_like(ke), Kp / Ti, -Kp * Td / dt], axis=-1)
+    A = np.broadcast_to(np.array([
+        [1.0, dt, 0.0, 0.0],
+        [0.0, 1.0, 0.0, 0.0],
+        [-dt, 0.0, 1.0, 0.0],
+        [-1.0, 0.0, 0.0, 0.0],
+    ]), Kp.shape + (4, 4)).copy()
+    A[..., 0, :] += 0.5 * dt * dt / drone.mass * c
+    A[..., 1, :] += dt / drone.mass * c
+    return np.abs(np.linalg.eigvals(A)).max(axis=-1)
+
+
+def margin_grid(drone, Kp, Ti, Td, dt=0.01, omega=None):
+    """
+    Zapasy stabilności wektorowo dla siatki nastaw
+
+    Przejścia |L| przez 1 i osi rzeczywistej przez ujemną półoś są
+    wyszukiwane na wspólnej siatce częstotliwości, a wartość L w przejściu
+    interpolowana liniowo między sąsiednimi próbkami.
+
+    Zwraca: słownik tablic o kształcie nastaw:
+    phase_margin - najmniejszy zapas fazy [deg] (NaN bez przejścia |L| = 1),
+    gain_margin - zapas wzmocnienia [dB]: najmniejsze dopuszczalne zwiększenie
+        wzmocnienia (inf, gdy brak ograniczenia),
+    crossover_frequency - częstotliwość przejścia |L| = 1 [rad/s],
+    stable - stabilność pętli zamkniętej (promień spektralny < 1).
+    """
+    omega = frequency_grid(dt) if omega is None else np.asarray(omega)
+    Kp, Ti, Td = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (Kp, Ti, Td)))
+    L = loop_response(drone, Kp, Ti, Td, dt, omega).reshape(-1, len(omega))
+    n = L.shape[0]
+
+    # Przejście |L| = 1 - wartości liczone tylko w przedziałach z przejściem
+    above = np.abs(L) > 1
+    rows, cols = np.nonzero(above[:, :-1] != above[:, 1:])
+    left, right = L[rows, cols], L[rows, cols + 1]
+    log_left, log_right = np.log(np.abs(left)), np.log(np.abs(right))
+    weight = log_left / (log_left - log_right)
+    phase = np.degrees(np.angle(-(left + weight * (right - left))))
+    frequency = omega[cols] + weight * (omega[cols + 1] - omega[cols])
+    phase_margin = np.full(n, np.inf)
+    np.minimum.at(phase_margin, rows, phase)
+    # Częstotliwość przejścia o najmniejszym zapasie fazy
+    crossover = np.full(n, np.nan)
+    best = phase == phase_margin[rows]
+    crossover[rows[best]] = frequency[best]
+
+    # Przejście przez ujemną półoś rzeczywistą - zmiana znaku części urojonej przy Re < 0
+    positive = L.imag > 0
+    rows, cols = np.nonzero((positive[:, :-1] != positive[:, 1:]) & (L.real[:, :-1] < 0) & (L.real[:, 1:] < 0))
+    left, right = L[rows, cols], L[rows, cols + 1]
+    weight = left.imag / (left.imag - right.imag)
+    gain = -20 * np.log10(np.abs(left + weight * (right - left)))
+    gain_margin = np.full(n, np.inf)
+    np.minimum.at(gain_margin, rows[gain > 0], gain[gain > 0])
+
+    shape = Kp.shape
+    return {
+        'phase_margin': np.where(np.isinf(phase_margin), np.nan, phase_margin).reshape(shape),
+        'gain_margin': gain_margin.reshape(shape),
+        'crossover_frequency': crossover.reshape(shape),
+        'stable': closed_loop_radius(drone, Kp, Ti, Td, dt) < 1,
+    }
+
+
+def stability_ranges(values, stable):
+    """Przedziały [od, do] kolejnych stabilnych wartości osi (dla opisu i znaczników suwaka)"""
+    ranges = []
+    start = None
+    for value, ok in zip(values, stable):
+        if ok and start is None:
+            start = value
+        elif not ok and start is not None:
+            ranges.append((start, previous))
+            start = None
+        previous = value
+    if start is not None:
+        ranges.append((start, previous))
+    return ranges
+
+
+def gain_axis_margins(drone, name, values, Kp, Ti, Td, dt=0.01, cache=None):
+    """
+    margin_grid wzdłuż jednej nastawy (name: 'Kp', 'Ti' lub 'Td') przy pozostałych stałych
+
+    Wynik zależy tylko od pozostałych nastaw, więc przy przeciąganiu suwaka
+    tej nastawy kolejne wywołania trafiają w pamięć podręczną.
+    """
+    cache = FREQUENCY_CACHE if cache is None else cache
+    values = np.asarray(values, dtype=float)
+    gains = {'Kp': Kp, 'Ti': Ti, 'Td': Td}
+    gains[name] = values
+    key = ('margins', name, drone.name, _canonical(drone.mass), _canonical(dt),
+           tuple(_canonical(gains[other]) for other in ('Kp', 'Ti', 'Td') if other != name),
+           _canonical(values[0]), _canonical(values[-1]), len(values))
+    entry = cache.get(key)
+    if entry is None:
+        entry = margin_grid(drone, gains['Kp'], gains['Ti'], gains['Td'], dt)
+        cache.put(key, entry)
+    return entry
+
+
+def loop_transfer(drone, Kp, Ti, Td, dt):
+    """Transmitancja pętli otwartej jako dyskretny control.TransferFunction"""
+    import control
+
+    z = control.TransferFunction([1, 0], [1], dt)
+    plant = dt * dt / (2 * drone.mass) * (z + 1) / (z - 1) ** 2
+    controller = Kp * (1 + dt * z / (Ti * (z - 1)) + Td * (z - 1) / (dt * z))
+    return control.minreal(controller * plant, verbose=False)
+
+
+def frequency_analysis(drone, Kp, Ti, Td, dt=0.01, cache=None):
+    """
+    Analiza częstotliwościowa modelu zlinearyzowanego (bez nasycenia ciągu)
+
+    Charakterystyki i zapasy stabilności liczone są na siatce frequency_grid
+    (te same definicje co w margin_grid), bieguny pętli zamkniętej -
+    pakietem control. Wynik trafia do pamięci podręcznej.
+
+    Zwraca: słownik z tablicami charakterystyk (omega, magnitude_db,
+    phase_deg, nyquist_real, nyquist_imag, closed_loop_db, poles_real,
+    poles_imag - bieguny w płaszczyźnie z) oraz wielkościami skalarnymi
+    (gain_margin_db, phase_margin, gain_crossover, bandwidth, stable).
+    """
+    import control
+
+    if Kp <= 0:
+        raise ValueError("Analiza częstotliwościowa wymaga Kp > 0 (bez regulatora pętla jest otwarta)")
+    cache = FREQUENCY_CACHE if cache is None else cache
+    key = ('frequency', drone.name, _canonical(drone.mass), _canonical(Kp), _canonical(Ti), _canonical(Td),
+           _canonical(dt))
+    entry = cache.get(key)
+    if entry is not None:
+        return entry
+
+    L = loop_transfer(drone, Kp, Ti, Td, dt)
+    closed = control.feedback(L, 1)
+    omega = frequency_grid(dt)
+    response = loop_response(drone, Kp, Ti, Td, dt, omega)
+    closed_response = response / (1 + response)
+    margins = margin_grid(drone, Kp, Ti, Td, dt, omega)
+    poles = control.poles(closed)
+
+    # Pasmo: pierwsza częstotliwość, przy której |T| spada 3 dB poniżej wzmocnienia statycznego
+    closed_db = 20 * np.log10(np.abs(closed_response))
+    below = np.nonzero(closed_db < 20 * np.log10(abs(control.dcgain(closed))) - 3)[0]
+    bandwidth = float(omega[below[0]]) if len(below) else np.nan
+
+    entry = {
+        'omega': omega,
+        'magnitude_db': 20 * np.log10(np.abs(response)),
+        'phase_deg': np.degrees(np.unwrap(np.angle(response))),
+        'nyquist_real': response.real,
+        'nyquist_imag': response.imag,
+        'closed_loop_db': closed_db,
+        'poles_real': poles.real,
+        'poles_imag': poles.imag,
+        'gain_margin_db': float(margins['gain_margin']),
+        'phase_margin': float(margins['phase_margin']),
+        'gain_crossover': float(margins['crossover_frequency']),
+        'bandwidth': bandwidth,
+        'stable': bool(np.abs(poles).max() < 1),
+    }
+    cache.put(key, entry)
+    return entry
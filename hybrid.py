@@ -0,0 +1,142 @@
+import numpy as np
+
+from simulation import G, PROGRESS_STEPS, PIDController
+
+# Długość pierwszego odcinka liniowego propagowanego naraz (kolejne są podwajane)
+INITIAL_CHUNK = 32
+
+# Liczba kolejnych kroków bez nasycenia, po której krokowe liczenie wraca do propagacji macierzowej
+LINEAR_RESUME_STEPS = 8
+
+
+def closed_loop_matrices(drone, Kp, Ti, Td, dt):
+    """
+    Dyskretny model pętli PID + podwójny integrator bez nasycenia
+
+    Stan x = [h, v, I, e_prev] (wysokość, prędkość, całka uchybu, poprzedni
+    uchyb) - dokładnie te wielkości, które przenosi pętla w
+    simulate_drone_with_params. Bez obcinania ciągu krok pętli jest afiniczny:
+        x[k+1] = A x[k] + b
+        u[k] = c x[k] + d
+    Punkt równowagi to zawis na wysokości zadanej, więc w odchyleniach
+    z = x - x_eq propagacja sprowadza się do z[k+1] = A z[k].
+
+    Zwraca: A (4x4), wektor c oraz wzmocnienie ke, przy czym d = ke * r
+    (r - wysokość zadana).
+    """
+    mass = drone.mass
+    # u = ke * (r - h) + ki * I - kd * e_prev
+    ke = Kp * (1 + dt / Ti + Td / dt)
+    ki = Kp / Ti
+    kd = Kp * Td / dt
+    c = np.array([-ke, 0.0, ki, -kd])
+
+    A = np.array([
+        [1.0, dt, 0.0, 0.0],
+        [0.0, 1.0, 0.0, 0.0],
+        [-dt, 0.0, 1.0, 0.0],
+        [-1.0, 0.0, 0.0, 0.0],
+    ])
+    # Wpływ ciągu na wysokość i prędkość (ZOH)
+    A[0] += 0.5 * dt * dt / mass * c
+    A[1] += dt / mass * c
+    return A, c, ke
+
+
+def _propagate(A, z0, steps):
+    """Stany z[0..steps] = A^k z0 liczone przez podwajanie (log2(steps) mnożeń macierzy)"""
+    states = np.empty((len(z0), steps + 1))
+    states[:, 0] = z0
+    power = A
+    filled = 1
+    while filled < steps + 1:
+        take = min(filled, steps + 1 - filled)
+        states[:, filled:filled + take] = power @ states[:, :take]
+        filled += take
+        if filled < steps + 1:
+            power = power @ power
+    return states
+
+
+def simulate_hybrid(drone, target_height, initial_height, Kp, Ti, Td, duration=60, dt=0.01,
+                    return_velocity=False, progress=None):
+    """
+    Symulacja hybrydowa: odcinki bez nasycenia propagowane macierzowo
+
+    Dopóki ciąg mieści się w [0, max_thrust], pętla jest liniowa i kolejne
+    stany liczone są naraz z macierzy przejścia (closed_loop_matrices).
+    Pierwsza próbka, w której ciąg wychodzi poza zakres, kończy odcinek
+    liniowy; przedział nasycenia liczony jest krokowo z obcinaniem ciągu,
+    jak w simulate_drone_with_params, aż ciąg wróci do zakresu na
+    LINEAR_RESUME_STEPS kroków. Regulator jest dyskretny (ZOH), więc
+    nasycenie zaczyna się i kończy tylko w chwilach próbkowania - próbka
+    wyjścia poza zakres jest dokładną chwilą zdarzenia.
+
+    progress: funkcja progress(fraction) wywoływana po każdym odcinku
+    (może przerwać obliczenia wyjątkiem, np. jobs.JobCancelled)
+
+    Zwraca: t, h, u (jak simulate_drone_with_params), a przy
+    return_velocity=True - t, h, v, u
+    """
+    t = np.arange(0, duration, dt)
+    n = len(t)
+    h = np.empty(n)
+    v = np.empty(n)
+    u = np.empty(n)
+    h[0] = initial_height
+    v[0] = 0.0
+    mass = drone.mass
+    max_thrust = drone.max_thrust
+    weight = mass * G
+
+    A, c, ke = closed_loop_matrices(drone, Kp, Ti, Td, dt)
+    r = float(target_height)
+    d = ke * r
+    # Stan równowagi (zawis na wysokości zadanej)
+    x_eq = np.array([r, 0.0, weight * Ti / Kp if Kp else 0.0, 0.0])
+
+    x = np.array([float(initial_height), 0.0, 0.0, 0.0])
+    k = 0
+    chunk = INITIAL_CHUNK
+    while k < n - 1:
+        if progress is not None:
+            progress(k / n)
+        u_k = c @ x + d
+        if 0 <= u_k <= max_thrust and Kp:
+            # Odcinek liniowy - propagacja macierzowa i szukanie wejścia w nasycenie
+            steps = min(chunk, n - 1 - k)
+            states = _propagate(A, x - x_eq, steps) + x_eq[:, None]
+            thrust = c @ states[:, :steps] + d
+            outside = (thrust < 0) | (thrust > max_thrust)
+            accepted = int(np.argmax(outside)) if outside.any() else steps
+            h[k + 1:k + accepted + 1] = states[0, 1:accepted + 1]
+            v[k + 1:k + accepted + 1] = states[1, 1:accepted + 1]
+            u[k:k + accepted] = thrust[:accepted]
+            x = states[:, accepted].copy()
+            k += accepted
+            chunk = chunk * 2 if accepted == steps else INITIAL_CHUNK
+            continue
+
+        # Przedział nasycenia - krok po kroku z obcinaniem ciągu. Powrót do
+        # propagacji macierzowej dopiero po LINEAR_RESUME_STEPS krokach bez
+        # nasycenia, żeby szybkie przełączanie (drgania ciągu) nie rozbijało
+        # przebiegu na bardzo krótkie odcinki liniowe.
+        h_i, v_i, integral, prev_error = x.tolist()
+        pid = PIDController(Kp, Ti, Td, dt, max_thrust, integral=integral, prev_error=prev_error)
+        in_range = 0
+        while k < n - 1 and in_range < LINEAR_RESUME_STEPS:
+            u_i = pid.update(r - h_i)
+            in_range = in_range + 1 if u_i == pid.u_raw else 0
+            u[k] = u_i
+            a = u_i / mass - G
+            h_i, v_i = h_i + v_i * dt + 0.5 * a * dt * dt, v_i + a * dt
+            k += 1
+            h[k] = h_i
+            v[k] = v_i
+            if k % PROGRESS_STEPS == 0 and progress is not None:
+                progress(k / n)
+        x = np.array([h_i, v_i, pid.integral, pid.prev_error])
+        chunk = INITIAL_CHUNK
+
+    u[-1] = u[-2]
+    return (t, h, v, u) if return_velocity else (t, h, u)
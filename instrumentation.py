@@ -0,0 +1,227 @@
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# Granice kubełków histogramu czasów [s]
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Liczba ostatnich żądań pokazywanych w panelu diagnostycznym
+RECENT_REQUESTS = 50
+
+# Profilowanie wolnych żądań (opcjonalne): próg w ms i katalog na profile
+PROFILE_SLOW_MS = float(os.environ.get('DRONE_SIM_PROFILE_SLOW_MS', 0))
+PROFILE_DIR = os.environ.get('DRONE_SIM_PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = 0.005
+
+_current = contextvars.ContextVar('drone_request', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class Registry:
+    """Zbiorcze metryki serwera: histogramy faz, liczniki i ostatnie żądania"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = Counter()
+        self.recent = deque(maxlen=RECENT_REQUESTS)
+        self.collectors = []
+
+    def observe(self, callback, phase, seconds):
+        with self._lock:
+            histogram = self.histograms.get((callback, phase))
+            if histogram is None:
+                histogram = self.histograms[(callback, phase)] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, name, labels=(), value=1):
+        with self._lock:
+            self.counters[(name, tuple(labels))] += value
+
+    def add_request(self, record):
+        with self._lock:
+            self.recent.append(record)
+
+    def recent_requests(self):
+        with self._lock:
+            return list(self.recent)
+
+    def add_collector(self, collector):
+        """collector() -> lista (nazwa, etykiety, wartość) dołączana do /metrics jako gauge"""
+        self.collectors.append(collector)
+
+    def render_prometheus(self):
+        """Metryki w formacie tekstowym Prometheusa"""
+        lines = ['# HELP drone_phase_seconds Czas faz obsługi żądań',
+                 '# TYPE drone_phase_seconds histogram']
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+            for (callback, phase), histogram in histograms:
+                labels = f'callback="{callback}",phase="{phase}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'drone_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'drone_phase_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'drone_phase_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+                lines.append(f'drone_phase_seconds_count{{{labels}}} {histogram.count}')
+
+        declared = set()
+        for (name, labels), value in counters:
+            if name not in declared:
+                lines.append(f'# TYPE {name} counter')
+                declared.add(name)
+            lines.append(f'{name}{_labels(labels)} {value:g}')
+
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                if name not in declared:
+                    lines.append(f'# TYPE {name} gauge')
+                    declared.add(name)
+                lines.append(f'{name}{_labels(labels)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+REGISTRY = Registry()
+
+
+@contextmanager
+def phase(name):
+    """Pomiar czasu fazy obsługi żądania (symulacja, metryki, figura, serializacja...)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        record = _current.get()
+        callback = record['callback'] if record is not None else '-'
+        REGISTRY.observe(callback, name, elapsed)
+        if record is not None:
+            record['phases'][name] = record['phases'].get(name, 0.0) + elapsed * 1000
+
+
+def note(name, value):
+    """Dodatkowa informacja o bieżącym żądaniu (kroki symulacji, trafienie w pamięć, rozmiar odpowiedzi)"""
+    record = _current.get()
+    if record is not None:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            record['notes'][name] = record['notes'].get(name, 0) + value
+        else:
+            record['notes'][name] = value
+    if isinstance(value, bool):
+        REGISTRY.inc(f'drone_{name}_total', (('value', str(value).lower()),))
+    elif isinstance(value, (int, float)):
+        REGISTRY.inc(f'drone_{name}_total', value=value)
+
+
+class SamplingProfiler:
+    """
+    Prosty profiler próbkujący: co interval zapisuje stos wątku żądania
+
+    Wynik to liczniki stosów w formacie "collapsed" (plik;funkcja;...),
+    który można bezpośrednio podać do narzędzi typu flamegraph/speedscope.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def instrument(callback):
+    """
+    Dekorator callbacku Dash: mierzy czas całkowity i fazy, zapisuje żądanie
+    do panelu diagnostycznego i opcjonalnie profiluje wolne żądania
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            record = {'callback': callback, 'started': time.time(), 'phases': {}, 'notes': {}}
+            token = _current.set(record)
+            profiler = None
+            if PROFILE_SLOW_MS > 0:
+                profiler = SamplingProfiler(threading.get_ident()).start()
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                REGISTRY.inc('drone_callback_errors_total', (('callback', callback),))
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                _current.reset(token)
+                record['total_ms'] = elapsed * 1000
+                REGISTRY.observe(callback, 'total', elapsed)
+                REGISTRY.inc('drone_callback_requests_total', (('callback', callback),))
+                REGISTRY.add_request(record)
+                if profiler is not None:
+                    profiler.stop()
+                    if record['total_ms'] >= PROFILE_SLOW_MS:
+                        path = os.path.join(PROFILE_DIR, f"{callback}-{int(record['started'] * 1000)}.collapsed")
+                        profiler.dump(path)
+                        record['notes']['profile'] = path
+        return wrapper
+    return decorate
+
+
+def register_metrics_endpoint(server, path='/metrics'):
+    """Dodaje do serwera Flask endpoint z metrykami w formacie Prometheusa"""
+    def metrics_endpoint():
+        return REGISTRY.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+    server.add_url_rule(path, 'drone_metrics', metrics_endpoint)
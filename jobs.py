@@ -0,0 +1,421 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Maksymalna liczba zakończonych zadań przechowywanych do odczytu wyniku
+MAX_FINISHED_JOBS = 256
+
+# Kontrola przyjęć: limit zadań oczekujących w kolejce na sesję i łącznie
+MAX_SESSION_PENDING = 4
+MAX_PENDING = 64
+
+# Minimalny odstęp zapisu postępu i sprawdzania znacznika anulowania w katalogu stanu [s]
+SNAPSHOT_INTERVAL = 0.5
+
+# Po tym czasie znacznik zadania oczekującego przestaje się liczyć do limitów (np. po awarii procesu) [s]
+PENDING_TTL = 600
+
+
+class JobCancelled(Exception):
+    """Zadanie zostało anulowane (np. zastąpione nowszym żądaniem)"""
+
+
+class JobRejected(Exception):
+    """Kolejka jest pełna - zadanie nie zostało przyjęte (kontrola przyjęć)"""
+
+
+class Job:
+    """Zadanie w tle z postępem i kooperacyjnym anulowaniem"""
+
+    def __init__(self, channel):
+        self.id = uuid.uuid4().hex
+        self.channel = channel
+        self.status = 'pending'  # pending / running / done / failed / cancelled
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+
+    @property
+    def session(self):
+        """Sesja właściciela - pierwszy element kanału (session_id, rodzaj)"""
+        return self.channel[0] if isinstance(self.channel, tuple) else self.channel
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def report(self, fraction):
+        """
+        Aktualizacja postępu wywoływana przez obliczenia
+
+        Jest też punktem anulowania - rzuca JobCancelled, gdy zadanie
+        zostało w międzyczasie anulowane.
+        """
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+
+    def wait(self, timeout=None):
+        """Czeka na zakończenie zadania; zwraca True, gdy zadanie się zakończyło"""
+        return self._done_event.wait(timeout)
+
+    def snapshot(self):
+        """Stan zadania do zapisu w katalogu współdzielonym przez procesy serwera"""
+        return {name: getattr(self, name) for name in
+                ('id', 'channel', 'status', 'progress', 'result', 'error', 'created', 'finished')}
+
+    @classmethod
+    def from_snapshot(cls, data):
+        job = cls(data['channel'])
+        for name, value in data.items():
+            setattr(job, name, value)
+        if job.done:
+            job._done_event.set()
+        return job
+
+
+def _admit(session_pending, pending, max_session_pending, max_pending):
+    """Kontrola przyjęć: rzuca JobRejected, gdy sesja lub cały serwer ma za dużo oczekujących zadań"""
+    if session_pending >= max_session_pending:
+        raise JobRejected(f"Za dużo zadań sesji w kolejce (limit: {max_session_pending})")
+    if pending >= max_pending:
+        raise JobRejected("Serwer jest przeciążony - kolejka zadań jest pełna")
+
+
+def _digest(value):
+    """Nazwa pliku dla kanału lub sesji (dowolny obiekt o stabilnym repr)"""
+    return hashlib.sha1(repr(value).encode('utf-8')).hexdigest()
+
+
+class FairQueue:
+    """
+    Kolejka sprawiedliwa między sesjami
+
+    Każda sesja ma własną kolejkę FIFO, a wolny wątek bierze zadanie od
+    kolejnej sesji z oczekującymi zadaniami (round-robin), więc seria
+    ciężkich zadań jednego użytkownika nie blokuje pozostałych.
+    """
+
+    def __init__(self, max_session_pending=MAX_SESSION_PENDING, max_pending=MAX_PENDING):
+        self.max_session_pending = max_session_pending
+        self.max_pending = max_pending
+        self._queues = OrderedDict()
+        self._condition = threading.Condition()
+
+    def put(self, job):
+        """Dodaje zadanie albo rzuca JobRejected po przekroczeniu limitów"""
+        with self._condition:
+            queue = self._queues.get(job.session)
+            # Anulowane zadania czekają tylko na zdjęcie z kolejki - nie liczą się do limitów
+            session_pending = 0 if queue is None else sum(not item.cancelled for item in queue)
+            _admit(session_pending, self.pending(), self.max_session_pending, self.max_pending)
+            if queue is None:
+                queue = self._queues[job.session] = deque()
+            queue.append(job)
+            self._condition.notify()
+
+    def get(self):
+        """Następne zadanie (blokuje, gdy kolejka jest pusta)"""
+        with self._condition:
+            while not self._queues:
+                self._condition.wait()
+            session, queue = next(iter(self._queues.items()))
+            job = queue.popleft()
+            # Sesja wraca na koniec kolejki sesji - następne zadanie bierze kolejna sesja
+            del self._queues[session]
+            if queue:
+                self._queues[session] = queue
+            return job
+
+    def pending(self):
+        with self._condition:
+            return sum(not job.cancelled for queue in self._queues.values() for job in queue)
+
+
+class JobManager:
+    """
+    Kolejka zadań w tle ze sprawiedliwym przydziałem między sesje
+
+    Każde zadanie należy do kanału (sesja + rodzaj obliczeń); nowe zadanie
+    w kanale anuluje poprzednie, więc serwer nie liczy wyników dla
+    wartości, od których użytkownik już odszedł. Zadania czekają w FairQueue
+    z kontrolą przyjęć, a liczba wątków wykonujących je jest stała - ciężkie
+    obliczenia nie zabierają wątków serwera obsługujących interaktywne
+    callbacki. Ciężka numeryka zadań trafia dalej do puli procesów.
+
+    Bez state_dir zastępowanie zadań w kanale i limity przyjęć działają
+    w obrębie jednego procesu. Przy state_dir (katalog współdzielony przez
+    procesy serwera) stan zadań jest tam zapisywany, więc odpytanie
+    o zadanie trafiające do innego procesu niż ten, który je przyjął, też
+    widzi postęp i wynik; pod blokadą pliku jobs.lock są tam też bieżące
+    zadania kanałów (channels/), znaczniki zadań oczekujących (pending/,
+    wspólne limity przyjęć) i znaczniki anulowania (<id>.cancel), więc
+    nowe zadanie anuluje poprzednie z kanału także w innym procesie.
+
+    Anulowanie jest kooperacyjne: obliczenia przerywa najbliższe wywołanie
+    progress (rzuca JobCancelled), dlatego długie pętle (simulation.py,
+    hybrid.py, adaptive.py, parallel.run_in_pool) wywołują je regularnie.
+    """
+
+    def __init__(self, max_workers=2, max_finished=MAX_FINISHED_JOBS, max_session_pending=MAX_SESSION_PENDING,
+                 max_pending=MAX_PENDING, state_dir=None):
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self.state_dir = state_dir
+        if state_dir:
+            for name in ('channels', 'pending'):
+                os.makedirs(os.path.join(state_dir, name), exist_ok=True)
+        self._queue = FairQueue(max_session_pending, max_pending)
+        self._threads = []
+        self._jobs = OrderedDict()
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def submit(self, channel, fn, *args, **kwargs):
+        """
+        Kolejkuje fn(*args, progress=job.report, **kwargs) i zwraca Job
+
+        Rzuca JobRejected, gdy sesja lub cały serwer ma za dużo zadań w kolejce.
+        """
+        job = Job(channel)
+        job._task = (fn, args, kwargs)
+        with self._shared():
+            previous = self._channels.get(channel)
+            if previous is not None and not previous.done:
+                previous.cancel()
+            if self.state_dir:
+                self._supersede(job)
+            try:
+                self._queue.put(job)
+            except JobRejected:
+                if self.state_dir:
+                    self._unmark_pending(job.session, job.id)
+                raise
+            self._channels[channel] = job
+            self._jobs[job.id] = job
+            self._prune()
+            # Zapis pod blokadą - następne zgłoszenie w kanale (też z innego procesu) widzi to zadanie
+            self._save(job)
+            self._start_workers()
+        return job
+
+    def run(self, channel, fn, *args, timeout=None, **kwargs):
+        """
+        Wykonuje fn(*args, progress=job.report, **kwargs) w puli zadań i czeka na wynik
+
+        Dla ciężkich obliczeń wywoływanych wprost z callbacków - przechodzą
+        przez tę samą kontrolę przyjęć i kolejkę sprawiedliwą co zadania w tle.
+        Po przekroczeniu timeout zadanie jest anulowane, a obliczenia
+        przerywa najbliższe wywołanie progress.
+        Rzuca JobRejected, JobCancelled, TimeoutError albo wyjątek z fn.
+        """
+        job = self.submit(channel, fn, *args, **kwargs)
+        if not job.wait(timeout):
+            job.cancel()
+            raise TimeoutError("Przekroczono czas oczekiwania na wynik obliczeń")
+        if job.status == 'cancelled':
+            raise JobCancelled()
+        if job.status == 'failed':
+            raise job.error
+        return job.result
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and job_id:
+            job = self._load(job_id)
+        return job
+
+    def pending(self):
+        return self._queue.pending()
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+            if self.state_dir and not job.done:
+                # Zadanie mogło trafić do innego procesu - ten sprawdza znacznik przy progress
+                with self._shared():
+                    self._mark_cancelled(job.session, job.id)
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def _start_workers(self):
+        # Wątki startują przy pierwszym zadaniu - proces nadrzędny serwera z preload ich nie tworzy
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(target=self._worker, name=f"drone-job-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            fn, args, kwargs = job._task
+            del job._task
+            self._run(job, fn, args, kwargs)
+
+    def _run(self, job, fn, args, kwargs):
+        if self.state_dir:
+            with self._shared():
+                self._unmark_pending(job.session, job.id)
+                if os.path.exists(self._cancel_path(job.id)):
+                    job.cancel()
+        if job.cancelled:
+            job.status = 'cancelled'
+        else:
+            job.status = 'running'
+            self._save(job)
+            last_saved = [time.monotonic()]
+
+            def progress(fraction):
+                if self.state_dir and time.monotonic() - last_saved[0] > SNAPSHOT_INTERVAL:
+                    last_saved[0] = time.monotonic()
+                    if os.path.exists(self._cancel_path(job.id)):
+                        job.cancel()
+                    self._save(job)
+                job.report(fraction)
+
+            try:
+                job.result = fn(*args, progress=progress, **kwargs)
+                job.progress = 1.0
+                job.status = 'done'
+            except JobCancelled:
+                job.status = 'cancelled'
+            except Exception as e:
+                job.error = e
+                job.status = 'failed'
+        job.finished = time.time()
+        self._save(job)
+        job._done_event.set()
+
+    def _path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.pkl")
+
+    def _cancel_path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.cancel")
+
+    def _channel_path(self, channel):
+        return os.path.join(self.state_dir, 'channels', _digest(channel))
+
+    def _pending_path(self, session, job_id):
+        return os.path.join(self.state_dir, 'pending', f"{_digest(session)}.{job_id}")
+
+    @contextmanager
+    def _shared(self):
+        """Sekcja krytyczna wątków procesu, a przy state_dir - także wszystkich procesów (blokada pliku)"""
+        with self._lock:
+            if not self.state_dir:
+                yield
+                return
+            import fcntl
+
+            with open(os.path.join(self.state_dir, 'jobs.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _supersede(self, job):
+        """Wspólne limity przyjęć i anulowanie poprzedniego zadania kanału w dowolnym procesie (pod _shared)"""
+        channel_path = self._channel_path(job.channel)
+        try:
+            with open(channel_path) as f:
+                previous_id = f.read().strip()
+        except OSError:
+            previous_id = ''
+        previous = self._load(previous_id) if previous_id != job.id else None
+        if previous is not None and not previous.done:
+            self._mark_cancelled(previous.session, previous.id)
+
+        session = _digest(job.session) + '.'
+        now = time.time()
+        pending = session_pending = 0
+        for entry in os.scandir(os.path.join(self.state_dir, 'pending')):
+            try:
+                if now - entry.stat().st_mtime > PENDING_TTL:
+                    os.remove(entry.path)
+                    continue
+            except OSError:
+                continue
+            pending += 1
+            session_pending += entry.name.startswith(session)
+        _admit(session_pending, pending, self._queue.max_session_pending, self._queue.max_pending)
+
+        open(self._pending_path(job.session, job.id), 'w').close()
+        with open(channel_path, 'w') as f:
+            f.write(job.id)
+
+    def _mark_cancelled(self, session, job_id):
+        # Anulowane zadanie nie liczy się już do limitów przyjęć
+        open(self._cancel_path(job_id), 'w').close()
+        self._unmark_pending(session, job_id)
+
+    def _unmark_pending(self, session, job_id):
+        try:
+            os.remove(self._pending_path(session, job_id))
+        except OSError:
+            pass
+
+    def _save(self, job):
+        if not self.state_dir:
+            return
+        # Zapis atomowy jak w ResultCache - inne procesy nigdy nie widzą niekompletnego pliku
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(job.snapshot(), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(job.id))
+        except (OSError, pickle.PicklingError):
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _load(self, job_id):
+        if not self.state_dir or not all(c in '0123456789abcdef' for c in str(job_id)):
+            return None
+        try:
+            with open(self._path(job_id), 'rb') as f:
+                return Job.from_snapshot(pickle.load(f))
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _prune(self):
+        # Usuwanie najstarszych zakończonych zadań ponad limit
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            job = self._jobs.pop(job_id)
+            if self._channels.get(job.channel) is job:
+                del self._channels[job.channel]
+            if self.state_dir:
+                for path in (self._path(job_id), self._cancel_path(job_id)):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+
+# Wspólna kolejka zadań aplikacji; katalog stanu (wiele procesów serwera) ustawiany zmienną środowiskową
+JOBS = JobManager(max_workers=int(os.environ.get('DRONE_SIM_JOB_WORKERS', 2)),
+                  state_dir=os.environ.get('DRONE_SIM_JOB_DIR'))
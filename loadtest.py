@@ -0,0 +1,235 @@
+"""
+Test obciążeniowy: N równoległych klientów przeciągających suwaki
+
+Każdy klient ma własną sesję i wysyła kolejne żądania update_graphs z Kp
+zmienianym jak przy przeciąganiu suwaka (z podpisem figury z poprzedniej
+odpowiedzi, jak przeglądarka). Opcjonalni klienci ciężcy w tym samym
+czasie uruchamiają porównania wsadowe - ogon opóźnień klientów
+interaktywnych pokazuje, czy ciężkie obliczenia ich nie zagładzają.
+
+Przykłady:
+    python loadtest.py --clients 20 --duration 20
+    python loadtest.py --clients 50 --heavy 4 --url http://localhost:8050
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+
+# Percentyle opóźnień w raporcie
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Zestawy nastaw porównania klienta ciężkiego (× wszystkie drony)
+HEAVY_GAINS = "\n".join(f"{kp} 4 1.5" for kp in range(5, 105, 5))
+
+
+class LocalTransport:
+    """Żądania do aplikacji w tym procesie (klient testowy Flask, po jednym na wątek)"""
+
+    def __init__(self):
+        import main
+
+        self.server = main.create_app(warm=True).server
+        self._local = threading.local()
+
+    def _client(self):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self.server.test_client()
+        return self._local.client
+
+    def get(self, path):
+        response = self._client().get(path)
+        return response.status_code, response.get_json()
+
+    def post(self, path, body):
+        response = self._client().post(path, json=body)
+        return response.status_code, response.get_json() if response.status_code == 200 else None
+
+
+class HttpTransport:
+    """Żądania HTTP do działającego serwera"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def _request(self, request):
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+    def get(self, path):
+        return self._request(urllib.request.Request(self.url + path))
+
+    def post(self, path, body):
+        return self._request(urllib.request.Request(
+            self.url + path, data=json.dumps(body).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}))
+
+
+def layout_values(node, values=None):
+    """Właściwości komponentów z układu strony: id -> słownik props"""
+    values = {} if values is None else values
+    if isinstance(node, dict):
+        props = node.get('props', {})
+        if 'id' in props:
+            values[props['id']] = props
+        for child in props.values():
+            layout_values(child, values)
+    elif isinstance(node, list):
+        for child in node:
+            layout_values(child, values)
+    return values
+
+
+class CallbackRequests:
+    """Budowa żądań /_dash-update-component z listy zależności aplikacji i wartości z układu strony"""
+
+    def __init__(self, transport):
+        status, dependencies = transport.get('/_dash-dependencies')
+        if status != 200:
+            raise RuntimeError(f"/_dash-dependencies zwróciło {status}")
+        _, layout = transport.get('/_dash-layout')
+        self.dependencies = dependencies
+        self.defaults = layout_values(layout)
+
+    def find(self, output):
+        for dependency in self.dependencies:
+            if output in dependency['output']:
+                return dependency
+        raise KeyError(f"Brak callbacku z wyjściem {output}")
+
+    def _value(self, item, values):
+        key = f"{item['id']}.{item['property']}"
+        if key in values:
+            return values[key]
+        return self.defaults.get(item['id'], {}).get(item['property'])
+
+    def body(self, dependency, values, changed):
+        output = dependency['output']
+        if output.startswith('..'):
+            outputs = [dict(zip(('id', 'property'), part.split('@')[0].split('.', 1)))
+                       for part in output.strip('.').split('...')]
+        else:
+            outputs = dict(zip(('id', 'property'), output.split('@')[0].split('.', 1)))
+        return {
+            'output': output,
+            'outputs': outputs,
+            'inputs': [dict(item, value=self._value(item, values)) for item in dependency['inputs']],
+            'state': [dict(item, value=self._value(item, values)) for item in dependency['state']],
+            'changedPropIds': [changed],
+        }
+
+
+class Recorder:
+    """Czasy odpowiedzi i błędy w podziale na rodzaj żądania (bezpieczny dla wątków)"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, kind, seconds, ok):
+        with self._lock:
+            if ok:
+                self.latencies.setdefault(kind, []).append(seconds)
+            else:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def report(self, elapsed):
+        lines = [f"{'żądanie':<22}{'liczba':>8}{'błędy':>7}{'na s':>8}" +
+                 ''.join(f"{f'p{p:g}':>10}" for p in PERCENTILES) + f"{'max':>10}   [ms]"]
+        for kind in sorted(set(self.latencies) | set(self.errors)):
+            values = np.array(self.latencies.get(kind, [np.nan])) * 1000
+            lines.append(f"{kind:<22}{len(self.latencies.get(kind, [])):>8}{self.errors.get(kind, 0):>7}"
+                         f"{len(self.latencies.get(kind, [])) / elapsed:>8.1f}" +
+                         ''.join(f"{np.percentile(values, p):>10.1f}" for p in PERCENTILES) +
+                         f"{np.max(values):>10.1f}")
+        return '\n'.join(lines)
+
+
+def slider_client(transport, requests, recorder, stop, think_time, seed):
+    """Klient interaktywny: przeciąga suwak Kp tam i z powrotem"""
+    rng = random.Random(seed)
+    dependency = requests.find('simulation-graphs.figure')
+    session = uuid.uuid4().hex
+    signature = None
+    kp = rng.uniform(5, 60)
+    step = 0.5
+    while not stop.is_set():
+        kp = kp + step
+        if not 1 <= kp <= 100:
+            step = -step
+            kp = min(max(kp, 1), 100)
+        values = {'kp-slider.value': round(kp, 1), 'session-id.data': session,
+                  'figure-signature.data': signature}
+        start = time.perf_counter()
+        status, response = transport.post('/_dash-update-component',
+                                          requests.body(dependency, values, 'kp-slider.value'))
+        recorder.add('update_graphs', time.perf_counter() - start, status == 200)
+        if status == 200:
+            signature = response['response'].get('figure-signature', {}).get('data', signature)
+        time.sleep(rng.uniform(0, 2 * think_time))
+
+
+def heavy_client(transport, requests, recorder, stop, seed):
+    """Klient ciężki: porównania wsadowe jedno po drugim"""
+    dependency = requests.find('compare-graph.figure')
+    drones = [option['value'] for option in requests.defaults['compare-drones']['options']]
+    session = uuid.uuid4().hex
+    for clicks in itertools.count(1):
+        if stop.is_set():
+            break
+        values = {'compare-button.n_clicks': clicks, 'compare-drones.value': drones,
+                  'compare-gains.value': HEAVY_GAINS, 'session-id.data': session}
+        start = time.perf_counter()
+        status, response = transport.post('/_dash-update-component',
+                                          requests.body(dependency, values, 'compare-button.n_clicks'))
+        ok = status == 200 and not str(response['response'].get('compare-status', {})).count('Błąd')
+        recorder.add('run_comparison', time.perf_counter() - start, ok)
+
+
+def run(clients=10, heavy=0, duration=10.0, think_time=0.05, url=None):
+    """Uruchamia test i zwraca (Recorder, czas trwania [s])"""
+    transport = HttpTransport(url) if url else LocalTransport()
+    requests = CallbackRequests(transport)
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [threading.Thread(target=slider_client, args=(transport, requests, recorder, stop, think_time, k),
+                                daemon=True) for k in range(clients)]
+    threads += [threading.Thread(target=heavy_client, args=(transport, requests, recorder, stop, k),
+                                 daemon=True) for k in range(heavy)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return recorder, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test obciążeniowy aplikacji (opóźnienia ogona)")
+    parser.add_argument('--clients', type=int, default=10, help="liczba klientów przeciągających suwak")
+    parser.add_argument('--heavy', type=int, default=0, help="liczba klientów uruchamiających porównania")
+    parser.add_argument('--duration', type=float, default=10.0, help="czas testu [s]")
+    parser.add_argument('--think', type=float, default=0.05, help="średnia przerwa między żądaniami klienta [s]")
+    parser.add_argument('--url', help="adres działającego serwera (domyślnie aplikacja w tym procesie)")
+    args = parser.parse_args(argv)
+
+    recorder, elapsed = run(args.clients, args.heavy, args.duration, args.think, args.url)
+    print(f"Klienci: {args.clients} interaktywnych, {args.heavy} ciężkich, czas: {elapsed:.1f} s")
+    print(recorder.report(elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,89 +1,78 @@
+import json
+from urllib.parse import urlencode
+
 import numpy as np
-from dash import Dash, dcc, html, callback_context
+from dash import Dash, dcc, html, callback, callback_context, clientside_callback, no_update
 from dash.dependencies import Input, Output, State
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from scipy.integrate import odeint
-from scipy.optimize import minimize
-import control
 import time
 
-
-class Drone:
-    def __init__(self, name, mass, max_thrust):
-        self.name = name
-        self.mass = mass  # kg
-        self.max_thrust = max_thrust  # N
+from atlas import get_atlas
+from cache import SIMULATION_CACHE, cached_simulation
+from compare import compare_runs_in_pool, parse_gain_sets
+from export import register_export_endpoint
+from figures import (build_comparison_figure, build_frequency_figure, build_full_figure, build_light_figure,
+                     build_mission_figure, build_robustness_figure, build_stream_figure, build_sweep_figure,
+                     figure_signature, patch_light_figure, payload_stats)
+from frequency import frequency_analysis, gain_axis_margins, stability_ranges
+from instrumentation import REGISTRY, instrument, note, phase, register_metrics_endpoint
+from jobs import JOBS, JobCancelled, JobRejected
+from mission import EXAMPLE_MISSION, parse_mission, simulate_mission
+from robustness import monte_carlo
+from simulation import DRONE_LABEL, DRONES
+from streaming import HISTORY_SAMPLES, LIVE
+from sweep import grid_axis, sweep_gains
+from tuning import auto_tune
 
 
-# Definicja popularnych dronów
-DRONES = {
-    f"DJI Mini 2 (masa: 0.249 kg, max ciąg: 10 N)": Drone("DJI Mini 2", 0.249, 10),
-    f"DJI Mavic 3 (masa: 0.895 kg, max ciąg: 30 N)": Drone("DJI Mavic 3", 0.895, 30),
-    f"DJI Matrice 300 RTK (masa: 3.6 kg, max ciąg: 100 N)": Drone("DJI Matrice 300 RTK", 3.6, 100)
+# Definicja kolorów dla ciemnego motywu
+DARK_THEME = {
+    'background': '#1f2630',
+    'panel': '#2d3443',
+    'text': '#ffffff',
+    'button': '#3d4554',
+    'button_hover': '#4d5565'
 }
 
 
-def create_system_equations(drone):
-    def system(state, t, u):
-        h, v = state
-        dv = (u - drone.mass * 9.81) / drone.mass
-        dh = v
-        return [dh, dv]
-
-    return system
-
-
-def simulate_drone_with_params(drone, target_height, initial_height, Kp, Ti, Td, duration=60, dt=0.01):
-    """Symulacja z podanymi parametrami PID"""
-    t = np.arange(0, duration, dt)
-    h = np.zeros_like(t)
-    v = np.zeros_like(t)
-    u = np.zeros_like(t)
+def _runtime_gauges():
+    cache_stats = SIMULATION_CACHE.stats()
+    gauges = [('drone_cache_entries', (), cache_stats['entries']),
+              ('drone_cache_bytes', (), cache_stats['bytes'])]
+    gauges += [('drone_jobs', (('status', status),), count) for status, count in JOBS.stats().items()]
+    return gauges
 
-    h[0] = initial_height
-    v[0] = 0
 
-    error_integral = 0
-    prev_error = 0
+REGISTRY.add_collector(_runtime_gauges)
 
-    system = create_system_equations(drone)
+# Limit oczekiwania callbacku na obliczenia z kolejki zadań [s]
+COMPUTE_TIMEOUT = 120
 
-    for i in range(1, len(t)):
-        error = target_height - h[i - 1]
-        error_integral += error * dt
-        error_derivative = (error - prev_error) / dt
+# Powyżej tej liczby kroków (czas symulacji / dt) wykresy liczone są w tle (JOBS), a nie w callbacku
+GRAPH_JOB_STEPS = 100_000
 
-        u[i - 1] = (Kp * (error +
-                          error_integral / Ti +
-                          Td * error_derivative))
+# Drony wbudowane (widoczne w każdej sesji); drony użytkowników trzyma magazyn sesji custom-drones
+BUILTIN_DRONES = tuple(DRONES)
 
-        u[i - 1] = np.clip(u[i - 1], 0, drone.max_thrust)
 
-        state = odeint(system, [h[i - 1], v[i - 1]], [0, dt], args=(u[i - 1],))
-        h[i] = state[-1, 0]
-        v[i] = state[-1, 1]
+def _known_label(label):
+    return label in DRONES
 
-        prev_error = error
 
-    u[-1] = u[-2]
-    return t, h, u
-
-
-# Definicja kolorów dla ciemnego motywu
-DARK_THEME = {
-    'background': '#1f2630',
-    'panel': '#2d3443',
-    'text': '#ffffff',
-    'button': '#3d4554',
-    'button_hover': '#4d5565'
+# Zakłócenia dostępne w interfejsie: wartość -> opis (parametry poza amplitudą stałe)
+GUST_LABELS = {
+    'none': 'brak',
+    'step': 'skok siły od 20 s',
+    'one_minus_cosine': 'podmuch 1-cos (20 s, 2 s)',
+    'turbulence': 'turbulencja (czas korelacji 1 s)',
+}
+NOISE_LABELS = {
+    'none': 'brak',
+    'gaussian': 'biały gaussowski',
+    'colored': 'kolorowy (czas korelacji 0.2 s)',
 }
-
-# Tworzenie aplikacji Dash
-app = Dash(__name__)
 
 # Layout aplikacji
-app.layout = html.Div([
+layout = html.Div([
     # Tytuł strony
     html.Div([
         html.H1("Regulator wysokości dronów",
@@ -190,7 +179,251 @@ app.layout = html.Div([
                         marks={i: str(i) for i in range(0, 6)},
                         className='mb-4'
                     )
-                ])
+                ]),
+                html.Div(id='stability-range', style={'fontSize': '13px', 'color': '#6c757d'}),
+                html.Button('Automatyczny dobór nastaw', id='autotune-button', n_clicks=0,
+                            style={'marginTop': '10px'}),
+                html.Div(id='autotune-status', style={'marginTop': '5px', 'fontSize': '14px'}),
+                dcc.Interval(id='autotune-poll', interval=500, disabled=True)
+            ], style={'marginTop': '20px'}),
+
+            # Przegląd siatki nastaw Kp x Ti
+            html.Div([
+                html.H3("Mapa nastaw (Kp × Ti)", style={'marginTop': '20px'}),
+                html.Label("Zakres Kp:"),
+                dcc.RangeSlider(
+                    id='sweep-kp-range',
+                    min=0,
+                    max=100,
+                    step=0.1,
+                    value=[0, 100],
+                    marks={i: str(i) for i in range(0, 101, 20)}
+                ),
+                html.Label("Zakres Ti:"),
+                dcc.RangeSlider(
+                    id='sweep-ti-range',
+                    min=0.1,
+                    max=10,
+                    step=0.1,
+                    value=[0.1, 10],
+                    marks={i: str(i) for i in range(0, 11, 2)}
+                ),
+                html.Label("Rozdzielczość siatki:"),
+                dcc.Dropdown(
+                    id='sweep-resolution',
+                    options=[{'label': f"{n} × {n}", 'value': n} for n in (11, 21, 41)],
+                    value=21,
+                    clearable=False,
+                    style={'marginTop': '5px'}
+                ),
+                html.Button('Oblicz mapę (Td z suwaka)', id='sweep-button', n_clicks=0,
+                            style={'marginTop': '10px'}),
+                html.Div(id='sweep-status', style={'marginTop': '5px', 'fontSize': '14px'}),
+                dcc.Interval(id='sweep-poll', interval=500, disabled=True)
+            ], style={'marginTop': '20px'}),
+
+            # Analiza odporności Monte Carlo
+            html.Div([
+                html.H3("Odporność (Monte Carlo)", style={'marginTop': '20px'}),
+                html.Label("Liczba wariantów drona:"),
+                dcc.Dropdown(
+                    id='robustness-size',
+                    options=[{'label': str(n), 'value': n} for n in (200, 1000, 5000)],
+                    value=1000,
+                    clearable=False,
+                    style={'marginTop': '5px'}
+                ),
+                html.Button('Analiza odporności', id='robustness-button', n_clicks=0,
+                            style={'marginTop': '10px'}),
+                html.Div(id='robustness-status', style={'marginTop': '5px', 'fontSize': '14px'}),
+                dcc.Interval(id='robustness-poll', interval=500, disabled=True)
+            ], style={'marginTop': '20px'}),
+
+            # Czas symulacji i metoda całkowania
+            html.Div([
+                html.H3("Symulacja", style={'marginTop': '20px'}),
+                html.Label("Czas symulacji [s]:"),
+                dcc.Input(id='sim-duration', type='number', min=5, max=600, step=5, value=60,
+                          debounce=True, style={'marginLeft': '10px', 'width': '80px'}),
+                dcc.RadioItems(
+                    id='sim-method',
+                    options=[{'label': ' stały krok', 'value': 'fixed'},
+                             {'label': ' model ciągły, krok adaptacyjny (tolerancja błędu)', 'value': 'adaptive'}],
+                    value='fixed',
+                    style={'marginTop': '10px'}
+                ),
+                html.Label("Krok symulacji / siatki wyjściowej [s]:"),
+                dcc.Dropdown(
+                    id='sim-dt',
+                    options=[{'label': str(dt), 'value': dt} for dt in (0.001, 0.005, 0.01, 0.05)],
+                    value=0.01,
+                    clearable=False,
+                    style={'marginTop': '5px'}
+                ),
+                html.Label("Tolerancja błędu wysokości [m] (krok adaptacyjny):"),
+                dcc.Dropdown(
+                    id='sim-tolerance',
+                    options=[{'label': f"{tol:g}", 'value': tol} for tol in (1e-2, 1e-3, 1e-4, 1e-5)],
+                    value=1e-3,
+                    clearable=False,
+                    style={'marginTop': '5px'}
+                ),
+                html.Label("Zatrzymanie po ustaleniu - czas w tunelu [s] (0 = pełny czas):"),
+                dcc.Input(id='sim-hold', type='number', min=0, max=60, step=0.5, value=0,
+                          debounce=True, style={'marginLeft': '10px', 'width': '80px'})
+            ], style={'marginTop': '20px'}),
+
+            # Zakłócenia, niedoskonałości czujnika i opcje regulatora
+            html.Div([
+                html.H3("Zakłócenia i czujnik", style={'marginTop': '20px'}),
+                html.Label("Zakłócenie siłowe:"),
+                dcc.Dropdown(
+                    id='env-gust',
+                    options=[{'label': label, 'value': value} for value, label in GUST_LABELS.items()],
+                    value='none',
+                    clearable=False,
+                    style={'marginTop': '5px'}
+                ),
+                html.Label("Amplituda / odchylenie zakłócenia [N]:"),
+                dcc.Input(id='env-gust-amplitude', type='number', min=0, step=0.5, value=2,
+                          debounce=True, style={'marginLeft': '10px', 'width': '80px'}),
+                html.Br(),
+                html.Label("Szum pomiaru wysokości:"),
+                dcc.Dropdown(
+                    id='env-noise',
+                    options=[{'label': label, 'value': value} for value, label in NOISE_LABELS.items()],
+                    value='none',
+                    clearable=False,
+                    style={'marginTop': '5px'}
+                ),
+                html.Label("Odchylenie szumu [m]:"),
+                dcc.Input(id='env-noise-std', type='number', min=0, step=0.01, value=0.05,
+                          debounce=True, style={'marginLeft': '10px', 'width': '80px'}),
+                html.Br(),
+                html.Label("Odczyt czujnika [Hz] (0 = w każdym kroku):"),
+                dcc.Input(id='env-sensor-rate', type='number', min=0, step=1, value=0,
+                          debounce=True, style={'marginLeft': '10px', 'width': '80px'}),
+                html.Br(),
+                html.Label("Opóźnienie pomiaru [s]:"),
+                dcc.Input(id='env-latency', type='number', min=0, step=0.01, value=0,
+                          debounce=True, style={'marginLeft': '10px', 'width': '80px'}),
+                html.Br(),
+                html.Label("Rozdzielczość czujnika [m] (0 = bez kwantyzacji):"),
+                dcc.Input(id='env-quantization', type='number', min=0, step=0.01, value=0,
+                          debounce=True, style={'marginLeft': '10px', 'width': '80px'}),
+                html.Br(),
+                html.Label("Ziarno strumieni losowych:"),
+                dcc.Input(id='env-seed', type='number', min=0, step=1, value=0,
+                          debounce=True, style={'marginLeft': '10px', 'width': '80px'}),
+                html.Br(),
+                html.Label("Filtr pochodnej N (Tf = Td / N, 0 = bez filtru):"),
+                dcc.Input(id='pid-filter', type='number', min=0, step=1, value=0,
+                          debounce=True, style={'marginLeft': '10px', 'width': '80px'}),
+                html.Br(),
+                html.Label("Anti-windup:"),
+                dcc.Dropdown(
+                    id='pid-anti-windup',
+                    options=[{'label': 'brak', 'value': 'none'},
+                             {'label': 'całkowanie warunkowe', 'value': 'clamp'},
+                             {'label': 'obliczenie wsteczne', 'value': 'back_calculation'}],
+                    value='none',
+                    clearable=False,
+                    style={'marginTop': '5px'}
+                ),
+                html.Div("Przy zakłóceniach lub opcjach regulatora symulacja zawsze ma stały krok "
+                         "(bez atlasu i kroku adaptacyjnego).", style={'marginTop': '5px', 'fontSize': '12px'})
+            ], style={'marginTop': '20px'}),
+
+            # Historia scenariuszy sesji (przechowywana w przeglądarce)
+            html.Div([
+                html.H3("Historia scenariuszy", style={'marginTop': '20px'}),
+                dcc.Dropdown(id='history-select', options=[], value=None,
+                             placeholder="Przywróć wcześniejszy scenariusz...", style={'marginTop': '5px'})
+            ], style={'marginTop': '20px'}),
+
+            # Pobieranie przebiegów w pełnej rozdzielczości (wykres pozostaje zdecymowany)
+            html.Div([
+                html.H3("Eksport danych", style={'marginTop': '20px'}),
+                dcc.RadioItems(
+                    id='export-format',
+                    options=[{'label': ' CSV', 'value': 'csv'},
+                             {'label': ' Arrow IPC', 'value': 'arrow'}],
+                    value='csv',
+                    inline=True
+                ),
+                html.A('Pobierz bieżący przebieg', id='export-scenario', href='', download='',
+                       style={'display': 'block', 'marginTop': '5px'}),
+                html.A('Pobierz porównanie', id='export-comparison', href='', download='',
+                       style={'display': 'block', 'marginTop': '5px'})
+            ], style={'marginTop': '20px'}),
+
+            # Porównanie dronów i zestawów nastaw na jednym wykresie
+            html.Div([
+                html.H3("Porównanie", style={'marginTop': '20px'}),
+                html.Label("Drony:"),
+                dcc.Dropdown(
+                    id='compare-drones',
+                    options=[{'label': key, 'value': key} for key in DRONES.keys()],
+                    value=list(DRONES.keys())[:2],
+                    multi=True,
+                    style={'marginTop': '5px'}
+                ),
+                html.Label("Zestawy nastaw (Kp Ti Td w wierszu, puste = nastawy z suwaków):"),
+                dcc.Textarea(id='compare-gains', value='',
+                             style={'width': '100%', 'height': '60px', 'fontFamily': 'monospace'}),
+                html.Button('Porównaj', id='compare-button', n_clicks=0, style={'marginTop': '10px'}),
+                html.Div(id='compare-status', style={'marginTop': '5px', 'fontSize': '14px'}),
+
+                html.Label("Własny dron (nazwa, masa [kg], max ciąg [N]):", style={'marginTop': '10px'}),
+                html.Div([
+                    dcc.Input(id='custom-name', type='text', placeholder='nazwa', style={'width': '35%'}),
+                    dcc.Input(id='custom-mass', type='number', min=0.01, step=0.001, placeholder='masa',
+                              style={'width': '20%', 'marginLeft': '5px'}),
+                    dcc.Input(id='custom-thrust', type='number', min=0.1, step=0.1, placeholder='ciąg',
+                              style={'width': '20%', 'marginLeft': '5px'}),
+                    html.Button('Dodaj', id='custom-add', n_clicks=0, style={'marginLeft': '5px'})
+                ], style={'marginTop': '5px'}),
+                html.Div(id='custom-status', style={'marginTop': '5px', 'fontSize': '14px'})
+            ], style={'marginTop': '20px'}),
+
+            # Misja - harmonogram wartości zadanej (skoki, rampy, zawisy)
+            html.Div([
+                html.H3("Misja", style={'marginTop': '20px'}),
+                html.Label("Odcinki (step <wysokość> <czas>, ramp <wysokość> <czas>, hold <czas>):"),
+                dcc.Textarea(id='mission-text', value=EXAMPLE_MISSION,
+                             style={'width': '100%', 'height': '120px', 'fontFamily': 'monospace'}),
+                html.Button('Symuluj misję', id='mission-button', n_clicks=0, style={'marginTop': '10px'}),
+                html.Div(id='mission-status', style={'marginTop': '5px', 'fontSize': '14px'})
+            ], style={'marginTop': '20px'}),
+
+            # Lot na żywo - symulacja strumieniowa dopisywana do wykresu
+            html.Div([
+                html.H3("Lot na żywo", style={'marginTop': '20px'}),
+                html.Label("Przyspieszenie czasu:"),
+                dcc.Dropdown(
+                    id='live-speed',
+                    options=[{'label': f"{speed}×", 'value': speed} for speed in (1, 5, 20)],
+                    value=1,
+                    clearable=False,
+                    style={'marginTop': '5px'}
+                ),
+                html.Button('Start', id='live-start', n_clicks=0, style={'marginTop': '10px'}),
+                html.Button('Stop', id='live-stop', n_clicks=0, style={'marginTop': '10px', 'marginLeft': '5px'}),
+                html.Div(id='live-status', style={'marginTop': '5px', 'fontSize': '14px'}),
+                dcc.Interval(id='live-poll', interval=250, disabled=True)
+            ], style={'marginTop': '20px'}),
+
+            # Tryb rysowania wykresów
+            html.Div([
+                html.Label("Tryb wykresów:",
+                           style={'fontSize': '18px', 'fontWeight': 'bold'}),
+                dcc.RadioItems(
+                    id='render-mode',
+                    options=[{'label': ' lekki (przerzedzony)', 'value': 'light'},
+                             {'label': ' pełny (wszystkie próbki)', 'value': 'full'}],
+                    value='light',
+                    style={'marginTop': '5px'}
+                )
             ], style={'marginTop': '20px'})
 
         ], style={'width': '30%',
@@ -202,7 +435,31 @@ app.layout = html.Div([
 
         # Prawa kolumna - wykresy
         html.Div([
-            dcc.Graph(id='simulation-graphs')
+            dcc.Graph(id='simulation-graphs'),
+            html.Div(id='render-stats',
+                     style={'fontSize': '12px', 'color': '#6c757d', 'textAlign': 'right'}),
+            dcc.Interval(id='graph-poll', interval=500, disabled=True),
+            dcc.Graph(id='live-graph', style={'display': 'none'}),
+            dcc.Graph(id='compare-graph', style={'display': 'none'}),
+            html.Div(id='compare-table', style={'fontSize': '12px'}),
+            dcc.Graph(id='mission-graph', style={'display': 'none'}),
+            html.Div(id='mission-table', style={'fontSize': '12px'}),
+            dcc.Graph(id='sweep-graphs', style={'display': 'none'}),
+            dcc.Graph(id='robustness-graph', style={'display': 'none'}),
+
+            # Analiza częstotliwościowa modelu zlinearyzowanego (liczona tylko przy otwartym panelu)
+            html.Details([
+                html.Summary("Analiza częstotliwościowa"),
+                html.Div(id='frequency-stats', style={'fontSize': '14px', 'marginTop': '5px'}),
+                dcc.Graph(id='frequency-graph')
+            ], id='frequency-panel', open=False, style={'marginTop': '20px'}),
+
+            # Panel diagnostyczny - ostatnie żądania i czasy faz
+            html.Details([
+                html.Summary("Diagnostyka serwera"),
+                html.Div(id='diagnostics-table', style={'fontSize': '12px', 'fontFamily': 'monospace'}),
+                dcc.Interval(id='diagnostics-poll', interval=2000)
+            ], style={'marginTop': '20px'})
         ], style={'width': '65%',
                   'display': 'inline-block',
                   'verticalAlign': 'top',
@@ -213,11 +470,20 @@ app.layout = html.Div([
     # Ukryte komponenty do przechowywania stanu
     dcc.Store(id='initial-height', data=0),
     dcc.Store(id='target-height', data=10),
+    dcc.Store(id='figure-signature', data=None),
+    dcc.Store(id='session-id', storage_type='session'),
+    # Stan sesji trzymany po stronie przeglądarki - każdy proces serwera obsłuży każde żądanie
+    dcc.Store(id='custom-drones', storage_type='session', data=[]),
+    dcc.Store(id='scenario-history', storage_type='session', data=[]),
+    dcc.Store(id='autotune-job', data=None),
+    dcc.Store(id='sweep-job', data=None),
+    dcc.Store(id='robustness-job', data=None),
+    dcc.Store(id='graph-job', data=None),
 
 ], style={'padding': '20px', 'fontFamily': 'Arial'})
 
 
-@app.callback(
+@callback(
     [Output('initial-height', 'data'),
      Output('initial-height-display', 'children')],
     [Input('initial-minus10', 'n_clicks'),
@@ -226,6 +492,7 @@ app.layout = html.Div([
      Input('initial-plus10', 'n_clicks')],
     [State('initial-height', 'data')]
 )
+@instrument('update_initial_height')
 def update_initial_height(minus10, minus1, plus1, plus10, current_height):
     ctx = callback_context
     if not ctx.triggered:
@@ -244,7 +511,7 @@ def update_initial_height(minus10, minus1, plus1, plus10, current_height):
     return current_height, f"{current_height} m"
 
 
-@app.callback(
+@callback(
     [Output('target-height', 'data'),
      Output('target-height-display', 'children')],
     [Input('target-minus10', 'n_clicks'),
@@ -253,6 +520,7 @@ def update_initial_height(minus10, minus1, plus1, plus10, current_height):
      Input('target-plus10', 'n_clicks')],
     [State('target-height', 'data')]
 )
+@instrument('update_target_height')
 def update_target_height(minus10, minus1, plus1, plus10, current_height):
     ctx = callback_context
     if not ctx.triggered:
@@ -271,7 +539,7 @@ def update_target_height(minus10, minus1, plus1, plus10, current_height):
     return current_height, f"{current_height} m"
 
 
-@app.callback(
+@callback(
     [Output('kp-display', 'children'),
      Output('ti-display', 'children'),
      Output('td-display', 'children')],
@@ -279,133 +547,844 @@ def update_target_height(minus10, minus1, plus1, plus10, current_height):
      Input('ti-slider', 'value'),
      Input('td-slider', 'value')]
 )
+@instrument('update_pid_params')
 def update_pid_params(kp, ti, td):
     return f"{kp:.2f}", f"{ti:.2f}", f"{td:.2f}"
 
 
-@app.callback(
-    Output('simulation-graphs', 'figure'),
+# Identyfikator sesji przeglądarki - kanały zadań w tle są rozdzielone między użytkowników
+clientside_callback(
+    """
+    function(_, current) {
+        if (current) { return current; }
+        if (window.crypto && window.crypto.randomUUID) { return window.crypto.randomUUID(); }
+        return Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+    """,
+    Output('session-id', 'data'),
+    Input('session-id', 'id'),
+    State('session-id', 'data')
+)
+
+
+# Osie suwaków nastaw (krok jak w suwakach) do wyznaczania granic stabilności
+KP_AXIS = np.round(np.arange(0, 100.05, 0.1), 1)
+TI_AXIS = np.round(np.arange(0.1, 10.05, 0.1), 1)
+KP_MARKS = {i: str(i) for i in range(0, 101, 20)}
+TI_MARKS = {i: str(i) for i in range(0, 11, 2)}
+
+
+def _boundary_marks(base, axis, ranges):
+    """Znaczniki suwaka z granicami przedziałów stabilności (na czerwono)"""
+    marks = dict(base)
+    for low, high in ranges:
+        for value in (low, high):
+            if value not in (axis[0], axis[-1]):
+                marks[float(value)] = {'label': f"{value:g}", 'style': {'color': '#d62728'}}
+    return marks
+
+
+def _describe_ranges(name, ranges):
+    if not ranges:
+        return f"{name}: brak stabilnych wartości"
+    return f"{name} ∈ " + " ∪ ".join(f"[{low:g}, {high:g}]" for low, high in ranges)
+
+
+@callback(
+    [Output('kp-slider', 'marks'),
+     Output('ti-slider', 'marks'),
+     Output('stability-range', 'children')],
+    [Input('drone-select', 'value'),
+     Input('kp-slider', 'value'),
+     Input('ti-slider', 'value'),
+     Input('td-slider', 'value'),
+     Input('sim-dt', 'value')]
+)
+@instrument('stability_marks')
+def stability_marks(drone_name, kp, ti, td, dt):
+    drone = DRONES[drone_name]
+    with phase('margins'):
+        kp_margins = gain_axis_margins(drone, 'Kp', KP_AXIS, kp, ti, td, dt)
+        ti_margins = gain_axis_margins(drone, 'Ti', TI_AXIS, kp, ti, td, dt)
+    kp_ranges = stability_ranges(KP_AXIS, kp_margins['stable'])
+    ti_ranges = stability_ranges(TI_AXIS, ti_margins['stable'])
+    return (_boundary_marks(KP_MARKS, KP_AXIS, kp_ranges), _boundary_marks(TI_MARKS, TI_AXIS, ti_ranges),
+            f"Stabilność liniowa przy pozostałych nastawach bez zmian: {_describe_ranges('Kp', kp_ranges)}, "
+            f"{_describe_ranges('Ti', ti_ranges)}")
+
+
+@callback(
+    [Output('frequency-graph', 'figure'),
+     Output('frequency-stats', 'children')],
+    [Input('frequency-panel', 'open'),
+     Input('drone-select', 'value'),
+     Input('kp-slider', 'value'),
+     Input('ti-slider', 'value'),
+     Input('td-slider', 'value'),
+     Input('sim-dt', 'value')]
+)
+@instrument('update_frequency')
+def update_frequency(is_open, drone_name, kp, ti, td, dt):
+    if not is_open:
+        return no_update, no_update
+    try:
+        with phase('analysis'):
+            analysis = frequency_analysis(DRONES[drone_name], kp, ti, td, dt)
+    except ValueError as e:
+        return no_update, str(e)
+    with phase('figure'):
+        fig = build_frequency_figure(analysis)
+    return fig, (f"Zapas wzmocnienia: {_format_metric(analysis['gain_margin_db'], '{:.1f}')} dB, "
+                 f"zapas fazy: {_format_metric(analysis['phase_margin'], '{:.1f}')}° "
+                 f"(przy {_format_metric(analysis['gain_crossover'], '{:.1f}')} rad/s), "
+                 f"pasmo: {_format_metric(analysis['bandwidth'], '{:.1f}')} rad/s, "
+                 f"pętla zamknięta {'stabilna' if analysis['stable'] else 'NIESTABILNA'} "
+                 f"(model bez nasycenia ciągu)")
+
+
+def job_status(job, label):
+    """Opis stanu zadania w tle dla interfejsu"""
+    if job is None:
+        return f"{label}: zadanie wygasło"
+    if job.status == 'failed':
+        return f"{label}: błąd - {job.error}"
+    if job.status == 'cancelled':
+        return f"{label}: anulowano"
+    if job.status == 'pending':
+        return f"{label}: w kolejce..."
+    return f"{label}: {job.progress * 100:.0f}%"
+
+
+@callback(
+    [Output('autotune-job', 'data'),
+     Output('autotune-poll', 'disabled'),
+     Output('autotune-status', 'children')],
+    [Input('autotune-button', 'n_clicks')],
+    [State('session-id', 'data'),
+     State('drone-select', 'value'),
+     State('initial-height', 'data'),
+     State('target-height', 'data')],
+    prevent_initial_call=True
+)
+@instrument('start_autotune')
+def start_autotune(n_clicks, session_id, drone_name, initial_height, target_height):
+    drone = DRONES[drone_name]
+    try:
+        job = JOBS.submit((session_id, 'autotune'), auto_tune, drone, target_height, initial_height)
+    except JobRejected as e:
+        return None, True, f"Strojenie: {e}"
+    return job.id, False, job_status(job, "Strojenie")
+
+
+@callback(
+    [Output('kp-slider', 'value'),
+     Output('ti-slider', 'value'),
+     Output('td-slider', 'value'),
+     Output('autotune-poll', 'disabled', allow_duplicate=True),
+     Output('autotune-status', 'children', allow_duplicate=True)],
+    [Input('autotune-poll', 'n_intervals')],
+    [State('autotune-job', 'data')],
+    prevent_initial_call=True
+)
+def poll_autotune(n_intervals, job_id):
+    job = JOBS.get(job_id)
+    if job is None or not job.done:
+        return no_update, no_update, no_update, job is None, job_status(job, "Strojenie")
+    if job.status != 'done':
+        return no_update, no_update, no_update, True, job_status(job, "Strojenie")
+
+    result = job.result
+    elapsed = job.finished - job.created
+    return (result['Kp'], result['Ti'], result['Td'], True,
+            f"Koszt: {result['cost']:.2f}, symulacji: {result['evaluations']}, czas: {elapsed:.1f} s")
+
+
+def run_sweep(drone, target_height, initial_height, kp_values, ti_values, td, progress=None):
+    """Zadanie w tle: przegląd siatki razem z osiami do narysowania"""
+    grids = sweep_gains(drone, target_height, initial_height, kp_values, ti_values, td, progress=progress)
+    return kp_values, ti_values, grids
+
+
+@callback(
+    [Output('sweep-job', 'data'),
+     Output('sweep-poll', 'disabled'),
+     Output('sweep-status', 'children')],
+    [Input('sweep-button', 'n_clicks')],
+    [State('session-id', 'data'),
+     State('drone-select', 'value'),
+     State('initial-height', 'data'),
+     State('target-height', 'data'),
+     State('sweep-kp-range', 'value'),
+     State('sweep-ti-range', 'value'),
+     State('sweep-resolution', 'value'),
+     State('td-slider', 'value')],
+    prevent_initial_call=True
+)
+@instrument('start_sweep')
+def start_sweep(n_clicks, session_id, drone_name, initial_height, target_height, kp_range, ti_range, resolution,
+                td):
+    drone = DRONES[drone_name]
+    try:
+        kp_values = grid_axis(kp_range[0], kp_range[1], resolution)
+        ti_values = grid_axis(ti_range[0], ti_range[1], resolution)
+    except ValueError as e:
+        return None, True, f"Mapa nastaw: {e}"
+    try:
+        job = JOBS.submit((session_id, 'sweep'), run_sweep, drone, target_height, initial_height,
+                          kp_values, ti_values, td)
+    except JobRejected as e:
+        return None, True, f"Mapa nastaw: {e}"
+    return job.id, False, job_status(job, "Mapa nastaw")
+
+
+@callback(
+    [Output('sweep-graphs', 'figure'),
+     Output('sweep-graphs', 'style'),
+     Output('sweep-poll', 'disabled', allow_duplicate=True),
+     Output('sweep-status', 'children', allow_duplicate=True)],
+    [Input('sweep-poll', 'n_intervals')],
+    [State('sweep-job', 'data'),
+     State('kp-slider', 'value'),
+     State('ti-slider', 'value')],
+    prevent_initial_call=True
+)
+def poll_sweep(n_intervals, job_id, kp, ti):
+    job = JOBS.get(job_id)
+    if job is None or not job.done:
+        return no_update, no_update, job is None, job_status(job, "Mapa nastaw")
+    if job.status != 'done':
+        return no_update, no_update, True, job_status(job, "Mapa nastaw")
+
+    kp_values, ti_values, grids = job.result
+    fig = build_sweep_figure(kp_values, ti_values, grids, kp, ti)
+    cells = len(kp_values) * len(ti_values)
+    elapsed = job.finished - job.created
+    return fig, {'display': 'block'}, True, (f"Komórek: {cells}, policzonych: {grids['computed']}, "
+                                             f"z pamięci: {cells - grids['computed']}, czas: {elapsed:.1f} s")
+
+
+@callback(
+    [Output('robustness-job', 'data'),
+     Output('robustness-poll', 'disabled'),
+     Output('robustness-status', 'children')],
+    [Input('robustness-button', 'n_clicks')],
+    [State('session-id', 'data'),
+     State('drone-select', 'value'),
+     State('initial-height', 'data'),
+     State('target-height', 'data'),
+     State('kp-slider', 'value'),
+     State('ti-slider', 'value'),
+     State('td-slider', 'value'),
+     State('robustness-size', 'value')],
+    prevent_initial_call=True
+)
+@instrument('start_robustness')
+def start_robustness(n_clicks, session_id, drone_name, initial_height, target_height, kp, ti, td, size):
+    drone = DRONES[drone_name]
+    try:
+        job = JOBS.submit((session_id, 'robustness'), monte_carlo, drone, target_height, initial_height,
+                          kp, ti, td, n=size)
+    except JobRejected as e:
+        return None, True, f"Monte Carlo: {e}"
+    return job.id, False, job_status(job, "Monte Carlo")
+
+
+@callback(
+    [Output('robustness-graph', 'figure'),
+     Output('robustness-graph', 'style'),
+     Output('robustness-poll', 'disabled', allow_duplicate=True),
+     Output('robustness-status', 'children', allow_duplicate=True)],
+    [Input('robustness-poll', 'n_intervals')],
+    [State('robustness-job', 'data'),
+     State('target-height', 'data')],
+    prevent_initial_call=True
+)
+def poll_robustness(n_intervals, job_id, target_height):
+    job = JOBS.get(job_id)
+    if job is None or not job.done:
+        return no_update, no_update, job is None, job_status(job, "Monte Carlo")
+    if job.status != 'done':
+        return no_update, no_update, True, job_status(job, "Monte Carlo")
+
+    result = job.result
+    settling = result['settling_time']
+    elapsed = job.finished - job.created
+    if np.all(np.isnan(settling)):
+        status = f"Żaden wariant nie wszedł do tunelu, czas: {elapsed:.1f} s"
+    else:
+        status = (f"Spełnia wymaganie: {result['probability'] * 100:.1f}%, czas ustalania "
+                  f"(mediana / 95 perc.): {np.nanmedian(settling):.2f} s / {np.nanpercentile(settling, 95):.2f} s, "
+                  f"czas: {elapsed:.1f} s")
+    return build_robustness_figure(result, target_height), {'display': 'block'}, True, status
+
+
+def _format_metric(value, fmt):
+    return fmt.format(value) if value is not None and np.isfinite(value) else '-'
+
+
+def mission_table(segments):
+    header = html.Tr([html.Th(name) for name in ('odcinek', 'wysokość [m]', 'początek [s]', 'czas [s]',
+                                                  'czas ustalania [s]', 'przeregulowanie [%]',
+                                                  'maks. błąd nadążania [m]', 'RMS błędu [m]',
+                                                  'nasycenie [%]')])
+    rows = []
+    for number, metrics in enumerate(segments, 1):
+        # Przeregulowanie ma sens tylko dla skoku wartości zadanej
+        overshoot = metrics['overshoot_percent'] if metrics['kind'] == 'step' else None
+        rows.append(html.Tr([
+            html.Td(f"{number}. {metrics['kind']}"),
+            html.Td(_format_metric(metrics['target'], "{:.1f}")),
+            html.Td(_format_metric(metrics['start_time'], "{:.1f}")),
+            html.Td(_format_metric(metrics['duration'], "{:.1f}")),
+            html.Td(_format_metric(metrics['settling_time'], "{:.2f}")),
+            html.Td(_format_metric(overshoot, "{:.1f}")),
+            html.Td(_format_metric(metrics['max_tracking_error'], "{:.3f}")),
+            html.Td(_format_metric(metrics['rms_tracking_error'], "{:.3f}")),
+            html.Td(_format_metric(metrics['saturation_fraction'] * 100, "{:.1f}")),
+        ]))
+    return html.Table([header] + rows, style={'width': '100%', 'textAlign': 'right'})
+
+
+@callback(
+    [Output('drone-select', 'options'),
+     Output('compare-drones', 'options'),
+     Output('custom-drones', 'data'),
+     Output('custom-status', 'children')],
+    [Input('custom-add', 'n_clicks')],
+    [State('custom-name', 'value'),
+     State('custom-mass', 'value'),
+     State('custom-thrust', 'value'),
+     State('custom-drones', 'data')]
+)
+@instrument('add_custom_drone')
+def add_custom_drone(n_clicks, name, mass, max_thrust, custom):
+    # Drony użytkownika należą do sesji; etykieta niesie parametry, więc rozpozna ją każdy proces
+    custom = [label for label in custom or [] if _known_label(label)]
+    status = ''
+    if n_clicks:
+        if not name or mass is None or max_thrust is None:
+            status = "Podaj nazwę, masę i maksymalny ciąg"
+        elif float(mass) <= 0 or float(max_thrust) <= 0:
+            status = "Błąd: Masa i maksymalny ciąg muszą być dodatnie"
+        else:
+            label = DRONE_LABEL.format(name=name.strip(), mass=float(mass), max_thrust=float(max_thrust))
+            if label in BUILTIN_DRONES or label in custom:
+                status = f"Błąd: Dron {label!r} jest już na liście"
+            elif label not in DRONES:
+                status = f"Błąd: Niepoprawna nazwa drona {name.strip()!r}"
+            else:
+                # Bez rejestracji - każdy callback odtwarza drona z etykiety (DRONES[label])
+                custom.append(label)
+                status = f"Dodano: {label}"
+    options = [{'label': key, 'value': key} for key in BUILTIN_DRONES + tuple(custom)]
+    return options, options, custom, status
+
+
+def comparison_table(result):
+    metrics = result['metrics']
+    header = html.Tr([html.Th(name) for name in ('przebieg', 'czas ustalania [s]', 'przeregulowanie [%]',
+                                                  'czas narastania [s]', 'IAE', 'koszt sterowania',
+                                                  'nasycenie [%]')])
+    rows = []
+    for index, label in enumerate(result['labels']):
+        rows.append(html.Tr([
+            html.Td(label, style={'textAlign': 'left'}),
+            html.Td(_format_metric(metrics['settling_time'][index], "{:.2f}")),
+            html.Td(_format_metric(metrics['overshoot_percent'][index], "{:.1f}")),
+            html.Td(_format_metric(metrics['rise_time'][index], "{:.2f}")),
+            html.Td(_format_metric(metrics['iae'][index], "{:.2f}")),
+            html.Td(_format_metric(metrics['control_effort'][index], "{:.1f}")),
+            html.Td(_format_metric(metrics['saturation_fraction'][index] * 100, "{:.1f}")),
+        ]))
+    return html.Table([header] + rows, style={'width': '100%', 'textAlign': 'right'})
+
+
+@callback(
+    [Output('compare-graph', 'figure'),
+     Output('compare-graph', 'style'),
+     Output('compare-table', 'children'),
+     Output('compare-status', 'children')],
+    [Input('compare-button', 'n_clicks')],
+    [State('compare-drones', 'value'),
+     State('compare-gains', 'value'),
+     State('initial-height', 'data'),
+     State('target-height', 'data'),
+     State('kp-slider', 'value'),
+     State('ti-slider', 'value'),
+     State('td-slider', 'value'),
+     State('sim-duration', 'value'),
+     State('sim-dt', 'value'),
+     State('session-id', 'data')],
+    prevent_initial_call=True
+)
+@instrument('run_comparison')
+def run_comparison(n_clicks, drone_keys, gains_text, initial_height, target_height, kp, ti, td, duration, dt,
+                   session_id):
+    try:
+        gain_sets = parse_gain_sets(gains_text) or [(kp, ti, td)]
+        # Ciężka symulacja wsadowa przez kolejkę zadań - wątki serwera zostają dla interaktywnych żądań
+        with phase('simulation'):
+            result = JOBS.run((session_id, 'compare'), compare_runs_in_pool, drone_keys or [], gain_sets, target_height,
+                              initial_height, duration=duration or 60, dt=dt, timeout=COMPUTE_TIMEOUT)
+    except (KeyError, ValueError, JobRejected, TimeoutError) as e:
+        return no_update, no_update, no_update, f"Błąd: {e.args[0]}"
+    except JobCancelled:
+        return no_update, no_update, no_update, "Porównanie zastąpione nowszym"
+    note('simulation_steps', result['h'].size)
+    with phase('figure'):
+        fig = build_comparison_figure(result, target_height)
+    return (fig, {'display': 'block'}, comparison_table(result),
+            f"Porównano {len(result['labels'])} przebiegów w jednej symulacji wsadowej")
+
+
+@callback(
+    [Output('mission-graph', 'figure'),
+     Output('mission-graph', 'style'),
+     Output('mission-table', 'children'),
+     Output('mission-status', 'children')],
+    [Input('mission-button', 'n_clicks')],
+    [State('mission-text', 'value'),
+     State('drone-select', 'value'),
+     State('initial-height', 'data'),
+     State('kp-slider', 'value'),
+     State('ti-slider', 'value'),
+     State('td-slider', 'value'),
+     State('sim-dt', 'value'),
+     State('session-id', 'data')],
+    prevent_initial_call=True
+)
+@instrument('run_mission')
+def run_mission(n_clicks, text, drone_name, initial_height, kp, ti, td, dt, session_id):
+    try:
+        segments = parse_mission(text or '')
+    except ValueError as e:
+        return no_update, no_update, no_update, f"Błąd w opisie misji: {e}"
+    drone = DRONES[drone_name]
+    try:
+        # Symulacja przez kolejkę zadań - kontrola przyjęć i limit czasu jak przy porównaniu
+        with phase('simulation'):
+            result = JOBS.run((session_id, 'mission'), simulate_mission, drone, segments, initial_height,
+                              kp, ti, td, dt=dt, timeout=COMPUTE_TIMEOUT)
+    except (JobRejected, TimeoutError) as e:
+        return no_update, no_update, no_update, f"Błąd: {e.args[0]}"
+    except JobCancelled:
+        return no_update, no_update, no_update, "Misja zastąpiona nowszą"
+    note('simulation_steps', len(result['t']))
+    with phase('figure'):
+        fig = build_mission_figure(result)
+    return (fig, {'display': 'block'}, mission_table(result['segments']),
+            f"Misja: {len(segments)} odcinków, {result['t'][-1] + dt:.0f} s lotu")
+
+
+@callback(
+    [Output('live-graph', 'figure'),
+     Output('live-graph', 'style'),
+     Output('live-poll', 'disabled'),
+     Output('live-status', 'children')],
+    [Input('live-start', 'n_clicks'),
+     Input('live-stop', 'n_clicks')],
+    [State('session-id', 'data'),
+     State('drone-select', 'value'),
+     State('initial-height', 'data'),
+     State('target-height', 'data'),
+     State('kp-slider', 'value'),
+     State('ti-slider', 'value'),
+     State('td-slider', 'value'),
+     State('sim-dt', 'value'),
+     State('live-speed', 'value')],
+    prevent_initial_call=True
+)
+@instrument('control_live')
+def control_live(start_clicks, stop_clicks, session_id, drone_name, initial_height, target_height, kp, ti, td,
+                 dt, speed):
+    if callback_context.triggered_id == 'live-stop':
+        LIVE.stop(session_id)
+        return no_update, no_update, True, "Lot zatrzymany"
+    live = LIVE.start(session_id, DRONES[drone_name], initial_height, target_height, kp, ti, td, dt=dt, speed=speed)
+    return (build_stream_figure(live.buffer.view()), {'display': 'block'}, False,
+            f"Lot trwa (×{speed}) - zmiany wysokości zadanej i nastaw działają od bieżącego stanu")
+
+
+@callback(
+    [Output('live-graph', 'extendData'),
+     Output('live-poll', 'disabled', allow_duplicate=True),
+     Output('live-status', 'children', allow_duplicate=True)],
+    [Input('live-poll', 'n_intervals')],
+    [State('session-id', 'data')],
+    prevent_initial_call=True
+)
+def poll_live(n_intervals, session_id):
+    live = LIVE.get(session_id)
+    if live is None:
+        return no_update, True, "Lot zakończony"
+    chunk = live.advance()
+    if not len(chunk['t']):
+        return no_update, no_update, no_update
+    t = np.round(chunk['t'], 6).tolist()
+    data = {'x': [t, t, t], 'y': [chunk['h'].tolist(), chunk['target'].tolist(), chunk['u'].tolist()]}
+    return ([data, [0, 1, 2], HISTORY_SAMPLES], no_update,
+            f"t = {live.sim_time:.1f} s, wysokość: {chunk['h'][-1]:.2f} m, ciąg: {chunk['u'][-1]:.2f} N")
+
+
+@callback(
+    Output('live-status', 'children', allow_duplicate=True),
+    [Input('target-height', 'data'),
+     Input('kp-slider', 'value'),
+     Input('ti-slider', 'value'),
+     Input('td-slider', 'value')],
+    [State('session-id', 'data')],
+    prevent_initial_call=True
+)
+def update_live(target_height, kp, ti, td, session_id):
+    live = LIVE.get(session_id)
+    if live is None:
+        return no_update
+    live.update(target_height=target_height, Kp=kp, Ti=ti, Td=td)
+    return f"Zmiana od t = {live.sim_time:.1f} s: wysokość zadana {target_height} m, Kp={kp}, Ti={ti}, Td={td}"
+
+
+@callback(
+    Output('diagnostics-table', 'children'),
+    [Input('diagnostics-poll', 'n_intervals')]
+)
+def update_diagnostics(n_intervals):
+    requests = REGISTRY.recent_requests()[::-1][:20]
+    if not requests:
+        return "Brak zarejestrowanych żądań"
+    phases = ['simulation', 'metrics', 'figure', 'serialization']
+    header = html.Tr([html.Th(name) for name in ['callback', 'razem [ms]'] +
+                      [f"{name} [ms]" for name in phases] + ['kroki', 'cache', 'odpowiedź [kB]']])
+    rows = []
+    for record in requests:
+        notes = record['notes']
+        cache_hit = notes.get('cache_hit')
+        rows.append(html.Tr(
+            [html.Td(record['callback']), html.Td(f"{record['total_ms']:.1f}")] +
+            [html.Td(f"{record['phases'][name]:.1f}" if name in record['phases'] else '-') for name in phases] +
+            [html.Td(notes.get('simulation_steps', '-')),
+             html.Td('-' if cache_hit is None else ('trafienie' if cache_hit else 'chybienie')),
+             html.Td(f"{notes['payload_bytes'] / 1024:.1f}" if 'payload_bytes' in notes else '-')]
+        ))
+    return html.Table([header] + rows, style={'width': '100%', 'textAlign': 'right'})
+
+
+def simulation_options(gust, amplitude, noise, std, rate, latency, quantization, seed, derivative_filter,
+                       anti_windup):
+    """Opcje simulate_drone_with_params z kontrolek panelu (pusty słownik - model idealny)"""
+    environment = {}
+    amplitude = amplitude or 0
+    if gust == 'step':
+        environment['gust'] = ('step', amplitude, 20.0)
+    elif gust == 'one_minus_cosine':
+        environment['gust'] = ('one_minus_cosine', amplitude, 20.0, 2.0)
+    elif gust == 'turbulence':
+        environment['gust'] = ('turbulence', amplitude, 1.0)
+    if noise == 'gaussian':
+        environment['noise'] = ('gaussian', std or 0)
+    elif noise == 'colored':
+        environment['noise'] = ('colored', std or 0, 0.2)
+    if rate:
+        environment['sensor_rate'] = rate
+    if latency:
+        environment['latency'] = latency
+    if quantization:
+        environment['quantization'] = quantization
+
+    options = {}
+    if environment:
+        options['environment'] = environment
+        options['seed'] = int(seed or 0)
+    if derivative_filter:
+        options['derivative_filter'] = derivative_filter
+    if anti_windup and anti_windup != 'none':
+        options['anti_windup'] = anti_windup
+    return options
+
+
+def graph_data(drone, target_height, initial_height, kp, ti, td, duration, dt, method, tolerance, hold_time,
+               options, render_mode, progress=None):
+    """
+    Przebieg do wykresów: z atlasu, pamięci podręcznej albo symulacji
+
+    Zwraca: t, h, u, metryki jakości regulacji i opis źródła danych
+    """
+    if options:
+        # Zakłócenia i opcje regulatora obsługuje tylko pętla ze stałym krokiem
+        t, h, u, metrics = cached_simulation(drone, target_height, initial_height, kp, ti, td,
+                                             duration=duration, dt=dt, progress=progress, **options)
+        return t, h, u, metrics, f"źródło: symulacja z zakłóceniami, kroki: {len(t) - 1}, "
+    if method == 'adaptive':
+        t, h, u, metrics = cached_simulation(drone, target_height, initial_height, kp, ti, td, duration=duration,
+                                             dt=dt, integrator='adaptive', progress=progress, tolerance=tolerance,
+                                             hold_time=hold_time or None)
+        return t, h, u, metrics, (f"model ciągły, kroki: {metrics['solver_steps']}, "
+                                  f"szacowany błąd: {metrics['error_estimate']:.1e} m, "
+                                  f"różnica od modelu dyskretnego: {metrics['reference_error']:.2g} m, "
+                                  f"koniec: {metrics['stop_time']:.1f} s, ")
+    # Widok lekki najpierw z atlasu (przebiegi policzone offline), poza atlasem - symulacja
+    atlas = get_atlas() if render_mode != 'full' else None
+    answer = atlas.lookup(drone, target_height, initial_height, kp, ti, td, duration=duration, dt=dt) \
+        if atlas is not None else None
+    if answer is not None:
+        t, h, u, metrics, kind = answer
+        note('atlas', kind)
+        return t, h, u, metrics, f"źródło: atlas ({'węzeł siatki' if kind == 'exact' else 'interpolacja'}), "
+    t, h, u, metrics = cached_simulation(drone, target_height, initial_height, kp, ti, td,
+                                         duration=duration, dt=dt, progress=progress)
+    return t, h, u, metrics, f"źródło: symulacja, kroki: {len(t) - 1}, "
+
+
+def graph_outputs(t, h, u, metrics, target_height, render_mode, signature, solver):
+    """Figura (pełna, lekka albo łatka zmienionych śladów), jej podpis i opis odpowiedzi"""
+    with phase('figure'):
+        if render_mode == 'full':
+            fig = build_full_figure(t, h, u, target_height, metrics)
+            new_signature = None
+        else:
+            new_signature = figure_signature(render_mode, t, target_height)
+            # Ta sama struktura figury - wysyłamy tylko zmienione ślady
+            if signature and signature['mode'] == render_mode and signature['n'] == len(t):
+                fig = patch_light_figure(t, h, u, target_height, metrics,
+                                         update_shapes=signature['target'] != target_height)
+            else:
+                fig = build_light_figure(t, h, u, target_height, metrics)
+
+    with phase('serialization'):
+        stats = payload_stats(fig)
+    note('payload_bytes', stats['bytes'])
+    return fig, new_signature, (f"Symulacja - {solver}odpowiedź: {stats['bytes'] / 1024:.1f} kB, "
+                                f"serializacja: {stats['serialize_ms']:.1f} ms")
+
+
+@callback(
+    [Output('simulation-graphs', 'figure'),
+     Output('figure-signature', 'data'),
+     Output('render-stats', 'children'),
+     Output('graph-job', 'data'),
+     Output('graph-poll', 'disabled')],
     [Input('drone-select', 'value'),
      Input('initial-height', 'data'),
      Input('target-height', 'data'),
      Input('kp-slider', 'value'),
      Input('ti-slider', 'value'),
-     Input('td-slider', 'value')]
+     Input('td-slider', 'value'),
+     Input('render-mode', 'value'),
+     Input('sim-duration', 'value'),
+     Input('sim-method', 'value'),
+     Input('sim-dt', 'value'),
+     Input('sim-tolerance', 'value'),
+     Input('sim-hold', 'value'),
+     Input('env-gust', 'value'),
+     Input('env-gust-amplitude', 'value'),
+     Input('env-noise', 'value'),
+     Input('env-noise-std', 'value'),
+     Input('env-sensor-rate', 'value'),
+     Input('env-latency', 'value'),
+     Input('env-quantization', 'value'),
+     Input('env-seed', 'value'),
+     Input('pid-filter', 'value'),
+     Input('pid-anti-windup', 'value')],
+    [State('figure-signature', 'data'),
+     State('session-id', 'data'),
+     State('graph-job', 'data')]
 )
-def update_graphs(drone_name, initial_height, target_height, kp, ti, td):
+@instrument('update_graphs')
+def update_graphs(drone_name, initial_height, target_height, kp, ti, td, render_mode, duration, method, dt,
+                  tolerance, hold_time, gust, amplitude, noise, std, rate, latency, quantization, seed,
+                  derivative_filter, anti_windup, signature, session_id, job_id):
     drone = DRONES[drone_name]
-    t, h, u = simulate_drone_with_params(drone, target_height, initial_height, kp, ti, td)
-
-    # Obliczanie granic tunelu ±2%
-    upper_bound = target_height * 1.02
-    lower_bound = target_height * 0.98
-
-    # Znajdowanie maksymalnego przeregulowania
-    max_overshoot_value = max(h)
-    max_overshoot_idx = np.argmax(h)
-    max_overshoot_time = t[max_overshoot_idx]
-    overshoot_percent = ((max_overshoot_value - target_height) / target_height) * 100
-
-    # Znajdowanie momentu wejścia do tunelu
-    in_tunnel = False
-    settling_time = None
-    for i in range(len(t)):
-        if lower_bound <= h[i] <= upper_bound and not in_tunnel:
-            in_tunnel = True
-            settling_time = t[i]
-            # Sprawdzamy czy system pozostaje w tunelu
-            for j in range(i, len(t)):
-                if not (lower_bound <= h[j] <= upper_bound):
-                    in_tunnel = False
-                    settling_time = None
-                    break
-            if in_tunnel:
-                break
-
-    fig = make_subplots(rows=2, cols=1,
-                        subplot_titles=('Wysokość', 'Sygnał sterujący'))
-
-    # Podstawowe wykresy
-    fig.add_trace(
-        go.Scatter(x=t, y=h, name='Aktualna wysokość',
-                   line=dict(color='blue')),
-        row=1, col=1
-    )
-    fig.add_trace(
-        go.Scatter(x=t, y=[target_height] * len(t), name='Wysokość zadana',
-                   line=dict(color='red', dash='dash')),
-        row=1, col=1
-    )
-
-    # Dodanie tunelu akceptowalnego uchybu
-    fig.add_trace(
-        go.Scatter(x=t, y=[upper_bound] * len(t),
-                   name='Górna granica (2%)',
-                   line=dict(color='rgba(255,0,0,0.2)', dash='dot')),
-        row=1, col=1
-    )
-
-    # Wypełnienie tunelu
-    upper_line = [upper_bound] * len(t)
-    lower_line = [lower_bound] * len(t)
-    x_tunnel = list(t) + list(t)[::-1]
-    y_tunnel = upper_line + lower_line[::-1]
-
-    fig.add_trace(
-        go.Scatter(x=x_tunnel,
-                   y=y_tunnel,
-                   fill='toself',
-                   fillcolor='rgba(255,0,0,0.1)',
-                   line=dict(color='rgba(255,0,0,0)'),
-                   name='Tunel ±2%'),
-        row=1, col=1
-    )
-
-    fig.add_trace(
-        go.Scatter(x=t, y=[lower_bound] * len(t),
-                   name='Dolna granica (2%)',
-                   line=dict(color='rgba(255,0,0,0.2)', dash='dot')),
-        row=1, col=1
-    )
-
-    # Dodanie znacznika czasu ustalania
-    if settling_time is not None:
-        fig.add_trace(
-            go.Scatter(x=[settling_time], y=[h[int(settling_time / t[1])]],
-                       mode='markers+text',
-                       name=f'Czas ustalania: {settling_time:.2f}s',
-                       text=[f't={settling_time:.2f}s'],
-                       textposition='top center',
-                       marker=dict(size=10, symbol='triangle-down'),
-                       textfont=dict(size=12)),
-            row=1, col=1
-        )
-
-    # Dodanie znacznika maksymalnego przeregulowania
-    if overshoot_percent > 0:
-        fig.add_trace(
-            go.Scatter(x=[max_overshoot_time], y=[max_overshoot_value],
-                       mode='markers+text',
-                       name=f'Przeregulowanie: {overshoot_percent:.1f}%',
-                       text=[f'MP={overshoot_percent:.1f}%'],
-                       textposition='top center',
-                       marker=dict(size=10, symbol='circle'),
-                       textfont=dict(size=12)),
-            row=1, col=1
-        )
-
-    fig.add_trace(
-        go.Scatter(x=t, y=u, name='Siła ciągu',
-                   line=dict(color='green')),
-        row=2, col=1
-    )
-
-    fig.update_layout(height=800, showlegend=True)
-    fig.update_xaxes(title_text="Czas [s]", row=2, col=1)
-    fig.update_yaxes(title_text="Wysokość [m]", row=1, col=1)
-    fig.update_yaxes(title_text="Siła ciągu [N]", row=2, col=1)
-
-    return fig
+    duration = duration or 60
+    options = simulation_options(gust, amplitude, noise, std, rate, latency, quantization, seed,
+                                 derivative_filter, anti_windup)
+    args = (drone, target_height, initial_height, kp, ti, td, duration, dt, method, tolerance, hold_time, options,
+            render_mode)
+    if duration / dt > GRAPH_JOB_STEPS:
+        # Długi przebieg lub mały krok - symulacja w kolejce zadań sesji, figurę uzupełnia poll_graphs
+        try:
+            job = JOBS.submit((session_id, 'graph'), graph_data, *args)
+        except JobRejected as e:
+            return no_update, no_update, f"Symulacja: {e}", None, True
+        return no_update, no_update, job_status(job, "Symulacja w tle"), job.id, False
+    if job_id:
+        # Wynik zadania w tle nie jest już potrzebny - widok liczony jest tutaj
+        JOBS.cancel(job_id)
+
+    # Symulacja i wskaźniki jakości regulacji (tunel ±2%) z pamięci podręcznej
+    t, h, u, metrics, solver = graph_data(*args)
+    return graph_outputs(t, h, u, metrics, target_height, render_mode, signature, solver) + (None, True)
+
+
+@callback(
+    [Output('simulation-graphs', 'figure', allow_duplicate=True),
+     Output('figure-signature', 'data', allow_duplicate=True),
+     Output('render-stats', 'children', allow_duplicate=True),
+     Output('graph-poll', 'disabled', allow_duplicate=True)],
+    [Input('graph-poll', 'n_intervals')],
+    [State('graph-job', 'data'),
+     State('target-height', 'data'),
+     State('render-mode', 'value'),
+     State('figure-signature', 'data')],
+    prevent_initial_call=True
+)
+def poll_graphs(n_intervals, job_id, target_height, render_mode, signature):
+    job = JOBS.get(job_id)
+    if job is None or not job.done:
+        return no_update, no_update, job_status(job, "Symulacja w tle"), job is None
+    if job.status != 'done':
+        return no_update, no_update, job_status(job, "Symulacja w tle"), True
+
+    t, h, u, metrics, solver = job.result
+    return graph_outputs(t, h, u, metrics, target_height, render_mode, signature, solver) + (True,)
+
+
+@callback(
+    [Output('export-scenario', 'href'),
+     Output('export-comparison', 'href')],
+    [Input('export-format', 'value'),
+     Input('drone-select', 'value'),
+     Input('initial-height', 'data'),
+     Input('target-height', 'data'),
+     Input('kp-slider', 'value'),
+     Input('ti-slider', 'value'),
+     Input('td-slider', 'value'),
+     Input('sim-duration', 'value'),
+     Input('sim-method', 'value'),
+     Input('sim-dt', 'value'),
+     Input('sim-tolerance', 'value'),
+     Input('sim-hold', 'value'),
+     Input('env-gust', 'value'),
+     Input('env-gust-amplitude', 'value'),
+     Input('env-noise', 'value'),
+     Input('env-noise-std', 'value'),
+     Input('env-sensor-rate', 'value'),
+     Input('env-latency', 'value'),
+     Input('env-quantization', 'value'),
+     Input('env-seed', 'value'),
+     Input('pid-filter', 'value'),
+     Input('pid-anti-windup', 'value'),
+     Input('compare-drones', 'value'),
+     Input('compare-gains', 'value'),
+     Input('session-id', 'data')]
+)
+@instrument('export_links')
+def export_links(fmt, drone_name, initial_height, target_height, kp, ti, td, duration, method, dt, tolerance,
+                 hold_time, gust, amplitude, noise, std, rate, latency, quantization, seed, derivative_filter,
+                 anti_windup, compare_drones, gains_text, session_id):
+    # Adresy endpointu /export z parametrami bieżącego scenariusza (dane liczone dopiero przy pobraniu)
+    common = {'format': fmt, 'initial': initial_height, 'target': target_height,
+              'duration': duration or 60, 'dt': dt, 'session': session_id or ''}
+    options = simulation_options(gust, amplitude, noise, std, rate, latency, quantization, seed,
+                                 derivative_filter, anti_windup)
+    scenario = dict(common, kind='scenario', drone=drone_name, kp=kp, ti=ti, td=td, method=method,
+                    tolerance=tolerance, hold=hold_time or '', options=json.dumps(options) if options else '')
+    try:
+        gains = gains_text if parse_gain_sets(gains_text) else f"{kp} {ti} {td}"
+    except ValueError:
+        gains = f"{kp} {ti} {td}"
+    comparison = dict(common, kind='comparison', drones=compare_drones or [], gains=gains)
+    return f"/export?{urlencode(scenario)}", f"/export?{urlencode(comparison, doseq=True)}"
+
+
+# Liczba scenariuszy pamiętanych w historii sesji
+MAX_HISTORY = 20
+
+
+def _history_label(entry):
+    drone = DRONES[entry['drone']].name
+    return (f"{entry['time']} {drone}: {entry['initial']:g} → {entry['target']:g} m, "
+            f"Kp={entry['Kp']:g}, Ti={entry['Ti']:g}, Td={entry['Td']:g}")
+
+
+@callback(
+    [Output('scenario-history', 'data'),
+     Output('history-select', 'options'),
+     Output('history-select', 'value')],
+    [Input('render-stats', 'children')],
+    [State('drone-select', 'value'),
+     State('initial-height', 'data'),
+     State('target-height', 'data'),
+     State('kp-slider', 'value'),
+     State('ti-slider', 'value'),
+     State('td-slider', 'value'),
+     State('scenario-history', 'data')]
+)
+@instrument('record_scenario')
+def record_scenario(_, drone_name, initial_height, target_height, kp, ti, td, history):
+    # Każdy policzony scenariusz trafia na początek historii sesji (bez powtórzeń z rzędu)
+    history = [entry for entry in history or [] if _known_label(entry['drone'])]
+    entry = {'drone': drone_name, 'initial': initial_height, 'target': target_height, 'Kp': kp, 'Ti': ti, 'Td': td}
+    if history and all(history[0][name] == value for name, value in entry.items()):
+        return no_update, no_update, None
+    entry['time'] = time.strftime('%H:%M:%S')
+    history = [entry] + history[:MAX_HISTORY - 1]
+    options = [{'label': _history_label(item), 'value': index} for index, item in enumerate(history)]
+    return history, options, None
+
+
+@callback(
+    [Output('drone-select', 'value', allow_duplicate=True),
+     Output('initial-height', 'data', allow_duplicate=True),
+     Output('target-height', 'data', allow_duplicate=True),
+     Output('kp-slider', 'value', allow_duplicate=True),
+     Output('ti-slider', 'value', allow_duplicate=True),
+     Output('td-slider', 'value', allow_duplicate=True)],
+    [Input('history-select', 'value')],
+    [State('scenario-history', 'data')],
+    prevent_initial_call=True
+)
+@instrument('restore_scenario')
+def restore_scenario(index, history):
+    if index is None or not history or index >= len(history):
+        return (no_update,) * 6
+    entry = history[index]
+    return entry['drone'], entry['initial'], entry['target'], entry['Kp'], entry['Ti'], entry['Td']
+
+
+def warm_up():
+    """
+    Rozgrzewka procesu przed pierwszym żądaniem
+
+    Wywołuje gorące ścieżki (symulacja, metryki, LTTB, budowa i serializacja
+    figury), co ładuje leniwie importowane moduły Plotly i wypełnia pamięć
+    podręczną domyślnymi scenariuszami wszystkich dronów oraz analizę
+    częstotliwościową domyślnych nastaw. Atlas odpowiedzi
+    (jeśli skonfigurowany) jest otwierany już tutaj, żeby procesy robocze
+    dziedziczyły jego mapowanie.
+    """
+    get_atlas()
+    for drone in DRONES.values():
+        t, h, u, metrics = cached_simulation(drone, 10, 0, 20, 4.0, 1.5)
+    payload_stats(build_light_figure(t, h, u, 10, metrics))
+    payload_stats(patch_light_figure(t, h, u, 10, metrics, update_shapes=True))
+    # Import pakietu control trwa kilka sekund - lepiej przed pierwszym otwarciem panelu
+    frequency_analysis(drone, 20, 4.0, 1.5)
+
+
+_app = None
+
+
+def create_app(warm=False):
+    """
+    Fabryka aplikacji Dash
+
+    Callbacki są rejestrowane globalnie (dash.callback) przy imporcie modułu
+    i Dash przejmuje je przy tworzeniu pierwszej aplikacji, dlatego w procesie
+    istnieje jedna aplikacja - kolejne wywołania zwracają tę samą instancję.
+    Przy warm=True proces jest rozgrzewany przed zwróceniem aplikacji - przy
+    serwerze z preload (gunicorn --preload) robi to raz proces nadrzędny,
+    a procesy robocze dziedziczą stan przez fork.
+    """
+    global _app
+    if _app is None:
+        _app = Dash(__name__)
+        _app.layout = layout
+        register_metrics_endpoint(_app.server)
+        register_export_endpoint(_app.server)
+    if warm:
+        warm_up()
+    return _app
+
 
 if __name__ == '__main__':
-    app.run_server(debug=True)
+    app = create_app(warm=True)
+    app.run(debug=True)
@@ -0,0 +1,102 @@
+import numpy as np
+
+# Domyślna szerokość tunelu akceptowalnego uchybu (±2% wartości zadanej)
+DEFAULT_TOLERANCE = 0.02
+
+
+def _first_true(mask):
+    """Indeks pierwszego True wzdłuż ostatniej osi (-1 gdy brak)"""
+    idx = np.argmax(mask, axis=-1)
+    return np.where(np.any(mask, axis=-1), idx, -1)
+
+
+def _take(values, idx):
+    """values[..., idx] z NaN dla idx == -1"""
+    picked = np.take_along_axis(values, np.maximum(idx, 0)[..., None], axis=-1)[..., 0]
+    return np.where(idx >= 0, picked, np.nan)
+
+
+def step_response_metrics(t, h, target_height, initial_height=None, u=None, tolerance=DEFAULT_TOLERANCE,
+                          max_thrust=None):
+    """
+    Wskaźniki jakości odpowiedzi skokowej liczone w jednym przebiegu O(n)
+
+    Parametry:
+    t: wektor czasu (n_steps,)
+    h: wysokość (n_steps,) lub paczka przebiegów (n_scenarios, n_steps)
+    target_height: wysokość zadana (skalar lub (n_scenarios,))
+    initial_height: wysokość początkowa (domyślnie h[..., 0])
+    u: sygnał sterujący o kształcie h (opcjonalnie, do kosztu sterowania)
+    tolerance: względna szerokość tunelu wokół wartości zadanej
+    max_thrust: maksymalny ciąg (skalar lub (n_scenarios,)); gdy podany,
+        liczony jest też czas pracy w nasyceniu (u == 0 lub u == max_thrust)
+
+    Zwraca: słownik wskaźników; dla pojedynczego przebiegu wartości są
+    skalarami, dla paczki - tablicami (n_scenarios,). Brak wartości
+    (np. układ nie wszedł do tunelu) oznaczany jest jako NaN / indeks -1.
+    """
+    t = np.asarray(t, dtype=float)
+    h = np.asarray(h, dtype=float)
+    single = h.ndim == 1
+    h = np.atleast_2d(h)
+
+    target = np.asarray(target_height, dtype=float)[..., None] * np.ones((h.shape[0], 1))
+    if initial_height is None:
+        start = h[:, :1]
+    else:
+        start = np.asarray(initial_height, dtype=float)[..., None] * np.ones((h.shape[0], 1))
+    step = target - start
+    direction = np.where(step < 0, -1.0, 1.0)
+
+    # Wagi prostokątów do całkowania (krok symulacji)
+    weights = np.diff(t, append=t[-1] + (t[-1] - t[-2] if len(t) > 1 else 0.0))
+
+    error = target - h
+    abs_error = np.abs(error)
+
+    # Czas ustalania - pierwsza próbka, od której przebieg już nie opuszcza tunelu
+    band = tolerance * np.abs(target)
+    outside = abs_error > band
+    n = h.shape[-1]
+    last_outside = n - 1 - _first_true(outside[:, ::-1])
+    last_outside = np.where(np.any(outside, axis=-1), last_outside, -1)
+    settling_index = np.where(last_outside + 1 < n, last_outside + 1, -1)
+
+    # Przeregulowanie - wartość szczytowa w kierunku skoku
+    peak_index = np.argmax(direction * h, axis=-1)
+    peak_value = np.take_along_axis(h, peak_index[:, None], axis=-1)[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        overshoot = direction[:, 0] * (peak_value - target[:, 0]) / np.abs(target[:, 0]) * 100
+
+    # Czas narastania 10% -> 90% skoku
+    progress = direction * (h - start)
+    span = np.abs(step)
+    rise_start = _first_true(progress >= 0.1 * span)
+    rise_end = _first_true(progress >= 0.9 * span)
+    rise_time = _take(np.broadcast_to(t, h.shape), rise_end) - _take(np.broadcast_to(t, h.shape), rise_start)
+
+    result = {
+        'settling_time': _take(np.broadcast_to(t, h.shape), settling_index),
+        'settling_index': settling_index,
+        'overshoot_percent': overshoot,
+        'peak_value': peak_value,
+        'peak_time': t[peak_index],
+        'peak_index': peak_index,
+        'rise_time': rise_time,
+        'steady_state_error': error[:, -1],
+        'iae': abs_error @ weights,
+        'ise': (error * error) @ weights,
+        'itae': abs_error @ (t * weights),
+    }
+    if u is not None:
+        u = np.atleast_2d(np.asarray(u, dtype=float))
+        result['control_effort'] = np.abs(u) @ weights
+        if max_thrust is not None:
+            limit = np.asarray(max_thrust, dtype=float)[..., None]
+            saturated = (u <= 0) | (u >= limit)
+            result['saturation_time'] = saturated @ weights
+            result['saturation_fraction'] = result['saturation_time'] / weights.sum()
+
+    if single:
+        result = {key: value[0].item() for key, value in result.items()}
+    return result
@@ -0,0 +1,142 @@
+import numpy as np
+
+from metrics import DEFAULT_TOLERANCE, step_response_metrics
+from simulation import simulate_drone_with_params
+
+# Rodzaje odcinków misji:
+#   step <wysokość> <czas> - skok wartości zadanej i utrzymanie przez czas [s]
+#   ramp <wysokość> <czas> - liniowa zmiana wartości zadanej w czasie [s]
+#   hold <czas> - utrzymanie poprzedniej wartości zadanej
+SEGMENT_KINDS = ('step', 'ramp', 'hold')
+
+# Górna granica łącznego czasu misji [s] - liczba kroków symulacji i pamięć jednego żądania
+MAX_MISSION_DURATION = 3600
+
+EXAMPLE_MISSION = """step 20 15
+hold 5
+ramp 60 20
+hold 15
+step 30 20
+ramp 0 30
+"""
+
+
+def parse_mission(text):
+    """
+    Odcinki misji z tekstu (po jednym w wierszu, # rozpoczyna komentarz)
+
+    Zwraca: listę krotek (rodzaj, wysokość lub None dla hold, czas [s]).
+    Wyjątek ValueError przy błędzie w opisie albo misji dłuższej niż
+    MAX_MISSION_DURATION.
+    """
+    segments = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        fields = line.split('#', 1)[0].split()
+        if not fields:
+            continue
+        kind, values = fields[0].lower(), fields[1:]
+        if kind not in SEGMENT_KINDS:
+            raise ValueError(f"Wiersz {line_number}: nieznany rodzaj odcinka {fields[0]!r} "
+                             f"(dostępne: {', '.join(SEGMENT_KINDS)})")
+        expected = 1 if kind == 'hold' else 2
+        if len(values) != expected:
+            raise ValueError(f"Wiersz {line_number}: {kind} wymaga {expected} liczb")
+        try:
+            values = [float(value) for value in values]
+        except ValueError:
+            raise ValueError(f"Wiersz {line_number}: niepoprawna liczba") from None
+        if not np.all(np.isfinite(values)):
+            raise ValueError(f"Wiersz {line_number}: oczekiwano skończonych liczb")
+        target, duration = (None, values[0]) if kind == 'hold' else values
+        if duration <= 0:
+            raise ValueError(f"Wiersz {line_number}: czas odcinka musi być dodatni")
+        if target is not None and target < 0:
+            raise ValueError(f"Wiersz {line_number}: wysokość nie może być ujemna")
+        segments.append((kind, target, duration))
+    if not segments:
+        raise ValueError("Misja nie zawiera żadnego odcinka")
+    total = sum(segment[2] for segment in segments)
+    if total > MAX_MISSION_DURATION:
+        raise ValueError(f"Misja trwa {total:g} s, limit to {MAX_MISSION_DURATION} s")
+    return segments
+
+
+def mission_setpoint(segments, initial_target, dt=0.01):
+    """
+    Harmonogram wartości zadanej jako tablica próbek (liczony raz, przed symulacją)
+
+    Zwraca: t, wartość zadaną r (n_steps,) oraz listę odcinków
+    (rodzaj, wysokość docelowa, indeks początku, indeks końca).
+    """
+    duration = sum(segment[2] for segment in segments)
+    t = np.arange(0, duration, dt)
+    r = np.empty(len(t))
+    bounds = []
+    previous = float(initial_target)
+    start_time = 0.0
+    for kind, target, seg_duration in segments:
+        end_time = start_time + seg_duration
+        start, end = np.searchsorted(t, [start_time - dt / 2, end_time - dt / 2])
+        if kind == 'hold':
+            target = previous
+        if kind == 'ramp':
+            r[start:end] = previous + (target - previous) * (t[start:end] - start_time) / seg_duration
+        else:
+            r[start:end] = target
+        bounds.append((kind, target, start, end))
+        previous = target
+        start_time = end_time
+    return t, r, bounds
+
+
+def segment_metrics(t, h, u, r, bounds, max_thrust=None, tolerance=DEFAULT_TOLERANCE):
+    """
+    Wskaźniki jakości dla każdego odcinka misji
+
+    Dla odcinka liczone są wskaźniki odpowiedzi (step_response_metrics) względem
+    jego wysokości docelowej, z czasem liczonym od początku odcinka, oraz błąd
+    nadążania za harmonogramem (maksymalny i średniokwadratowy).
+    """
+    results = []
+    for kind, target, start, end in bounds:
+        if end - start < 2:
+            continue
+        part = slice(start, end)
+        local_t = t[part] - t[start]
+        metrics = step_response_metrics(local_t, h[part], target, h[start], u=u[part], tolerance=tolerance,
+                                        max_thrust=max_thrust)
+        tracking = r[part] - h[part]
+        metrics.update({
+            'kind': kind,
+            'target': target,
+            'start_time': float(t[start]),
+            'duration': float(t[end - 1] - t[start]),
+            'max_tracking_error': float(np.abs(tracking).max()),
+            'rms_tracking_error': float(np.sqrt(np.mean(tracking ** 2))),
+        })
+        results.append(metrics)
+    return results
+
+
+def simulate_mission(drone, segments, initial_height, Kp, Ti, Td, dt=0.01, initial_target=None, progress=None):
+    """
+    Symulacja całej misji w jednym przebiegu
+
+    Harmonogram jest wcześniej zamieniany na tablicę wartości zadanej, więc
+    koszt kroku nie zależy od liczby odcinków. initial_target to wartość
+    zadana przed pierwszym odcinkiem (istotna dla ramp i hold na początku,
+    domyślnie wysokość początkowa). progress trafia do pętli symulacji
+    (punkt anulowania, patrz jobs.py).
+
+    Zwraca: słownik z t, h, u, r, granicami odcinków i metrykami odcinków.
+    """
+    initial_target = initial_height if initial_target is None else initial_target
+    t, r, bounds = mission_setpoint(segments, initial_target, dt)
+    duration = sum(segment[2] for segment in segments)
+    _, h, u = simulate_drone_with_params(drone, r[0], initial_height, Kp, Ti, Td, duration=duration, dt=dt,
+                                         setpoint=r, progress=progress)
+    return {
+        't': t, 'h': h, 'u': u, 'r': r,
+        'bounds': bounds,
+        'segments': segment_metrics(t, h, u, r, bounds, max_thrust=drone.max_thrust),
+    }
@@ -1,4 +1,10 @@
-from dash import Dash, dcc, html, Input, Output
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from dash import Dash, dcc, html, Input, Output, no_update
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
@@ -21,33 +27,233 @@ def advanced_voltage_model(q, Q_max, V_nom, V_min=3.0, V_max=4.2):
     Bardziej zaawansowany model napięcia baterii litowo-jonowej
 
     Parametry:
-    q: aktualny ładunek (Ah)
+    q: aktualny ładunek (Ah) - liczba lub tablica
     Q_max: maksymalna pojemność baterii (Ah)
     V_nom: nominalne napięcie baterii (V)
     V_min: minimalne napięcie baterii (V)
     V_max: maksymalne napięcie baterii (V)
 
-    Zwraca: napięcie baterii w danym momencie ładowania
+    Zwraca: napięcie baterii w danym momencie ładowania (liczba dla
+    skalarnego q, tablica dla tablicy)
     """
     # Normalizacja ładunku
-    soc = q / Q_max
+    soc = np.asarray(q, dtype=float) / Q_max
 
     # Model krzywej ładowania baterii litowo-jonowej
-    # Krzywa przypominająca kształt sigmoidy
-    if soc < 0.2:
-        # Powolny wzrost napięcia na początku ładowania
-        voltage = V_min + (V_nom - V_min) * (soc / 0.2) ** 2
-    elif soc < 0.8:
-        # Prawie liniowy wzrost napięcia
-        voltage = V_nom
-    else:
-        # Spowolnienie wzrostu napięcia pod koniec ładowania
-        voltage = V_max - (V_max - V_nom) * np.exp(-(soc - 0.8) / 0.2)
+    # Krzywa przypominająca kształt sigmoidy:
+    # - powolny wzrost napięcia na początku ładowania,
+    # - prawie liniowy wzrost napięcia,
+    # - spowolnienie wzrostu napięcia pod koniec ładowania
+    voltage = np.where(
+        soc < 0.2,
+        V_min + (V_nom - V_min) * (soc / 0.2) ** 2,
+        np.where(soc < 0.8, V_nom, V_max - (V_max - V_nom) * np.exp(-(soc - 0.8) / 0.2))
+    )
+
+    return voltage if voltage.ndim else float(voltage)
+
+
+# Dostępne moce ładowarek (W)
+CHARGERS = [5, 12, 20, 30]
+
+# Poziomy naładowania w tablicy czasów ładowania (co 0.1%)
+TABLE_LEVELS = np.round(np.linspace(0, 100, 1001), 1)
+
+# Parametry modelu ładowania (wspólne dla obu silników)
+V_MIN = 3.0  # Napięcie baterii rozładowanej (V)
+V_MAX = 4.2  # Napięcie baterii naładowanej (V)
+LOW_SOC = 0.2  # Koniec obszaru powolnego wzrostu napięcia
+CV_SOC = 0.8  # Próg przejścia do fazy CV
+MIN_CURRENT = 0.25  # Minimalny prąd ładowania (A)
+CV_DECAY = 5  # Szybkość wykładniczego spadku prądu w fazie CV (na 0.2 pojemności)
+
+
+def charging_current(q, Q_max, V_nom, P_max, I_max):
+    """
+    Prąd ładowania (A) dla ładunku q (liczba lub tablica) - to samo prawo co w pętli krokowej
 
-    return voltage
+    Faza CC: min(P_max / V, I_max); faza CV: prąd maleje wykładniczo z
+    ładunkiem ponad próg; w obu fazach prąd nie spada poniżej MIN_CURRENT.
+    """
+    q = np.asarray(q, dtype=float)
+    V = advanced_voltage_model(q, Q_max, V_nom, V_MIN, V_MAX)
+    cv_factor = np.exp(-CV_DECAY * np.maximum(q - CV_SOC * Q_max, 0) / (LOW_SOC * Q_max))
+    return np.maximum(np.minimum(cv_factor * P_max / V, I_max), MIN_CURRENT)
+
+
+def _solve_decreasing(f, value, lo, hi, tolerance=1e-13):
+    """Punkt, w którym malejąca funkcja f osiąga value (bisekcja; None, gdy poza [lo, hi])"""
+    if not f(hi) <= value <= f(lo):
+        return None
+    while hi - lo > tolerance:
+        mid = 0.5 * (lo + hi)
+        if f(mid) > value:
+            lo = mid
+        else:
+            hi = mid
+    return 0.5 * (lo + hi)
 
 
-def simulate_charging(phone, charger_power, start_percent, end_percent):
+class _ChargingModel:
+    """
+    Czas ładowania jako funkcja ładunku w postaci zamkniętej
+
+    Dla każdego rodzaju odcinka dq/dt = I(q) / 60 całkuje się analitycznie:
+    - 'constant': stały prąd (I_max, prąd z P_max przy V_nom lub MIN_CURRENT),
+    - 'power': moc P_max przy napięciu rosnącym kwadratowo (soc < 0.2) -
+      czas jest wielomianem trzeciego stopnia ładunku, odwracanym wzorem
+      Cardano,
+    - 'cv': prąd cv_factor * P_max / V - czas jest sumą dwóch wykładników,
+      odwracaną metodą Newtona.
+    """
+
+    def __init__(self, Q_max, V_nom, P_max, I_max):
+        self.Q_max, self.V_nom, self.P_max, self.I_max = Q_max, V_nom, P_max, I_max
+        self.q_low = LOW_SOC * Q_max
+        self.q_cv = CV_SOC * Q_max
+        # Współczynniki: cv_factor = exp(-alpha x), V = V_MAX - (V_MAX - V_nom) exp(-beta x), x = q - q_cv
+        self.alpha = CV_DECAY / self.q_low
+        self.beta = 1 / self.q_low
+        # Faza 'power': V = V_MIN + (V_nom - V_MIN) (q / q_low)^2
+        self.cubic = (V_nom - V_MIN) / (3 * self.q_low ** 2)
+
+    def current(self, q):
+        return charging_current(q, self.Q_max, self.V_nom, self.P_max, self.I_max)
+
+    def events(self):
+        """Ładunki, przy których zmienia się postać prądu (przełączenia ograniczeń i faz)"""
+        points = [self.q_low, self.q_cv]
+        # Koniec ograniczenia prądem I_max w obszarze soc < 0.2: P_max / V(q) = I_max
+        v_switch = self.P_max / self.I_max
+        if V_MIN < v_switch < self.V_nom:
+            points.append(self.q_low * np.sqrt((v_switch - V_MIN) / (self.V_nom - V_MIN)))
+
+        # Faza CV: koniec ograniczenia I_max i początek ograniczenia MIN_CURRENT
+        def cv_current(x):
+            V = V_MAX - (V_MAX - self.V_nom) * math.exp(-self.beta * x)
+            return math.exp(-self.alpha * x) * self.P_max / V
+
+        for limit in (self.I_max, MIN_CURRENT):
+            x = _solve_decreasing(cv_current, limit, 0.0, self.Q_max - self.q_cv)
+            if x is not None:
+                points.append(self.q_cv + x)
+        return points
+
+    def kinds(self, q, current):
+        """Rodzaje odcinków zawierających ładunki q (punkty z wnętrza odcinków) przy prądach current"""
+        limited = (current < self.I_max) & (current > MIN_CURRENT)
+        return np.where((q < self.q_low) & limited, 'power',
+                        np.where((q >= self.q_cv) & limited, 'cv', 'constant'))
+
+    def segments(self, q_start, q_end):
+        """
+        Odcinki ładowania od q_start do q_end między kolejnymi zdarzeniami
+
+        Zwraca: listę (rodzaj, ładunek początkowy i końcowy, prąd stały
+        lub None, chwila początku) oraz czas zakończenia ładowania (min).
+        """
+        bounds = sorted({q_start, q_end} | {q for q in self.events() if q_start < q < q_end})
+        middle = 0.5 * (np.array(bounds[:-1]) + np.array(bounds[1:]))
+        currents = self.current(middle)
+        segments = []
+        t_start = 0.0
+        for q0, q1, kind, current in zip(bounds[:-1], bounds[1:], self.kinds(middle, currents), currents):
+            current = float(current) if kind == 'constant' else None
+            segments.append((kind, q0, q1, current, t_start))
+            t_start += self.time(kind, q1, current) - self.time(kind, q0, current)
+        return segments, t_start
+
+    def time(self, kind, q, current=None):
+        """Funkcja pierwotna czasu [min] dla odcinka danego rodzaju (różnice dają czas trwania)"""
+        if kind == 'constant':
+            return 60 * q / current
+        if kind == 'power':
+            return 60 / self.P_max * (V_MIN * q + self.cubic * q ** 3)
+        x = q - self.q_cv
+        return 60 / self.P_max * (V_MAX * np.expm1(self.alpha * x) / self.alpha -
+                                  (V_MAX - self.V_nom) * np.expm1((self.alpha - self.beta) * x) /
+                                  (self.alpha - self.beta))
+
+    def charge(self, kind, tau, q_end, current=None):
+        """Ładunek, dla którego funkcja czasu odcinka osiąga tau (odwrotność time)"""
+        if kind == 'constant':
+            return tau * current / 60
+        if kind == 'power':
+            # q^3 + p q = r, jedyny pierwiastek rzeczywisty (p > 0) ze wzoru Cardano
+            p = V_MIN / self.cubic
+            r = tau * self.P_max / (60 * self.cubic)
+            w = np.cbrt(r / 2 + np.sqrt(r * r / 4 + p ** 3 / 27))
+            return w - p / (3 * w)
+        # Funkcja czasu jest rosnąca i wypukła - Newton od końca odcinka zbiega monotonicznie
+        q = np.full_like(tau, q_end)
+        for _ in range(100):
+            step = (self.time('cv', q) - tau) * self.current(q) / 60
+            q = q - step
+            if np.all(np.abs(step) < 1e-12 * self.Q_max):
+                break
+        return q
+
+
+def _charging_model(phone, charger_power):
+    phone_params = smartphones[phone]
+    P_max = min(phone_params["P_max"], charger_power)  # Ograniczenie mocy (W)
+    return _ChargingModel(phone_params["Q_max"], phone_params["V_nom"], P_max, phone_params["I_max"])
+
+
+def simulate_charging(phone, charger_power, start_percent, end_percent, dt=1.0):
+    """
+    Symulacja ładowania sterowana zdarzeniami
+
+    Przebieg dzielony jest na odcinki, w których prąd ma stałą postać
+    (faza CC z ograniczeniem prądu lub mocy, faza CV, prąd minimalny).
+    Granice odcinków - w tym przejście do fazy CV i koniec ładowania - są
+    zdarzeniami wyznaczanymi dokładnie, a czas w każdym odcinku liczony
+    w postaci zamkniętej, więc wynik nie zależy od dt. Próbki (co dt
+    minut oraz w chwili zakończenia ładowania) liczone są wektorowo.
+
+    Wynik nie jest identyczny z simulate_charging_stepwise: tamta pętla
+    całkuje metodą Eulera z krokiem 1 min i kończy ładowanie na pełnej
+    minucie. Czas ładowania różni się o mniej niż 2 min (np. iPhone 8,
+    5 W, 0 -> 100%: 137,26 min wobec 137 kroków; najwięcej 1,76 min),
+    a poziom naładowania w tych samych chwilach - o mniej niż 1 punkt
+    procentowy (tests/test_charging.py).
+
+    Parametry:
+    dt: krok próbek wynikowych (minuty)
+
+    Zwraca: tablice czasu (min), prądu (A), mocy (W), napięcia (V) i naładowania (%)
+    """
+    model = _charging_model(phone, charger_power)
+    Q_max, V_nom = model.Q_max, model.V_nom
+
+    start_charge = start_percent / 100 * Q_max  # Ładunek początkowy (Ah)
+    end_charge = end_percent / 100 * Q_max  # Ładunek końcowy (Ah)
+    if start_charge >= end_charge:
+        return tuple(np.empty(0) for _ in range(5))
+
+    segments, t_end = model.segments(start_charge, end_charge)
+
+    time = np.arange(0, t_end, dt)
+    time = np.append(time, t_end) if t_end - time[-1] > 1e-9 * dt else time
+    q = np.empty_like(time)
+    index = np.searchsorted([segment[4] for segment in segments], time, side='right') - 1
+    for k, (kind, q0, q1, current, t0) in enumerate(segments):
+        mask = index == k
+        tau = model.time(kind, q0, current) + time[mask] - t0
+        q[mask] = np.clip(model.charge(kind, tau, q1, current), q0, q1)
+    q[-1] = end_charge
+
+    current = model.current(q)
+    voltage = advanced_voltage_model(q, Q_max, V_nom, V_MIN, V_MAX)
+    return time, current, current * voltage, voltage, q / Q_max * 100
+
+
+def simulate_charging_stepwise(phone, charger_power, start_percent, end_percent):
+    """
+    Pierwotna symulacja krokowa (krok 1 minuta) - wzorzec do porównań z simulate_charging
+
+    Zwraca: listy czasu, prądu, mocy, napięcia i naładowania
+    """
     phone_params = smartphones[phone]
     Q_max = phone_params["Q_max"]  # Pojemność baterii (Ah)
     V_nom = phone_params["V_nom"]  # Napięcie nominalne (V)
@@ -108,6 +314,119 @@ def simulate_charging(phone, charger_power, start_percent, end_percent):
     return time, current, power, voltage, charge
 
 
+def charge_time_profile(phone, charger_power, levels=TABLE_LEVELS):
+    """
+    Czas ładowania od 0% do kolejnych poziomów naładowania
+
+    Ładowanie zależy tylko od bieżącego ładunku, więc czas od poziomu a do b
+    to różnica profilu w b i w a - jeden profil wystarcza dla wszystkich
+    par poziomów początkowego i końcowego.
+
+    Zwraca: tablice czasu (min), prądu (A) i napięcia (V) na poziomach levels (%)
+    """
+    model = _charging_model(phone, charger_power)
+    q = np.asarray(levels, dtype=float) / 100 * model.Q_max
+    segments, _ = model.segments(0.0, model.Q_max)
+    time = np.zeros_like(q)
+    for kind, q0, q1, current, t0 in segments:
+        # Wkład odcinka: czas od jego początku do min(q, koniec odcinka)
+        part = np.clip(q, q0, q1)
+        time += np.where(q > q0, model.time(kind, part, current) - model.time(kind, q0, current), 0.0)
+    return time, model.current(q), advanced_voltage_model(q, model.Q_max, model.V_nom, V_MIN, V_MAX)
+
+
+def _profile_rows(pairs):
+    return [charge_time_profile(phone, charger_power) for phone, charger_power in pairs]
+
+
+def build_charge_table(workers=1):
+    """
+    Tablica czasów ładowania dla wszystkich telefonów, ładowarek i poziomów
+
+    Dla każdej pary (telefon, ładowarka) liczony jest jeden profil
+    charge_time_profile; przy workers > 1 pary dzielone są między procesy.
+
+    Zwraca: słownik z listami phones i chargers, poziomami levels oraz
+    tablicami time, current i voltage o kształcie (telefony, ładowarki, poziomy)
+    """
+    phones = list(smartphones)
+    pairs = [(phone, charger_power) for phone in phones for charger_power in CHARGERS]
+    if workers > 1:
+        chunks = [pairs[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            parts = list(pool.map(_profile_rows, chunks))
+        rows = [None] * len(pairs)
+        for i, part in enumerate(parts):
+            rows[i::workers] = part
+    else:
+        rows = _profile_rows(pairs)
+
+    shape = (len(phones), len(CHARGERS), len(TABLE_LEVELS))
+    time, current, voltage = (np.array([row[k] for row in rows]).reshape(shape) for k in range(3))
+    return {'phones': phones, 'chargers': list(CHARGERS), 'levels': TABLE_LEVELS,
+            'time': time, 'current': current, 'voltage': voltage}
+
+
+_charge_table = None
+_charge_table_lock = threading.Lock()
+
+
+def get_charge_table():
+    """
+    Tablica czasów ładowania liczona raz na proces
+
+    Gdy ustawiona jest zmienna CHARGE_TABLE_PATH, tablica wczytywana jest
+    z pliku .npz (i zapisywana tam po zbudowaniu); plik z innym zestawem
+    telefonów, ładowarek lub poziomów jest budowany od nowa.
+    """
+    global _charge_table
+    with _charge_table_lock:
+        if _charge_table is None:
+            path = os.environ.get('CHARGE_TABLE_PATH')
+            table = None
+            if path and os.path.exists(path):
+                with np.load(path) as data:
+                    table = {name: data[name] for name in data.files}
+                table['phones'] = table['phones'].tolist()
+                table['chargers'] = table['chargers'].tolist()
+                if (table['phones'] != list(smartphones) or table['chargers'] != CHARGERS or
+                        not np.array_equal(table['levels'], TABLE_LEVELS)):
+                    table = None
+            if table is None:
+                table = build_charge_table(workers=int(os.environ.get('CHARGE_TABLE_WORKERS', 1)))
+                if path:
+                    np.savez(path, **table)
+            _charge_table = table
+        return _charge_table
+
+
+def charge_time_matrix(table, phone, charger_power, step=1):
+    """Czasy ładowania (min) dla par poziomów co step%: wiersz - poziom początkowy, kolumna - końcowy"""
+    profile = table['time'][table['phones'].index(phone), table['chargers'].index(charger_power)]
+    levels = table['levels'][::round(step * 10)]
+    times = profile[::round(step * 10)]
+    matrix = times[None, :] - times[:, None]
+    matrix[levels[:, None] >= levels[None, :]] = np.nan
+    return levels, matrix
+
+
+def charge_curve(table, phone, charger_power, start_percent, end_percent):
+    """
+    Przebieg ładowania od start_percent do end_percent z tablicy czasów ładowania
+
+    Próbki leżą na poziomach tablicy (co 0.1%), a czas dojścia do poziomu
+    to różnica profilu czasu względem poziomu początkowego - bez symulacji.
+
+    Zwraca: tablice czasu (min), prądu (A), mocy (W), napięcia (V) i naładowania (%)
+    """
+    i, j = table['phones'].index(phone), table['chargers'].index(charger_power)
+    part = slice(round(start_percent * 10), round(end_percent * 10) + 1)
+    time = table['time'][i, j, part]
+    current = table['current'][i, j, part]
+    voltage = table['voltage'][i, j, part]
+    return time - time[0], current, current * voltage, voltage, table['levels'][part]
+
+
 # Inicjalizacja aplikacji Dash
 app = Dash(__name__)
 
@@ -132,7 +451,7 @@ app.layout = html.Div(
                 html.Label("Wybierz Moc Ładowarki:", style={"fontFamily": "Comic Sans MS"}),
                 dcc.Dropdown(
                     id="charger_power",
-                    options=[{"label": f"{power}W", "value": power} for power in [5, 12, 20, 30]],
+                    options=[{"label": f"{power}W", "value": power} for power in CHARGERS],
                     value=30,
                     style={"margin-bottom": "20px"},
                     clearable=False
@@ -176,7 +495,8 @@ app.layout = html.Div(
         html.Div(
             style={"flex": "75%", "padding": "20px"},
             children=[
-                dcc.Graph(id="charging_graph")
+                dcc.Graph(id="charging_graph"),
+                dcc.Graph(id="charge_heatmap")
             ]
         )
     ]
@@ -191,6 +511,8 @@ app.layout = html.Div(
     Input("end_percent", "value")
 )
 def update_graph(phone, charger_power, start_percent, end_percent):
+    if start_percent is None or end_percent is None:
+        return no_update
     if start_percent >= end_percent:
         fig = go.Figure()
         fig.update_layout(
@@ -200,7 +522,9 @@ def update_graph(phone, charger_power, start_percent, end_percent):
         )
         return fig
 
-    time, current, power, voltage, charge = simulate_charging(phone, charger_power, start_percent, end_percent)
+    # Przebiegi w czasie z tablicy czasów ładowania (ta sama, która zasila mapy cieplne)
+    time, current, power, voltage, charge = charge_curve(get_charge_table(), phone, charger_power,
+                                                         start_percent, end_percent)
 
     # Układ wykresów w 2x2
     fig = make_subplots(
@@ -233,5 +557,45 @@ def update_graph(phone, charger_power, start_percent, end_percent):
     return fig
 
 
+@app.callback(
+    Output("charge_heatmap", "figure"),
+    Input("phone", "value"),
+    Input("charger_power", "value"),
+    Input("start_percent", "value"),
+    Input("end_percent", "value")
+)
+def update_heatmap(phone, charger_power, start_percent, end_percent):
+    if start_percent is None or end_percent is None:
+        return no_update
+    table = get_charge_table()
+    levels, matrix = charge_time_matrix(table, phone, charger_power)
+
+    fig = make_subplots(
+        rows=1, cols=2,
+        subplot_titles=(f"Czas ładowania (min): {phone}, {charger_power}W",
+                        f"Czas ładowania (min) od {start_percent}% do {end_percent}%")
+    )
+    fig.add_trace(go.Heatmap(x=levels, y=levels, z=matrix, colorscale='Viridis', coloraxis='coloraxis',
+                             hovertemplate="Od %{y}% do %{x}%: %{z:.1f} min<extra></extra>"), row=1, col=1)
+
+    # Wszystkie telefony i ładowarki dla wybranej pary poziomów
+    start, end = round(start_percent * 10), round(end_percent * 10)
+    pair = table['time'][:, :, end] - table['time'][:, :, start] if start < end else \
+        np.full(table['time'].shape[:2], np.nan)
+    fig.add_trace(go.Heatmap(x=[f"{power}W" for power in table['chargers']], y=table['phones'], z=pair,
+                             coloraxis='coloraxis2', text=np.round(pair, 1), texttemplate="%{text}",
+                             hovertemplate="%{y}, %{x}: %{z:.1f} min<extra></extra>"), row=1, col=2)
+
+    fig.update_xaxes(title_text="Poziom końcowy (%)", row=1, col=1)
+    fig.update_yaxes(title_text="Poziom początkowy (%)", row=1, col=1)
+    fig.update_xaxes(title_text="Ładowarka", row=1, col=2)
+    fig.update_layout(
+        height=500,
+        coloraxis=dict(colorscale='Viridis', colorbar=dict(x=0.45, title="min")),
+        coloraxis2=dict(colorscale='Viridis', colorbar=dict(x=1.0, title="min"))
+    )
+    return fig
+
+
 if __name__ == "__main__":
     app.run_server(debug=True)
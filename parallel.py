@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+# Co ile sekund wątek czekający na wynik z puli sprawdza anulowanie zadania [s]
+POLL_INTERVAL = 0.1
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def default_workers():
+    """Liczba procesów roboczych: zmienna DRONE_SIM_WORKERS lub liczba rdzeni"""
+    return int(os.environ.get('DRONE_SIM_WORKERS', 0)) or os.cpu_count() or 1
+
+
+def get_process_pool():
+    """
+    Wspólna pula procesów do obliczeń numerycznych (tworzona przy pierwszym użyciu)
+
+    Procesy uruchamiane są metodą 'spawn', żeby nie kopiować wątków serwera
+    Dash; importują tylko moduły obliczeniowe, bez aplikacji.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=default_workers(),
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def shutdown_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _cancellable_call(fn, token, args, kwargs):
+    """fn(*args, progress=..., **kwargs) w procesie roboczym - progress przerywa obliczenia, gdy istnieje plik token"""
+    from jobs import JobCancelled
+
+    def progress(fraction):
+        if os.path.exists(token):
+            raise JobCancelled()
+
+    return fn(*args, progress=progress, **kwargs)
+
+
+def run_in_pool(fn, *args, progress=None, **kwargs):
+    """
+    Wykonuje fn(*args, **kwargs) we wspólnej puli procesów i czeka na wynik
+
+    Przy progress (np. Job.report z jobs.py) fn dostaje w procesie roboczym
+    własny progress, a wątek czekający co POLL_INTERVAL wywołuje progress(0.0)
+    jako punkt anulowania. Gdy ten rzuci wyjątek, plik-znacznik w katalogu
+    tymczasowym przerywa obliczenia w procesie roboczym przy jego
+    najbliższym wywołaniu progress - proces nie liczy dalej wyniku, na który
+    nikt nie czeka. Postęp z procesu roboczego nie jest przekazywany.
+    """
+    if progress is None:
+        return get_process_pool().submit(fn, *args, **kwargs).result()
+    token = os.path.join(tempfile.gettempdir(), f"drone-sim-cancel-{uuid.uuid4().hex}")
+    future = get_process_pool().submit(_cancellable_call, fn, token, args, kwargs)
+    future.add_done_callback(lambda _: _remove(token))
+    try:
+        while True:
+            try:
+                return future.result(timeout=POLL_INTERVAL)
+            except TimeoutError:
+                progress(0.0)
+    except BaseException:
+        if not future.cancel() and not future.done():
+            open(token, 'w').close()
+            if future.done():
+                _remove(token)
+        raise
@@ -0,0 +1,114 @@
+import numpy as np
+
+from metrics import DEFAULT_TOLERANCE, step_response_metrics
+from simulation import G, Drone, simulate_batch
+
+# Domyślne rozkłady niepewności: nazwa -> (rozkład, parametry)
+#   mass_factor - mnożnik masy (ładunek, np. ±10%)
+#   thrust_factor - mnożnik maksymalnego ciągu (spadek napięcia baterii)
+#   noise_std - odchylenie standardowe szumu pomiaru wysokości [m]
+#   disturbance_force - skok siły zewnętrznej jako ułamek ciężaru drona
+#   disturbance_time - chwila wystąpienia skoku siły [s]
+DEFAULT_UNCERTAINTY = {
+    'mass_factor': ('normal', 1.0, 0.1),
+    'thrust_factor': ('uniform', 0.85, 1.0),
+    'noise_std': ('fixed', 0.01),
+    'disturbance_force': ('uniform', -0.2, 0.2),
+    'disturbance_time': ('uniform', 10.0, 40.0),
+}
+
+# Liczba członków zespołu symulowanych razem (ogranicza pamięć na szum i zakłócenia)
+CHUNK_SIZE = 500
+
+# Co który krok zapisywany jest przebieg do pasm percentylowych
+BAND_STRIDE = 10
+
+PERCENTILES = (5, 50, 95)
+
+
+def sample(spec, rng, n):
+    """Próbka n wartości z rozkładu opisanego krotką (rozkład, parametry...)"""
+    kind, *params = spec
+    if kind == 'fixed':
+        return np.full(n, float(params[0]))
+    if kind == 'normal':
+        return rng.normal(params[0], params[1], n)
+    if kind == 'uniform':
+        return rng.uniform(params[0], params[1], n)
+    if kind == 'lognormal':
+        return rng.lognormal(params[0], params[1], n)
+    raise ValueError(f"Nieznany rozkład: {kind!r}")
+
+
+def sample_ensemble(drone, n, uncertainty=None, seed=0):
+    """Losowanie parametrów zespołu Monte Carlo (słownik tablic długości n)"""
+    uncertainty = dict(DEFAULT_UNCERTAINTY, **(uncertainty or {}))
+    rng = np.random.default_rng(seed)
+    members = {name: sample(spec, rng, n) for name, spec in uncertainty.items()}
+    # Masa i ciąg muszą pozostać dodatnie
+    members['mass'] = drone.mass * np.maximum(members.pop('mass_factor'), 0.05)
+    members['max_thrust'] = drone.max_thrust * np.maximum(members.pop('thrust_factor'), 0.0)
+    members['noise_std'] = np.maximum(members['noise_std'], 0.0)
+    members['disturbance_force'] = members['disturbance_force'] * members['mass'] * G
+    return members
+
+
+def monte_carlo(drone, target_height, initial_height, Kp, Ti, Td, n=1000, uncertainty=None, seed=0,
+                duration=60, dt=0.01, settling_spec=None, tolerance=DEFAULT_TOLERANCE,
+                chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Analiza odporności nastaw PID metodą Monte Carlo
+
+    Zespół n wariantów drona (masa, ciąg, szum pomiaru, skok zakłócenia) jest
+    symulowany wektorowo w paczkach po chunk_size. Metryki liczone są na pełnej
+    rozdzielczości, a do pasm percentylowych zapisywana jest co BAND_STRIDE-ta
+    próbka.
+
+    settling_spec: wymagany czas ustalania [s]; None oznacza tylko wejście do
+    tunelu ±tolerance przed końcem symulacji.
+
+    Zwraca: słownik z osią czasu pasm, percentylami wysokości i ciągu,
+    prawdopodobieństwem spełnienia wymagań i metrykami członków zespołu.
+    """
+    members = sample_ensemble(drone, n, uncertainty, seed)
+    noise_rng = np.random.default_rng([seed, 1])
+
+    t = np.arange(0, duration, dt)
+    h_bands = []
+    u_bands = []
+    settling_times = []
+    overshoots = []
+    for start in range(0, n, chunk_size):
+        part = slice(start, min(start + chunk_size, n))
+        drones = [Drone(drone.name, mass, max_thrust)
+                  for mass, max_thrust in zip(members['mass'][part], members['max_thrust'][part])]
+        count = len(drones)
+        disturbance = np.where(t >= members['disturbance_time'][part, None],
+                               members['disturbance_force'][part, None], 0.0)
+        sensor_noise = noise_rng.standard_normal((count, len(t))) * members['noise_std'][part, None]
+
+        t, h, u = simulate_batch(drones, target_height, initial_height, Kp, Ti, Td, duration=duration, dt=dt,
+                                 disturbance=disturbance, sensor_noise=sensor_noise)
+        metrics = step_response_metrics(t, h, target_height, initial_height, tolerance=tolerance)
+        settling_times.append(metrics['settling_time'])
+        overshoots.append(metrics['overshoot_percent'])
+        h_bands.append(h[:, ::BAND_STRIDE].astype(np.float32))
+        u_bands.append(u[:, ::BAND_STRIDE].astype(np.float32))
+        if progress is not None:
+            progress(part.stop / n)
+
+    settling_times = np.concatenate(settling_times)
+    meets_spec = ~np.isnan(settling_times)
+    if settling_spec is not None:
+        meets_spec &= settling_times <= settling_spec
+
+    return {
+        't': t[::BAND_STRIDE],
+        'percentiles': PERCENTILES,
+        'height': np.percentile(np.concatenate(h_bands), PERCENTILES, axis=0),
+        'thrust': np.percentile(np.concatenate(u_bands), PERCENTILES, axis=0),
+        'probability': float(meets_spec.mean()),
+        'settling_time': settling_times,
+        'overshoot_percent': np.concatenate(overshoots),
+        'members': members,
+    }
@@ -0,0 +1,572 @@
+import re
+import threading
+from collections.abc import Mapping
+from itertools import repeat
+
+import numpy as np
+
+# Przyspieszenie ziemskie [m/s^2]
+G = 9.81
+
+# Metody zapobiegania nasyceniu całki (opcja anti_windup)
+ANTI_WINDUP = ('clamp', 'back_calculation')
+
+# Co ile kroków pętle symulacji wywołują progress (punkt anulowania długich przebiegów)
+PROGRESS_STEPS = 2000
+
+
+class Drone:
+    def __init__(self, name, mass, max_thrust):
+        self.name = name
+        self.mass = mass  # kg
+        self.max_thrust = max_thrust  # N
+
+
+class DroneArray:
+    """Paczka dronów jako tablice parametrów (do symulacji wektorowej)"""
+
+    def __init__(self, names, mass, max_thrust):
+        self.names = list(names)
+        self.mass = np.asarray(mass, dtype=float)
+        self.max_thrust = np.asarray(max_thrust, dtype=float)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        for name, mass, max_thrust in zip(self.names, self.mass.tolist(), self.max_thrust.tolist()):
+            yield Drone(name, mass, max_thrust)
+
+
+# Domyślna etykieta drona - niesie pełną definicję, więc każdy proces serwera odtworzy z niej drona
+DRONE_LABEL = "{name} (masa: {mass:.12g} kg, max ciąg: {max_thrust:.12g} N)"
+_LABEL_PATTERN = re.compile(r"^(?P<name>.+) \(masa: (?P<mass>[0-9.e+-]+) kg, max ciąg: (?P<max_thrust>[0-9.e+-]+) N\)$")
+
+
+def parse_label(label):
+    """Dron odtworzony z etykiety w formacie DRONE_LABEL (KeyError, gdy etykieta jest niepoprawna)"""
+    match = _LABEL_PATTERN.match(label) if isinstance(label, str) else None
+    try:
+        mass, max_thrust = float(match['mass']), float(match['max_thrust'])
+    except (TypeError, ValueError):
+        raise KeyError(f"Nieznany dron: {label!r}") from None
+    if not (mass > 0 and max_thrust > 0 and np.isfinite(mass) and np.isfinite(max_thrust)):
+        raise KeyError(f"Nieznany dron: {label!r}")
+    return Drone(match['name'], mass, max_thrust)
+
+
+class DroneRegistry(Mapping):
+    """
+    Rejestr dronów: etykieta -> Drone, z parametrami trzymanymi w tablicach
+
+    Masa i ciąg wszystkich dronów są w ciągłych tablicach NumPy, a etykiety
+    i krótkie nazwy w słowniku indeksów, więc wyszukiwanie i wybór paczki
+    do symulacji (select) nie zależą od liczby zarejestrowanych dronów.
+
+    Nieznana etykieta w formacie DRONE_LABEL daje drona odtworzonego
+    z etykiety przy każdym odczycie (parse_label), bez rejestracji - dron
+    dodany przez użytkownika działa w każdym procesie serwera, a etykiety
+    z żądań nie powiększają wspólnego rejestru. Iteracja i len obejmują
+    tylko drony zarejestrowane.
+    """
+
+    def __init__(self, drones=None):
+        self._labels = []
+        self._names = []
+        self._index = {}
+        self._mass = np.empty(8)
+        self._max_thrust = np.empty(8)
+        self._lock = threading.Lock()
+        for label, drone in (drones or {}).items():
+            self.add(drone.name, drone.mass, drone.max_thrust, label)
+
+    def add(self, name, mass, max_thrust, label=None):
+        """Rejestruje drona i zwraca jego etykietę (domyślnie z nazwy i parametrów)"""
+        if mass <= 0 or max_thrust <= 0:
+            raise ValueError("Masa i maksymalny ciąg muszą być dodatnie")
+        if label is None:
+            label = DRONE_LABEL.format(name=name, mass=mass, max_thrust=max_thrust)
+        with self._lock:
+            if label in self._index:
+                raise ValueError(f"Dron {label!r} jest już zarejestrowany")
+            self._append(label, name, mass, max_thrust)
+        return label
+
+    def _append(self, label, name, mass, max_thrust):
+        row = len(self._labels)
+        if row == len(self._mass):
+            # Tablice rosną geometrycznie - dopisanie drona ma koszt zamortyzowany O(1)
+            self._mass = np.resize(self._mass, 2 * row)
+            self._max_thrust = np.resize(self._max_thrust, 2 * row)
+        self._mass[row] = mass
+        self._max_thrust[row] = max_thrust
+        self._labels.append(label)
+        self._names.append(name)
+        self._index[label] = row
+        self._index.setdefault(name, row)
+        return row
+
+    def index(self, key):
+        """Wiersz zarejestrowanego drona po etykiecie lub krótkiej nazwie"""
+        try:
+            return self._index[key]
+        except (KeyError, TypeError):
+            raise KeyError(f"Nieznany dron: {key!r}") from None
+
+    def __getitem__(self, label):
+        try:
+            row = self.index(label)
+        except KeyError:
+            return parse_label(label)
+        return Drone(self._names[row], float(self._mass[row]), float(self._max_thrust[row]))
+
+    def __iter__(self):
+        return iter(list(self._labels))
+
+    def __len__(self):
+        return len(self._labels)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def select(self, keys):
+        """Paczka dronów (DroneArray) dla listy etykiet lub nazw - zarejestrowane jednym indeksowaniem tablic"""
+        keys = list(keys)
+        rows = [self._index.get(key) if isinstance(key, str) else None for key in keys]
+        if None in rows:
+            # Drony z etykiet (np. drony użytkownika) odtwarzane tylko na potrzeby tego wywołania
+            drones = [self[key] for key in keys]
+            return DroneArray([drone.name for drone in drones], [drone.mass for drone in drones],
+                              [drone.max_thrust for drone in drones])
+        count = len(self._labels)
+        return DroneArray([self._names[row] for row in rows], self._mass[:count][rows],
+                          self._max_thrust[:count][rows])
+
+
+# Definicja popularnych dronów
+DRONES = DroneRegistry({
+    f"DJI Mini 2 (masa: 0.249 kg, max ciąg: 10 N)": Drone("DJI Mini 2", 0.249, 10),
+    f"DJI Mavic 3 (masa: 0.895 kg, max ciąg: 30 N)": Drone("DJI Mavic 3", 0.895, 30),
+    f"DJI Matrice 300 RTK (masa: 3.6 kg, max ciąg: 100 N)": Drone("DJI Matrice 300 RTK", 3.6, 100)
+})
+
+
+def create_system_equations(drone):
+    def system(state, t, u):
+        h, v = state
+        dv = (u - drone.mass * G) / drone.mass
+        dh = v
+        return [dh, dv]
+
+    return system
+
+
+def make_zoh_stepper(drone, dt):
+    """
+    Dokładny krok dyskretny (ZOH) dla modelu wysokości
+
+    Model z create_system_equations to podwójny integrator, a ciąg jest
+    stały w obrębie kroku, więc przyspieszenie jest stałe i rozwiązanie
+    ma postać zamkniętą - bez wywoływania solvera.
+    """
+    mass = drone.mass
+
+    def step(h, v, u):
+        a = u / mass - G
+        return h + v * dt + 0.5 * a * dt * dt, v + a * dt
+
+    return step
+
+
+def make_odeint_stepper(drone, dt):
+    """Krok referencyjny przez scipy.integrate.odeint (do sprawdzania wyników)"""
+    # Import leniwy - scipy.integrate potrzebny jest tylko w trybie referencyjnym
+    from scipy.integrate import odeint
+
+    system = create_system_equations(drone)
+    span = [0, dt]
+
+    def step(h, v, u):
+        state = odeint(system, [h, v], span, args=(u,))
+        return state[-1, 0], state[-1, 1]
+
+    return step
+
+
+# Dostępne metody całkowania: nazwa -> fabryka funkcji kroku (drone, dt)
+INTEGRATORS = {
+    'zoh': make_zoh_stepper,
+    'odeint': make_odeint_stepper,
+}
+
+
+def get_stepper(integrator, drone, dt):
+    """Zwraca funkcję kroku step(h, v, u) -> (h, v) dla podanej metody"""
+    if callable(integrator):
+        return integrator(drone, dt)
+    try:
+        factory = INTEGRATORS[integrator]
+    except KeyError:
+        raise ValueError(f"Nieznana metoda całkowania: {integrator!r} "
+                         f"(dostępne: {', '.join(INTEGRATORS)})") from None
+    return factory(drone, dt)
+
+
+def _check_anti_windup(anti_windup):
+    if anti_windup is not None and anti_windup not in ANTI_WINDUP:
+        raise ValueError(f"Nieznana metoda anti-windup: {anti_windup!r} (dostępne: {', '.join(ANTI_WINDUP)})")
+
+
+def _filter_coefficient(Td, dt, derivative_filter):
+    """Współczynnik filtru pochodnej alpha = Tf / (Tf + dt), Tf = Td / N (0 - bez filtru)"""
+    if derivative_filter is None:
+        return np.zeros_like(Td) if isinstance(Td, np.ndarray) else 0.0
+    if derivative_filter <= 0:
+        raise ValueError("Współczynnik filtru pochodnej N musi być dodatni")
+    Tf = Td / derivative_filter
+    return Tf / (Tf + dt)
+
+
+def _tracking_time(Ti, Td):
+    """Stała czasowa śledzenia dla anti-windup przez obliczenie wsteczne (reguła sqrt(Ti Td))"""
+    return np.where(Td > 0, np.sqrt(Ti * np.maximum(Td, 0)), Ti) if isinstance(Ti, np.ndarray) else (
+        (Ti * Td) ** 0.5 if Td > 0 else Ti)
+
+
+class PIDController:
+    """
+    Dyskretny regulator PID z obcięciem ciągu do [0, max_thrust] - jedno prawo sterowania dla wszystkich silników
+
+    Uchyb całkowany jest metodą prostokątów, pochodna to różnica wsteczna
+    uchybu (opcjonalnie przez filtr pierwszego rzędu). Nastawy mogą być
+    skalarami albo tablicami 1D (paczka scenariuszy) - wtedy stan
+    regulatora też jest tablicą, a obcięcie i anti-windup działają
+    element po elemencie.
+
+    Parametry:
+    derivative_filter: N filtru pochodnej (Tf = Td / N), None - bez filtru
+    anti_windup: None, 'clamp' (całkowanie warunkowe) lub 'back_calculation'
+        (obliczenie wsteczne ze stałą śledzenia sqrt(Ti Td))
+    integral, prev_error: stan początkowy (całka uchybu i uchyb poprzedniego kroku)
+    """
+
+    __slots__ = ('Kp', 'Ti', 'Td', 'dt', 'max_thrust', 'derivative_filter', 'anti_windup', 'integral',
+                 'prev_error', 'derivative', 'u_raw', '_alpha', '_tracking', '_vector')
+
+    def __init__(self, Kp, Ti, Td, dt, max_thrust, derivative_filter=None, anti_windup=None, integral=0.0,
+                 prev_error=0.0):
+        _check_anti_windup(anti_windup)
+        self.dt = dt
+        self.max_thrust = max_thrust
+        self.derivative_filter = derivative_filter
+        self.anti_windup = anti_windup
+        self._vector = isinstance(Kp, np.ndarray)
+        self.integral = np.array(integral, dtype=float) if self._vector else integral
+        self.prev_error = prev_error
+        self.derivative = 0.0
+        self.u_raw = None
+        self.retune(Kp, Ti, Td)
+
+    def retune(self, Kp, Ti, Td):
+        """Nowe nastawy od bieżącego stanu (bez zerowania całki i pochodnej)"""
+        self.Kp, self.Ti, self.Td = Kp, Ti, Td
+        self._alpha = None if self.derivative_filter is None else \
+            _filter_coefficient(Td, self.dt, self.derivative_filter)
+        self._tracking = 0.0
+        if self.anti_windup == 'back_calculation':
+            if self._vector:
+                with np.errstate(divide='ignore'):
+                    self._tracking = np.where(Kp != 0, self.dt * Ti / (Kp * _tracking_time(Ti, Td)), 0.0)
+            elif Kp:
+                self._tracking = self.dt * Ti / (Kp * _tracking_time(Ti, Td))
+
+    def _clip(self, u):
+        if self._vector:
+            return np.clip(u, 0, self.max_thrust)
+        # Odpowiednik np.clip dla skalara
+        return min(max(u, 0), self.max_thrust)
+
+    def update(self, error):
+        """Ciąg dla uchybu bieżącego kroku (aktualizuje stan; niewycięty ciąg zostaje w u_raw)"""
+        Kp, Ti, Td, dt = self.Kp, self.Ti, self.Td, self.dt
+        if self._alpha is None:
+            derivative = (error - self.prev_error) / dt
+        else:
+            derivative = self._alpha * self.derivative + (1 - self._alpha) * (error - self.prev_error) / dt
+        integral = self.integral + error * dt
+
+        u_raw = Kp * (error + integral / Ti + Td * derivative)
+        # Obcięcie do [0, max_thrust] wpisane w miejscu - to najczęściej wywoływana funkcja symulacji
+        u = np.clip(u_raw, 0, self.max_thrust) if self._vector else min(max(u_raw, 0), self.max_thrust)
+        if self.anti_windup == 'clamp':
+            # Całkowanie zatrzymane tam, gdzie pogłębiałoby nasycenie
+            hold = (u != u_raw) & ((u_raw - u) * error > 0)
+            if self._vector:
+                integral = np.where(hold, self.integral, integral)
+                u = self._clip(Kp * (error + integral / Ti + Td * derivative))
+            elif hold:
+                integral = self.integral
+                u = self._clip(Kp * (error + integral / Ti + Td * derivative))
+        elif self.anti_windup == 'back_calculation':
+            integral = integral + self._tracking * (u - u_raw)
+
+        self.integral = integral
+        self.prev_error = error
+        self.derivative = derivative
+        self.u_raw = u_raw
+        return u
+
+
+def simulate_drone_with_params(drone, target_height, initial_height, Kp, Ti, Td, duration=60, dt=0.01,
+                               integrator='zoh', setpoint=None, environment=None, seed=0,
+                               derivative_filter=None, anti_windup=None, return_velocity=False, progress=None):
+    """
+    Symulacja z podanymi parametrami PID
+
+    setpoint: wysokość zadana w kolejnych krokach (tablica długości n_steps,
+    np. z mission.mission_setpoint); gdy podana, zastępuje target_height.
+    environment: zakłócenia i czujnik (słownik jak
+    disturbances.DEFAULT_ENVIRONMENT), strumienie losowe z ziarna seed.
+    derivative_filter, anti_windup: opcje regulatora (jak w simulate_batch).
+    progress: funkcja progress(fraction) wywoływana co PROGRESS_STEPS
+        kroków (może przerwać obliczenia wyjątkiem, np. jobs.JobCancelled)
+
+    Zwraca: t, h, u, a przy return_velocity=True - t, h, v, u (v - prędkość pionowa)
+    """
+    extended = bool(environment) or derivative_filter is not None or anti_windup is not None
+    if integrator == 'hybrid' and setpoint is None and not extended:
+        # Odcinki bez nasycenia propagowane macierzowo (hybrid.simulate_hybrid)
+        from hybrid import simulate_hybrid
+        return simulate_hybrid(drone, target_height, initial_height, Kp, Ti, Td, duration=duration, dt=dt,
+                               return_velocity=return_velocity, progress=progress)
+
+    t = np.arange(0, duration, dt)
+    h = np.zeros_like(t)
+    v = np.zeros_like(t)
+    u = np.zeros_like(t)
+
+    h[0] = initial_height
+    v[0] = 0
+
+    # Silnik hybrydowy zakłada stałą wartość zadaną - przy harmonogramie krok ZOH
+    step = get_stepper('zoh' if integrator == 'hybrid' else integrator, drone, dt)
+    max_thrust = drone.max_thrust
+    h_i = float(initial_height)
+    v_i = 0.0
+    targets = repeat(target_height) if setpoint is None else np.asarray(setpoint, dtype=float).tolist()
+
+    if extended:
+        from disturbances import environment_streams
+        _simulate_extended(t, h, v, u, targets, Kp, Ti, Td, dt, step, max_thrust,
+                           environment_streams(t, environment, seed), derivative_filter, anti_windup, progress)
+        return (t, h, v, u) if return_velocity else (t, h, u)
+
+    control = PIDController(Kp, Ti, Td, dt, max_thrust).update
+    for i, target in zip(range(1, len(t)), targets):
+        u_i = control(target - h_i)
+        u[i - 1] = u_i
+
+        h_i, v_i = step(h_i, v_i, u_i)
+        h[i] = h_i
+        v[i] = v_i
+        if i % PROGRESS_STEPS == 0 and progress is not None:
+            progress(i / len(t))
+
+    u[-1] = u[-2]
+    return (t, h, v, u) if return_velocity else (t, h, u)
+
+
+def _simulate_extended(t, h, v, u, targets, Kp, Ti, Td, dt, step, max_thrust, streams, derivative_filter,
+                       anti_windup, progress=None):
+    """
+    Pętla simulate_drone_with_params z zakłóceniami, czujnikiem i opcjami regulatora
+
+    Strumienie losowe są już gotowymi tablicami - w pętli tylko się je odczytuje.
+    Wypełnia h, v i u w miejscu.
+    """
+    n_steps = len(t)
+    disturbance = repeat(0.0) if streams['disturbance'] is None else streams['disturbance'].tolist()
+    index = streams['sensor_index']
+    noise = np.zeros(n_steps) if streams['sensor_noise'] is None else streams['sensor_noise']
+    # Szum należy do próbki czujnika - przy podtrzymaniu i opóźnieniu powtarza się razem z nią
+    noise = (noise if index is None else noise[index]).tolist()
+    index = repeat(None) if index is None else index.tolist()
+    quantization = streams['quantization']
+    control = PIDController(Kp, Ti, Td, dt, max_thrust, derivative_filter, anti_windup).update
+
+    h_i = float(h[0])
+    v_i = 0.0
+    # Historia wysokości jako lista floatów - odczyt z tablicy NumPy dawałby wolne skalary np.float64
+    history = [h_i]
+
+    for i, target, force, j, noise_i in zip(range(1, n_steps), targets, disturbance, index, noise):
+        measured = (h_i if j is None else history[j]) + noise_i
+        if quantization:
+            measured = round(measured / quantization) * quantization
+        u_i = control(target - measured)
+        u[i - 1] = u_i
+
+        h_i, v_i = step(h_i, v_i, u_i + force)
+        h[i] = h_i
+        v[i] = v_i
+        history.append(h_i)
+        if i % PROGRESS_STEPS == 0 and progress is not None:
+            progress(i / n_steps)
+
+    u[-1] = u[-2]
+
+
+def drone_arrays(drones, n=None):
+    """
+    Zamienia drona lub listę dronów na tablice (mass, max_thrust)
+
+    Pojedynczy dron jest powielany na n scenariuszy; paczka DroneArray
+    (np. z DRONES.select) zwraca swoje tablice bez kopiowania.
+    """
+    if isinstance(drones, DroneArray):
+        return drones.mass, drones.max_thrust
+    if isinstance(drones, Drone):
+        drones = [drones] * (n or 1)
+    mass = np.array([d.mass for d in drones], dtype=float)
+    max_thrust = np.array([d.max_thrust for d in drones], dtype=float)
+    return mass, max_thrust
+
+
+def simulate_batch(drones, target_height, initial_height, Kp, Ti, Td, duration=60, dt=0.01,
+                   integrator='zoh', disturbance=None, sensor_noise=None, setpoint=None, environment=None,
+                   seed=0, members=None, derivative_filter=None, anti_windup=None, return_velocity=False,
+                   progress=None):
+    """
+    Symulacja wielu scenariuszy naraz (wektorowo wzdłuż osi scenariuszy)
+
+    Parametry:
+    drones: dron lub lista dronów (po jednym na scenariusz)
+    target_height, initial_height, Kp, Ti, Td: skalary lub tablice 1D
+        o długości n_scenarios (są rozgłaszane do wspólnego kształtu)
+    disturbance: dodatkowa siła zewnętrzna [N] działająca w każdym kroku,
+        tablica rozgłaszalna do (n_scenarios, n_steps) (opcjonalnie)
+    sensor_noise: błąd pomiaru wysokości [m] widziany przez regulator,
+        tablica rozgłaszalna do (n_scenarios, n_steps) (opcjonalnie)
+    setpoint: wysokość zadana zmienna w czasie, tablica rozgłaszalna do
+        (n_scenarios, n_steps); gdy podana, zastępuje target_height
+    environment: modele zakłóceń i czujnika (słownik jak
+        disturbances.DEFAULT_ENVIRONMENT), dodawane do disturbance i sensor_noise
+    seed, members: ziarno strumieni losowych i numery scenariuszy
+        (domyślnie 0..n_scenarios-1) - ten sam numer daje ten sam strumień
+        niezależnie od podziału paczki
+    derivative_filter: N filtru pochodnej pierwszego rzędu (Tf = Td / N),
+        None - czysta różnica wsteczna
+    anti_windup: None, 'clamp' (całkowanie warunkowe) lub 'back_calculation'
+        (obliczenie wsteczne ze stałą śledzenia sqrt(Ti Td))
+    return_velocity: zwróć też prędkość pionową v
+    progress: funkcja progress(fraction) wywoływana co PROGRESS_STEPS
+        kroków (może przerwać obliczenia wyjątkiem, np. jobs.JobCancelled)
+
+    Zwraca: t (n_steps,), h i u o kształcie (n_scenarios, n_steps),
+    a przy return_velocity=True - t, h, v, u
+    """
+    target_height, initial_height, Kp, Ti, Td = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(x, dtype=float))
+          for x in (target_height, initial_height, Kp, Ti, Td)))
+    n = target_height.shape[0]
+    if not isinstance(drones, Drone) and len(drones) != n:
+        if n != 1:
+            raise ValueError(f"Liczba dronów ({len(drones)}) nie zgadza się z liczbą scenariuszy ({n})")
+        n = len(drones)
+        target_height, initial_height, Kp, Ti, Td = (
+            np.broadcast_to(x, (n,)) for x in (target_height, initial_height, Kp, Ti, Td))
+    mass, max_thrust = drone_arrays(drones, n)
+
+    t = np.arange(0, duration, dt)
+    _check_anti_windup(anti_windup)
+
+    sensor_index = None
+    quantization = 0.0
+    if environment:
+        from disturbances import environment_streams
+        streams = environment_streams(t, environment, seed, np.arange(n) if members is None else members)
+        for name, extra in (('disturbance', disturbance), ('sensor_noise', sensor_noise)):
+            if streams[name] is not None and extra is not None:
+                streams[name] = streams[name] + extra
+            elif extra is not None:
+                streams[name] = extra
+        disturbance, sensor_noise = streams['disturbance'], streams['sensor_noise']
+        sensor_index, quantization = streams['sensor_index'], streams['quantization']
+
+    # Zakłócenia w układzie (n_steps, n_scenarios) - wiersz na krok
+    if disturbance is not None:
+        disturbance = np.ascontiguousarray(np.broadcast_to(disturbance, (n, len(t))).T)
+    if sensor_noise is not None:
+        sensor_noise = np.ascontiguousarray(np.broadcast_to(sensor_noise, (n, len(t))).T)
+    if setpoint is not None:
+        setpoint = np.ascontiguousarray(np.broadcast_to(setpoint, (n, len(t))).T)
+
+    if sensor_index is not None and sensor_noise is not None:
+        # Szum należy do próbki czujnika - przy podtrzymaniu i opóźnieniu powtarza się razem z nią
+        sensor_noise = sensor_noise[sensor_index]
+
+    if integrator != 'zoh':
+        if (disturbance is not None or sensor_noise is not None or setpoint is not None or environment
+                or derivative_filter is not None or anti_windup is not None):
+            raise ValueError("Zakłócenia, szum pomiaru, harmonogram wartości zadanej i opcje regulatora "
+                             "obsługuje tylko integrator 'zoh'")
+        # Tryb referencyjny - pętla skalarna po scenariuszach
+        drone_list = [drones] * n if isinstance(drones, Drone) else list(drones)
+        h = np.empty((n, len(t)))
+        v = np.empty((n, len(t)))
+        u = np.empty((n, len(t)))
+        for k in range(n):
+            _, h[k], v[k], u[k] = simulate_drone_with_params(
+                drone_list[k], target_height[k], initial_height[k], Kp[k], Ti[k], Td[k],
+                duration=duration, dt=dt, integrator=integrator, return_velocity=True)
+            if progress is not None:
+                progress((k + 1) / n)
+        return (t, h, v, u) if return_velocity else (t, h, u)
+
+    # Bufory w układzie (n_steps, n_scenarios), żeby zapis kroku był ciągły w pamięci
+    h = np.empty((len(t), n))
+    u = np.empty((len(t), n))
+    v = np.empty((len(t), n)) if return_velocity else None
+    h[0] = initial_height
+
+    h_i = initial_height.copy()
+    v_i = np.zeros(n)
+    # To samo prawo PID co w simulate_drone_with_params, na tablicach scenariuszy
+    control = PIDController(Kp, Ti, Td, dt, max_thrust, derivative_filter, anti_windup).update
+    sensor_index = None if sensor_index is None else sensor_index.tolist()
+
+    for i in range(1, len(t)):
+        measured = h_i if sensor_index is None else h[sensor_index[i - 1]]
+        if sensor_noise is not None:
+            measured = measured + sensor_noise[i - 1]
+        if quantization:
+            measured = np.round(measured / quantization) * quantization
+        target = target_height if setpoint is None else setpoint[i - 1]
+        u_i = control(target - measured)
+        u[i - 1] = u_i
+
+        # Krok ZOH podwójnego integratora (jak w make_zoh_stepper)
+        force = u_i if disturbance is None else u_i + disturbance[i - 1]
+        a = force / mass - G
+        h_i = h_i + v_i * dt + 0.5 * a * dt * dt
+        v_i = v_i + a * dt
+        h[i] = h_i
+        if v is not None:
+            v[i] = v_i
+        if i % PROGRESS_STEPS == 0 and progress is not None:
+            progress(i / len(t))
+
+    u[-1] = u[-2]
+    if v is not None:
+        v[0] = 0.0
+        return t, np.ascontiguousarray(h.T), np.ascontiguousarray(v.T), np.ascontiguousarray(u.T)
+    return t, np.ascontiguousarray(h.T), np.ascontiguousarray(u.T)
+
+
+def find_drone(name):
+    """Dron z rejestru DRONES po kluczu (etykiecie) lub krótkiej nazwie"""
+    return DRONES[name]
@@ -0,0 +1,208 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from simulation import G, PIDController
+
+# Długość fragmentu przebiegu zwracanego przez generator [kroki]
+CHUNK_STEPS = 50
+
+# Pojemność bufora historii [próbki] - przy dt=0.01 to ostatnie 2 minuty lotu
+HISTORY_SAMPLES = 12000
+
+# Ograniczenia odświeżania na żywo: najwyżej tyle fragmentów na jedno odpytanie
+MAX_CHUNKS_PER_POLL = 40
+
+# Sesje na żywo: limit liczby i czas bezczynności, po którym są usuwane [s]
+MAX_LIVE_SESSIONS = 64
+LIVE_IDLE_TIMEOUT = 600
+
+STREAM_FIELDS = ('t', 'h', 'u', 'target')
+
+
+def stream_simulation(drone, initial_height, target_height, Kp, Ti, Td, dt=0.01, chunk_steps=CHUNK_STEPS):
+    """
+    Symulacja jako generator kolejnych fragmentów przebiegu
+
+    Każdy next() / send() zwraca słownik tablic (t, h, u, target) długości
+    chunk_steps. Przez send(zmiany) można w trakcie lotu zmienić wysokość
+    zadaną lub nastawy (klucze target_height, Kp, Ti, Td) - obowiązują od
+    bieżącego stanu, bez restartu od t=0. Krok jest ten sam co w
+    simulate_drone_with_params (ZOH, ciąg obcięty do [0, max_thrust]).
+    """
+    mass = drone.mass
+    max_thrust = drone.max_thrust
+    h_i = float(initial_height)
+    v_i = 0.0
+    pid = PIDController(Kp, Ti, Td, dt, max_thrust)
+    step = 0
+    while True:
+        t = (step + np.arange(chunk_steps)) * dt
+        h = np.empty(chunk_steps)
+        u = np.empty(chunk_steps)
+        control = pid.update
+        for i in range(chunk_steps):
+            u_i = control(target_height - h_i)
+
+            h[i] = h_i
+            u[i] = u_i
+            a = u_i / mass - G
+            h_i, v_i = h_i + v_i * dt + 0.5 * a * dt * dt, v_i + a * dt
+        step += chunk_steps
+
+        changes = yield {'t': t, 'h': h, 'u': u, 'target': np.full(chunk_steps, float(target_height))}
+        if changes:
+            new_target = changes.get('target_height', target_height)
+            if new_target != target_height:
+                # Zmiana wartości zadanej przesuwa też uchyb poprzedniego kroku, żeby
+                # człon różniczkujący nie dostał skoku (pochodna liczona jak z pomiaru)
+                pid.prev_error = pid.prev_error + new_target - target_height
+                target_height = new_target
+            pid.retune(changes.get('Kp', pid.Kp), changes.get('Ti', pid.Ti), changes.get('Td', pid.Td))
+
+
+class RingBuffer:
+    """Bufor ostatnich capacity próbek kilku pól (stała pamięć niezależnie od długości lotu)"""
+
+    def __init__(self, capacity, fields=STREAM_FIELDS):
+        self.capacity = capacity
+        self._data = {name: np.empty(capacity) for name in fields}
+        self._next = 0
+        self.total = 0
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def extend(self, chunk):
+        n = len(next(iter(chunk.values())))
+        if n >= self.capacity:
+            # Fragment dłuższy niż bufor - zostaje tylko jego koniec
+            chunk = {name: values[-self.capacity:] for name, values in chunk.items()}
+            self.total += n - self.capacity
+            n = self.capacity
+        end = self._next + n
+        for name, values in chunk.items():
+            data = self._data[name]
+            if end <= self.capacity:
+                data[self._next:end] = values
+            else:
+                split = self.capacity - self._next
+                data[self._next:] = values[:split]
+                data[:end - self.capacity] = values[split:]
+        self._next = end % self.capacity
+        self.total += n
+
+    def view(self):
+        """Zawartość bufora w kolejności czasu (kopie tablic)"""
+        if self.total < self.capacity:
+            return {name: data[:self.total].copy() for name, data in self._data.items()}
+        return {name: np.concatenate([data[self._next:], data[:self._next]]) for name, data in self._data.items()}
+
+
+class LiveSimulation:
+    """
+    Symulacja na żywo jednej sesji: generator fragmentów, bufor historii i zegar
+
+    advance() dosymulowuje tyle fragmentów, ile wynika z upływu czasu
+    rzeczywistego pomnożonego przez speed (ograniczone MAX_CHUNKS_PER_POLL,
+    więc opóźnione odpytanie nie blokuje serwera).
+    """
+
+    def __init__(self, drone, initial_height, target_height, Kp, Ti, Td, dt=0.01, speed=1.0,
+                 chunk_steps=CHUNK_STEPS, history=HISTORY_SAMPLES):
+        self.dt = dt
+        self.speed = speed
+        self.chunk_steps = chunk_steps
+        self.buffer = RingBuffer(history)
+        self.last_access = time.monotonic()
+        self._generator = stream_simulation(drone, initial_height, target_height, Kp, Ti, Td, dt, chunk_steps)
+        self._pending = {}
+        self._sim_time = 0.0
+        self._clock = None
+        self._lock = threading.Lock()
+
+    @property
+    def sim_time(self):
+        return self._sim_time
+
+    def update(self, **changes):
+        """Zmiany wysokości zadanej lub nastaw - wchodzą w życie z następnym fragmentem"""
+        with self._lock:
+            self._pending.update(changes)
+
+    def advance(self, now=None):
+        """Nowe próbki od ostatniego wywołania (słownik tablic, może być pusty)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.last_access = time.monotonic()
+            if self._clock is None:
+                self._clock = now
+                chunks = 1
+            else:
+                due = (now - self._clock) * self.speed
+                chunks = min(int(due / (self.chunk_steps * self.dt)), MAX_CHUNKS_PER_POLL)
+                if chunks == MAX_CHUNKS_PER_POLL:
+                    # Zaległości ponad limit są porzucane - symulacja zwalnia zamiast nadganiać
+                    self._clock = now
+                else:
+                    self._clock += chunks * self.chunk_steps * self.dt / self.speed
+
+            parts = []
+            for _ in range(chunks):
+                if self._sim_time == 0:
+                    # Pierwszy fragment uruchamia generator - zmiany czekają na kolejny
+                    parts.append(next(self._generator))
+                else:
+                    changes, self._pending = self._pending, {}
+                    parts.append(self._generator.send(changes or None))
+                self._sim_time += self.chunk_steps * self.dt
+            if not parts:
+                return {name: np.empty(0) for name in STREAM_FIELDS}
+            chunk = {name: np.concatenate([part[name] for part in parts]) for name in STREAM_FIELDS}
+            self.buffer.extend(chunk)
+            return chunk
+
+
+class LiveSessions:
+    """Rejestr symulacji na żywo (po jednej na sesję), z limitem liczby i usuwaniem bezczynnych"""
+
+    def __init__(self, max_sessions=MAX_LIVE_SESSIONS, idle_timeout=LIVE_IDLE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def start(self, session_id, *args, **kwargs):
+        live = LiveSimulation(*args, **kwargs)
+        with self._lock:
+            self._sessions.pop(session_id, None)
+            self._sessions[session_id] = live
+            self._prune()
+        return live
+
+    def get(self, session_id):
+        with self._lock:
+            live = self._sessions.get(session_id)
+            if live is not None:
+                self._sessions.move_to_end(session_id)
+            return live
+
+    def stop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _prune(self):
+        now = time.monotonic()
+        for session_id, live in list(self._sessions.items()):
+            if now - live.last_access > self.idle_timeout:
+                del self._sessions[session_id]
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+
+LIVE = LiveSessions()
@@ -0,0 +1,112 @@
+import math
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from cache import ResultCache, simulation_key
+from metrics import step_response_metrics
+from parallel import get_process_pool
+from simulation import simulate_batch
+from tuning import GAIN_STEP
+
+# Metryki liczone dla każdej komórki siatki
+SWEEP_METRICS = ('settling_time', 'overshoot_percent', 'saturation_fraction')
+
+# Liczba komórek symulowanych razem w jednym zadaniu puli
+CHUNK_SIZE = 256
+
+# Pamięć podręczna komórek (tylko RAM - jeden plik na komórkę byłby zbyt kosztowny)
+SWEEP_CACHE = ResultCache(max_bytes=32 * 1024 * 1024)
+
+
+def grid_axis(low, high, n):
+    """
+    Oś siatki nastaw zaczepiona na wielokrotnościach swojego kroku
+
+    Krok jest zaokrąglany do kroku suwaków, a punkty leżą na wielokrotnościach
+    kroku liczonych od zera - przesunięcie zakresu trafia w te same komórki,
+    więc wyniki z pamięci podręcznej mogą być ponownie użyte. Zagęszczenie
+    siatki używa starych komórek, gdy nowy krok dzieli poprzedni. Zakres
+    zdegenerowany (low == high) daje jednopunktową oś [low].
+
+    Wyjątek ValueError, gdy zakres nie zawiera żadnej dodatniej nastawy.
+    """
+    if low == high and low > 0:
+        return np.array([round(float(low), 9)])
+    spacing = max(GAIN_STEP, round((high - low) / max(n - 1, 1) / GAIN_STEP) * GAIN_STEP)
+    first = max(math.ceil(round(low / spacing, 9)), 1 if low <= 0 else 0)
+    last = math.floor(round(high / spacing, 9))
+    if last < first:
+        raise ValueError(f"Zakres nastaw [{low:g}, {high:g}] nie zawiera dodatniej wartości")
+    return np.round(np.arange(first, last + 1) * spacing, 9)
+
+
+def _evaluate_chunk(drone, target_height, initial_height, Kp, Ti, Td, duration, dt):
+    """Symulacja wektorowa fragmentu siatki - uruchamiana w procesie roboczym"""
+    t, h, u = simulate_batch(drone, target_height, initial_height, Kp, Ti, Td, duration=duration, dt=dt)
+    metrics = step_response_metrics(t, h, target_height, initial_height, u=u, max_thrust=drone.max_thrust)
+    return {name: metrics[name] for name in SWEEP_METRICS}
+
+
+def sweep_gains(drone, target_height, initial_height, kp_values, ti_values, td, duration=60, dt=0.01,
+                chunk_size=CHUNK_SIZE, parallel=True, cache=None, progress=None):
+    """
+    Przegląd siatki Kp x Ti przy stałym Td
+
+    Komórki obecne w pamięci podręcznej nie są liczone ponownie; pozostałe
+    dzielone są na fragmenty po chunk_size i symulowane w puli procesów.
+    Funkcja progress(fraction) wywoływana jest po każdym fragmencie (może
+    przerwać obliczenia wyjątkiem, np. jobs.JobCancelled).
+
+    Zwraca: słownik metryk SWEEP_METRICS, każda jako tablica
+    (len(ti_values), len(kp_values)), oraz liczbę policzonych komórek.
+    """
+    cache = SWEEP_CACHE if cache is None else cache
+    kp_grid, ti_grid = np.meshgrid(np.asarray(kp_values, dtype=float), np.asarray(ti_values, dtype=float))
+    kp_flat, ti_flat = kp_grid.ravel(), ti_grid.ravel()
+
+    results = {name: np.full(kp_flat.shape, np.nan) for name in SWEEP_METRICS}
+    keys = [simulation_key(drone, target_height, initial_height, kp, ti, td, duration, dt)
+            for kp, ti in zip(kp_flat, ti_flat)]
+    missing = []
+    for i, key in enumerate(keys):
+        entry = cache.get(key)
+        if entry is None:
+            missing.append(i)
+        else:
+            for name in SWEEP_METRICS:
+                results[name][i] = entry['metrics'][name]
+
+    missing = np.array(missing, dtype=int)
+    chunks = [missing[start:start + chunk_size] for start in range(0, len(missing), chunk_size)]
+    args = [(drone, target_height, initial_height, kp_flat[idx], ti_flat[idx], td, duration, dt)
+            for idx in chunks]
+
+    def store(idx, output):
+        for name in SWEEP_METRICS:
+            results[name][idx] = output[name]
+        for j, i in enumerate(idx):
+            cache.put(keys[i], {'metrics': {name: float(output[name][j]) for name in SWEEP_METRICS}})
+
+    if parallel and len(chunks) > 1:
+        pool = get_process_pool()
+        futures = {pool.submit(_evaluate_chunk, *a): idx for a, idx in zip(args, chunks)}
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                store(futures[future], future.result())
+                if progress is not None:
+                    progress(done / len(chunks))
+        finally:
+            # Przerwanie (np. anulowanie zadania) zwalnia niezaczęte fragmenty
+            for future in futures:
+                future.cancel()
+    else:
+        for done, (a, idx) in enumerate(zip(args, chunks), 1):
+            store(idx, _evaluate_chunk(*a))
+            if progress is not None:
+                progress(done / len(chunks))
+
+    shape = kp_grid.shape
+    grids = {name: values.reshape(shape) for name, values in results.items()}
+    grids['computed'] = len(missing)
+    return grids
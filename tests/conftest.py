@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Moduły aplikacji leżą płasko w katalogu głównym repozytorium
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
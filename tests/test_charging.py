@@ -0,0 +1,53 @@
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('dash', reason="symulator ładowania (old/main.py) wymaga pakietu dash")
+
+# old/main.py wczytywany pod własną nazwą - nie może przesłonić main.py aplikacji drona
+_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'old', 'main.py')
+_spec = importlib.util.spec_from_file_location('old_charging', _PATH)
+charging = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(charging)
+
+LEVEL_PAIRS = [(0, 100), (0, 80), (20, 90), (50, 100), (79, 81)]
+
+
+@pytest.mark.parametrize('phone', list(charging.smartphones))
+@pytest.mark.parametrize('charger_power', charging.CHARGERS)
+def test_closed_form_matches_stepwise(phone, charger_power):
+    for start, end in LEVEL_PAIRS:
+        time, _, _, _, charge = charging.simulate_charging(phone, charger_power, start, end)
+        step_time, _, _, _, step_charge = charging.simulate_charging_stepwise(phone, charger_power, start, end)
+        # Pętla krokowa kończy ładowanie na pełnej minucie (liczba kroków = czas ładowania)
+        assert abs(time[-1] - len(step_time)) < 2.0
+        n = min(len(time), len(step_time))
+        np.testing.assert_allclose(charge[:n], step_charge[:n], rtol=0, atol=1.0)
+
+
+def test_reference_case():
+    time = charging.simulate_charging('iPhone 8', 5, 0, 100)[0]
+    assert len(charging.simulate_charging_stepwise('iPhone 8', 5, 0, 100)[0]) == 137
+    assert time[-1] == pytest.approx(137.26, abs=0.01)
+
+
+def test_time_grid_does_not_change_result():
+    coarse = charging.simulate_charging('iPhone 16', 30, 10, 95, dt=1.0)
+    fine = charging.simulate_charging('iPhone 16', 30, 10, 95, dt=0.1)
+    assert coarse[0][-1] == pytest.approx(fine[0][-1], rel=1e-12)
+    np.testing.assert_allclose(np.interp(coarse[0], fine[0], fine[4]), coarse[4], rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize('start, end', LEVEL_PAIRS)
+def test_charge_curve_from_table_matches_simulation(start, end):
+    table = charging.build_charge_table()
+    for phone in ('iPhone 8', 'iPhone 16'):
+        for charger_power in (5, 30):
+            time, current, power, voltage, charge = charging.charge_curve(table, phone, charger_power, start, end)
+            sim_time, sim_current, _, _, sim_charge = charging.simulate_charging(phone, charger_power, start, end)
+            assert time[0] == 0 and charge[0] == start and charge[-1] == end
+            assert time[-1] == pytest.approx(sim_time[-1], rel=1e-9)
+            np.testing.assert_allclose(np.interp(sim_time, time, charge), sim_charge, rtol=0, atol=0.05)
+            np.testing.assert_allclose(power, current * voltage)
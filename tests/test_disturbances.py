@@ -0,0 +1,45 @@
+import numpy as np
+
+from disturbances import environment_streams, sensor_indices
+from simulation import DRONES, simulate_batch, simulate_drone_with_params
+
+T = np.arange(0, 10, 0.01)
+ENVIRONMENT = {'gust': ('turbulence', 2.0, 0.5), 'noise': ('gaussian', 0.05)}
+
+
+def test_same_seed_same_streams():
+    a = environment_streams(T, ENVIRONMENT, seed=11)
+    b = environment_streams(T, ENVIRONMENT, seed=11)
+    np.testing.assert_array_equal(a['disturbance'], b['disturbance'])
+    np.testing.assert_array_equal(a['sensor_noise'], b['sensor_noise'])
+
+
+def test_different_seed_different_streams():
+    a = environment_streams(T, ENVIRONMENT, seed=11)
+    b = environment_streams(T, ENVIRONMENT, seed=12)
+    assert not np.allclose(a['disturbance'], b['disturbance'])
+    assert not np.allclose(a['sensor_noise'], b['sensor_noise'])
+
+
+def test_member_stream_independent_of_batch_split():
+    whole = environment_streams(T, ENVIRONMENT, seed=5, members=np.arange(8))
+    part = environment_streams(T, ENVIRONMENT, seed=5, members=[6, 3])
+    np.testing.assert_array_equal(part['disturbance'], whole['disturbance'][[6, 3]])
+    np.testing.assert_array_equal(part['sensor_noise'], whole['sensor_noise'][[6, 3]])
+
+
+def test_seeded_simulation_reproducible():
+    drone = DRONES['DJI Mavic 3']
+    runs = [simulate_drone_with_params(drone, 10, 0, 20, 4, 1.5, duration=10, environment=ENVIRONMENT, seed=9)
+            for _ in range(2)]
+    np.testing.assert_array_equal(runs[0][1], runs[1][1])
+    np.testing.assert_array_equal(runs[0][2], runs[1][2])
+    _, h_batch, _ = simulate_batch(drone, 10, 0, [20, 20], 4, 1.5, duration=10, environment=ENVIRONMENT, seed=9)
+    np.testing.assert_allclose(h_batch[0], runs[0][1], rtol=0, atol=1e-9)
+    assert not np.array_equal(h_batch[0], h_batch[1])
+
+
+def test_sensor_indices():
+    assert sensor_indices(100, 0.01) is None
+    index = sensor_indices(10, 0.01, rate=50, latency=0.02)
+    np.testing.assert_array_equal(index, [0, 0, 0, 0, 2, 2, 4, 4, 6, 6])
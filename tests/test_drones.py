@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from simulation import DRONE_LABEL, DRONES, parse_label
+
+
+def test_custom_label_not_registered():
+    count = len(DRONES)
+    labels = [DRONE_LABEL.format(name=f"dron {k}", mass=1 + k / 10, max_thrust=40) for k in range(1000)]
+    drones = [DRONES[label] for label in labels]
+    assert len(DRONES) == count
+    assert drones[5].name == "dron 5" and drones[5].mass == pytest.approx(1.5) and drones[5].max_thrust == 40
+    assert all(label in DRONES for label in labels)
+
+
+def test_select_mixes_registered_and_custom():
+    builtin = list(DRONES)[1]
+    custom = DRONE_LABEL.format(name="własny", mass=2.5, max_thrust=60)
+    batch = DRONES.select([builtin, custom, builtin])
+    assert batch.names == [DRONES[builtin].name, "własny", DRONES[builtin].name]
+    np.testing.assert_array_equal(batch.mass, [DRONES[builtin].mass, 2.5, DRONES[builtin].mass])
+    np.testing.assert_array_equal(batch.max_thrust, [DRONES[builtin].max_thrust, 60, DRONES[builtin].max_thrust])
+
+
+@pytest.mark.parametrize('label', [
+    'nieznany',
+    'x (masa: -1 kg, max ciąg: 10 N)',
+    'x (masa: 1 kg, max ciąg: 0 N)',
+    'x (masa: nan kg, max ciąg: 10 N)',
+    None,
+])
+def test_invalid_labels(label):
+    assert label not in DRONES
+    with pytest.raises(KeyError):
+        DRONES[label]
+    with pytest.raises(KeyError):
+        parse_label(label)
@@ -0,0 +1,108 @@
+import io
+
+import numpy as np
+import pytest
+
+from export import comparison_export, csv_chunks, scenario_export
+from simulation import DRONES, simulate_batch, simulate_drone_with_params
+
+LABELS = list(DRONES)
+
+
+@pytest.mark.parametrize('integrator', ['hybrid', 'zoh'])
+def test_scenario_export_has_simulated_velocity(integrator):
+    drone = DRONES[LABELS[0]]
+    export = scenario_export(drone, 10, 0, 60, 2, 0.5, duration=20, integrator=integrator)
+    (_, columns), = export['runs']
+    _, h, v, u = simulate_drone_with_params(drone, 10, 0, 60, 2, 0.5, duration=20, return_velocity=True)
+    np.testing.assert_allclose(columns['h'], h, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(columns['v'], v, rtol=0, atol=1e-9)
+
+
+def test_adaptive_export_velocity_from_dense_output():
+    from adaptive import simulate_adaptive
+
+    drone = DRONES[LABELS[1]]
+    export = scenario_export(drone, 10, 0, 20, 4, 1.5, duration=20, integrator='adaptive', tolerance=1e-4)
+    (_, columns), = export['runs']
+    _, _, v, _, _ = simulate_adaptive(drone, 10, 0, 20, 4, 1.5, duration=20, tolerance=1e-4, return_velocity=True)
+    np.testing.assert_array_equal(columns['v'], v)
+
+
+def test_comparison_export_velocity_matches_batch():
+    export = comparison_export(LABELS[:2], [(20, 4, 1.5), (60, 2, 0.5)], 10, 0, duration=10)
+    _, _, v, _ = simulate_batch([DRONES[LABELS[0]]] * 2 + [DRONES[LABELS[1]]] * 2, 10, 0, [20, 60, 20, 60],
+                                [4, 2, 4, 2], [1.5, 0.5, 1.5, 0.5], duration=10, return_velocity=True)
+    for k, (_, columns) in enumerate(export['runs']):
+        np.testing.assert_array_equal(columns['v'], v[k])
+
+
+def test_csv_round_trip():
+    export = comparison_export(LABELS[:1], [(20, 4, 1.5)], 10, 0, duration=5)
+    text = b''.join(csv_chunks(export, chunk_rows=100)).decode('utf-8')
+    data = np.loadtxt(io.StringIO(text), delimiter=',', comments='#', skiprows=2)
+    (_, columns), = export['runs']
+    np.testing.assert_array_equal(data[:, 3], columns['v'])
+
+
+@pytest.fixture
+def client():
+    flask = pytest.importorskip('flask')
+    from export import register_export_endpoint
+
+    server = flask.Flask(__name__)
+    register_export_endpoint(server)
+    return server.test_client()
+
+
+def _query(**options):
+    return dict({'kind': 'scenario', 'drone': LABELS[0], 'target': 10, 'initial': 0, 'kp': 20, 'ti': 4,
+                 'td': 1.5, 'duration': 5, 'session': 'test'}, **options)
+
+
+@pytest.mark.parametrize('options', [
+    '{not json',
+    '[1, 2]',
+    '"environment"',
+    '{"cache": {}}',
+    '{"environment": {"wind": 3}}',
+    '{"environment": {"gust": ["hurricane", 1]}}',
+    '{"environment": {"gust": ["step", 1]}}',
+    '{"seed": "abc"}',
+    '{"derivative_filter": -1}',
+    '{"anti_windup": "magic"}',
+])
+def test_invalid_options_rejected(client, options):
+    response = client.get('/export', query_string=_query(options=options))
+    assert response.status_code == 400
+    assert response.get_data(as_text=True).startswith('Błąd:')
+
+
+def test_valid_options_accepted(client):
+    options = '{"environment": {"gust": ["step", 2.0, 1.0], "noise": ["gaussian", 0.01]}, "seed": 3, ' \
+              '"anti_windup": "clamp"}'
+    response = client.get('/export', query_string=_query(options=options))
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).splitlines()[1] == 'run,t,h,v,u'
+
+
+@pytest.mark.parametrize('query', [
+    {'dt': 0},
+    {'dt': -0.01},
+    {'dt': 'nan'},
+    {'duration': 'nan'},
+    {'duration': 'inf'},
+    {'duration': 0},
+    {'duration': 1e9},
+    {'kp': 'nan'},
+    {'ti': 0},
+    {'td': 'inf'},
+    {'method': 'adaptive', 'tolerance': 0},
+    {'kind': 'comparison', 'drones': LABELS[0], 'gains': '20 4 1.5', 'dt': 0},
+    {'kind': 'comparison', 'drones': LABELS[0], 'gains': 'nan 4 1.5'},
+    {'kind': 'comparison', 'drones': LABELS[:2], 'gains': '20 4 1.5', 'duration': 20000},
+])
+def test_invalid_run_parameters_rejected(client, query):
+    response = client.get('/export', query_string=_query(**query))
+    assert response.status_code == 400
+    assert response.get_data(as_text=True).startswith('Błąd:')
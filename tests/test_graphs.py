@@ -0,0 +1,68 @@
+import time
+import uuid
+
+import pytest
+
+pytest.importorskip('dash')
+
+from loadtest import CallbackRequests  # noqa: E402
+
+
+class ClientTransport:
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_json()
+
+    def post(self, path, body):
+        response = self.client.post(path, json=body)
+        return response.status_code, response.get_json() if response.status_code == 200 else None
+
+
+@pytest.fixture(scope='module')
+def app():
+    import main
+
+    transport = ClientTransport(main.create_app().server.test_client())
+    return transport, CallbackRequests(transport)
+
+
+def _graphs(app, **values):
+    transport, requests = app
+    values = {f"{name}.value": value for name, value in values.items()}
+    values['session-id.data'] = uuid.uuid4().hex
+    status, response = transport.post('/_dash-update-component', requests.body(
+        requests.find('simulation-graphs.figure'), values, 'sim-dt.value'))
+    assert status == 200
+    return values, response['response']
+
+
+def test_short_run_answers_synchronously(app):
+    _, response = _graphs(app, **{'sim-duration': 60, 'sim-dt': 0.01})
+    assert 'simulation-graphs' in response
+    assert response['graph-poll']['disabled'] is True
+
+
+def test_long_run_goes_to_background_job(app):
+    transport, requests = app
+    values, response = _graphs(app, **{'sim-duration': 300, 'sim-dt': 0.001})
+    assert 'simulation-graphs' not in response
+    assert response['graph-poll']['disabled'] is False
+    values['graph-job.data'] = response['graph-job']['data']
+
+    poll = next(dependency for dependency in requests.dependencies
+                if dependency['inputs'] == [{'id': 'graph-poll', 'property': 'n_intervals'}])
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        status, result = transport.post('/_dash-update-component',
+                                        requests.body(poll, values, 'graph-poll.n_intervals'))
+        assert status == 200
+        if 'simulation-graphs' in result['response']:
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("Zadanie w tle nie zwróciło figury")
+    assert result['response']['graph-poll']['disabled'] is True
+    assert 'kroki: 299999' in result['response']['render-stats']['children']
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JobCancelled, JobManager, JobRejected
+from simulation import DRONES, simulate_drone_with_params
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _spin(progress=None):
+    # Pętla kooperacyjna - kończy się tylko przez anulowanie (albo po 10 s)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        progress(0.5)
+        time.sleep(0.001)
+    return 'koniec'
+
+
+def test_supersede_across_processes(tmp_path):
+    first, second = JobManager(state_dir=tmp_path), JobManager(state_dir=tmp_path)
+    job = first.submit(('sesja', 'sweep'), _spin)
+    assert _wait_for(lambda: job.status == 'running')
+    second.submit(('sesja', 'sweep'), lambda progress=None: 'nowy')
+    assert job.wait(5)
+    assert job.status == 'cancelled'
+
+
+def test_cancel_from_other_process(tmp_path):
+    first, second = JobManager(state_dir=tmp_path), JobManager(state_dir=tmp_path)
+    job = first.submit(('sesja', 'sweep'), _spin)
+    assert _wait_for(lambda: job.status == 'running')
+    second.cancel(job.id)
+    assert job.wait(5)
+    assert job.status == 'cancelled'
+
+
+def test_admission_shared_across_processes(tmp_path):
+    # Bez wątków roboczych zadania zostają w kolejce
+    first = JobManager(max_workers=0, max_session_pending=2, max_pending=3, state_dir=tmp_path)
+    second = JobManager(max_workers=0, max_session_pending=2, max_pending=3, state_dir=tmp_path)
+    first.submit(('a', 'sweep'), _spin)
+    first.submit(('a', 'robustness'), _spin)
+    with pytest.raises(JobRejected):
+        second.submit(('a', 'autotune'), _spin)
+    # Zastąpienie w tym samym kanale zwalnia miejsce poprzedniego zadania
+    second.submit(('a', 'sweep'), _spin)
+    second.submit(('b', 'sweep'), _spin)
+    with pytest.raises(JobRejected):
+        first.submit(('c', 'sweep'), _spin)
+
+
+def test_run_timeout_stops_simulation():
+    manager = JobManager(max_workers=1)
+    stopped = threading.Event()
+
+    def long_run(progress=None):
+        try:
+            return simulate_drone_with_params(DRONES[list(DRONES)[0]], 10, 0, 5, 4, 1.5, duration=10000,
+                                              dt=0.001, progress=progress)
+        finally:
+            stopped.set()
+
+    with pytest.raises(TimeoutError):
+        manager.run(('sesja', 'export'), long_run, timeout=0.2)
+    assert stopped.wait(5)
+    job = manager._channels[('sesja', 'export')]
+    assert job.wait(5) and job.status == 'cancelled'
+
+
+def test_run_passes_progress_and_result():
+    manager = JobManager(max_workers=1)
+
+    def double(x, progress=None):
+        progress(1.0)
+        return x * 2
+
+    def cancelled(progress=None):
+        raise JobCancelled()
+
+    assert manager.run(('sesja', 'compare'), double, 21) == 42
+    with pytest.raises(JobCancelled):
+        manager.run(('sesja', 'compare'), cancelled)
@@ -0,0 +1,24 @@
+import pytest
+
+from mission import EXAMPLE_MISSION, MAX_MISSION_DURATION, parse_mission
+
+
+def test_example_mission_parses():
+    assert len(parse_mission(EXAMPLE_MISSION)) == 6
+
+
+@pytest.mark.parametrize('text', [
+    'hold 1e7',
+    f'step 10 {MAX_MISSION_DURATION}\nhold 1',
+    'hold nan',
+    'step nan 10',
+    'ramp 10 inf',
+    'hold 0',
+])
+def test_invalid_or_too_long_mission_rejected(text):
+    with pytest.raises(ValueError):
+        parse_mission(text)
+
+
+def test_mission_at_duration_limit_accepted():
+    assert parse_mission(f'step 10 {MAX_MISSION_DURATION / 2}\nhold {MAX_MISSION_DURATION / 2}')
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from hybrid import simulate_hybrid
+from simulation import DRONES, simulate_batch, simulate_drone_with_params
+
+GAINS = [(20, 4, 1.5), (60, 2, 0.5), (5, 8, 3)]
+ENVIRONMENT = {'gust': ('turbulence', 2.0, 0.5), 'noise': ('colored', 0.05, 0.2), 'sensor_rate': 20,
+               'latency': 0.03, 'quantization': 0.01}
+
+
+@pytest.fixture(params=list(DRONES))
+def drone(request):
+    return DRONES[request.param]
+
+
+@pytest.mark.parametrize('gains', GAINS)
+def test_zoh_matches_odeint(drone, gains):
+    t, h_zoh, u_zoh = simulate_drone_with_params(drone, 10, 0, *gains, duration=20)
+    _, h_ode, u_ode = simulate_drone_with_params(drone, 10, 0, *gains, duration=20, integrator='odeint')
+    np.testing.assert_allclose(h_zoh, h_ode, rtol=0, atol=1e-7)
+    np.testing.assert_allclose(u_zoh, u_ode, rtol=0, atol=1e-5)
+
+
+@pytest.mark.parametrize('gains', GAINS)
+def test_hybrid_matches_zoh(drone, gains):
+    _, h_zoh, u_zoh = simulate_drone_with_params(drone, 10, 0, *gains, duration=30)
+    _, h_hybrid, u_hybrid = simulate_hybrid(drone, 10, 0, *gains, duration=30)
+    np.testing.assert_allclose(h_hybrid, h_zoh, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(u_hybrid, u_zoh, rtol=0, atol=1e-8)
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'derivative_filter': 10.0},
+    {'anti_windup': 'clamp'},
+    {'anti_windup': 'back_calculation', 'derivative_filter': 5.0},
+    {'environment': ENVIRONMENT, 'seed': 7},
+])
+def test_batch_matches_scalar(options):
+    drones = list(DRONES.values())
+    kp, ti, td = np.array(GAINS, dtype=float).T
+    t, h, u = simulate_batch(drones, [10, 25, 5], [0, 5, 20], kp, ti, td, duration=20, **options)
+    for k, drone in enumerate(drones):
+        # Scenariusz k paczki ma strumień losowy numer k - niezależnie od tego, z kim jest w paczce
+        _, h_k, u_k = simulate_batch(drone, [10, 25, 5][k], [0, 5, 20][k], kp[k], ti[k], td[k], duration=20,
+                                     members=[k], **options)
+        np.testing.assert_array_equal(h[k], h_k[0])
+        np.testing.assert_array_equal(u[k], u_k[0])
+
+
+def test_batch_matches_scalar_loop(drone):
+    options = {'environment': ENVIRONMENT, 'seed': 3, 'anti_windup': 'clamp', 'derivative_filter': 10.0}
+    for gains in GAINS:
+        _, h_scalar, u_scalar = simulate_drone_with_params(drone, 10, 2, *gains, duration=20, **options)
+        _, h_batch, u_batch = simulate_batch(drone, 10, 2, *gains, duration=20, **options)
+        np.testing.assert_allclose(h_batch[0], h_scalar, rtol=0, atol=1e-9)
+        np.testing.assert_allclose(u_batch[0], u_scalar, rtol=0, atol=1e-8)
+
+
+def test_adaptive_reports_difference_to_discrete_model(drone):
+    from adaptive import simulate_adaptive
+
+    t, h, _, info = simulate_adaptive(drone, 10, 0, 20, 4, 1.5, duration=30, reference=True)
+    _, h_ref, _ = simulate_hybrid(drone, 10, 0, 20, 4, 1.5, duration=30)
+    n = min(len(h), len(h_ref))
+    assert info['reference_error'] == pytest.approx(np.max(np.abs(h[:n] - h_ref[:n])))
+    # Model ciągły i dyskretny różnią się, ale przy łagodnych nastawach niewiele
+    assert 0 < info['reference_error'] < 0.05
+
+
+@pytest.mark.parametrize('gains', GAINS)
+def test_velocity_same_in_all_engines(drone, gains):
+    _, _, v_zoh, _ = simulate_drone_with_params(drone, 10, 0, *gains, duration=20, return_velocity=True)
+    _, _, v_hybrid, _ = simulate_hybrid(drone, 10, 0, *gains, duration=20, return_velocity=True)
+    _, _, v_batch, _ = simulate_batch(drone, 10, 0, *gains, duration=20, return_velocity=True)
+    assert v_zoh[0] == 0.0
+    np.testing.assert_allclose(v_hybrid, v_zoh, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(v_batch[0], v_zoh, rtol=0, atol=1e-9)
+
+
+def test_adaptive_velocity_is_derivative_of_height(drone):
+    from adaptive import simulate_adaptive
+
+    t, h, v, _, _ = simulate_adaptive(drone, 10, 0, 20, 4, 1.5, duration=20, return_velocity=True)
+    # Przyrost wysokości w kroku siatki to całka prędkości (reguła trapezów) - z dokładnością
+    # do tolerancji interpolacji (domyślnie 1e-3 m)
+    np.testing.assert_allclose(np.diff(h), np.diff(t) * 0.5 * (v[1:] + v[:-1]), rtol=0, atol=1e-3)
@@ -0,0 +1,137 @@
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from metrics import step_response_metrics
+from parallel import get_process_pool
+from simulation import simulate_batch, simulate_drone_with_params
+
+# Zakresy nastaw - takie jak na suwakach w interfejsie
+GAIN_BOUNDS = {
+    'Kp': (0.1, 100),
+    'Ti': (0.1, 10),
+    'Td': (0.1, 5),
+}
+
+# Krok suwaków - wynik strojenia jest do niego zaokrąglany
+GAIN_STEP = 0.1
+
+# Domyślne wagi funkcji kosztu
+DEFAULT_COST_WEIGHTS = {
+    'settling_time': 1.0,  # s
+    'overshoot': 0.2,  # % skoku
+    'ise': 1.0,  # ISE / skok^2 (s)
+    'saturation_time': 0.1,  # s
+}
+
+
+def tuning_cost(metrics, target_height, initial_height, duration, weights=None):
+    """
+    Ważony koszt odpowiedzi skokowej (skalarnie lub dla paczki metryk)
+
+    Brak wejścia do tunelu karany jest czasem ustalania równym 2 * duration.
+    Przeregulowanie i ISE są normalizowane wielkością skoku, żeby wagi nie
+    zależały od wysokości.
+    """
+    weights = dict(DEFAULT_COST_WEIGHTS, **(weights or {}))
+    step = np.asarray(target_height, dtype=float) - np.asarray(initial_height, dtype=float)
+    span = np.abs(step)
+    direction = np.where(step < 0, -1.0, 1.0)
+
+    settling = np.where(np.isnan(metrics['settling_time']), 2 * duration, metrics['settling_time'])
+    overshoot = np.maximum(direction * (metrics['peak_value'] - target_height), 0) / span * 100
+    cost = (weights['settling_time'] * settling +
+            weights['overshoot'] * overshoot +
+            weights['ise'] * metrics['ise'] / span ** 2 +
+            weights['saturation_time'] * metrics.get('saturation_time', 0))
+    return np.where(np.isfinite(cost), cost, np.inf)
+
+
+def _log_bounds():
+    return [(np.log(low), np.log(high)) for low, high in GAIN_BOUNDS.values()]
+
+
+def _evaluate(log_gains, drone, target_height, initial_height, duration, dt, weights):
+    Kp, Ti, Td = np.exp(log_gains)
+    t, h, u = simulate_drone_with_params(drone, target_height, initial_height, Kp, Ti, Td,
+                                         duration=duration, dt=dt)
+    metrics = step_response_metrics(t, h, target_height, initial_height, u=u, max_thrust=drone.max_thrust)
+    return float(tuning_cost(metrics, target_height, initial_height, duration, weights))
+
+
+def _local_search(x0, drone, target_height, initial_height, duration, dt, weights, maxfev):
+    """Lokalna optymalizacja Neldera-Meada w przestrzeni log(nastaw) - uruchamiana w procesie roboczym"""
+    # Import leniwy - scipy.optimize ładuje się kilkaset ms, a potrzebny jest tylko przy strojeniu
+    from scipy.optimize import minimize
+
+    result = minimize(_evaluate, x0,
+                      args=(drone, target_height, initial_height, duration, dt, weights),
+                      method='Nelder-Mead', bounds=_log_bounds(),
+                      options={'maxfev': maxfev, 'xatol': 1e-3, 'fatol': 1e-3})
+    return result.fun, result.x, result.nfev
+
+
+def _round_gains(gains):
+    rounded = {}
+    for (name, (low, high)), value in zip(GAIN_BOUNDS.items(), gains):
+        rounded[name] = round(float(np.clip(round(value / GAIN_STEP) * GAIN_STEP, low, high)), 6)
+    return rounded
+
+
+def auto_tune(drone, target_height, initial_height, duration=60, dt=0.01, weights=None,
+              n_candidates=64, n_starts=4, maxfev=120, seed=0, parallel=True, progress=None):
+    """
+    Automatyczny dobór nastaw PID (multi-start)
+
+    1. Losowe nastawy (log-równomiernie w GAIN_BOUNDS) są oceniane jednym
+       wywołaniem simulate_batch.
+    2. Z n_starts najlepszych startuje lokalna optymalizacja
+       (scipy.optimize.minimize), każda w osobnym procesie puli.
+
+    Funkcja progress(fraction) wywoływana jest po każdym etapie (może
+    przerwać strojenie wyjątkiem, np. jobs.JobCancelled).
+
+    Zwraca: słownik z nastawami Kp, Ti, Td (zaokrąglonymi do kroku suwaków),
+    kosztem i liczbą symulacji.
+    """
+    if target_height == initial_height:
+        raise ValueError("Wysokość zadana jest równa początkowej - brak skoku do strojenia")
+    weights = dict(DEFAULT_COST_WEIGHTS, **(weights or {}))
+
+    # Przegląd wstępny - wszystkie kandydaty w jednej symulacji wektorowej
+    rng = np.random.default_rng(seed)
+    low, high = np.array(_log_bounds()).T
+    candidates = rng.uniform(low, high, size=(n_candidates, len(GAIN_BOUNDS)))
+    Kp, Ti, Td = np.exp(candidates).T
+    t, h, u = simulate_batch(drone, target_height, initial_height, Kp, Ti, Td, duration=duration, dt=dt)
+    metrics = step_response_metrics(t, h, target_height, initial_height, u=u, max_thrust=drone.max_thrust)
+    costs = tuning_cost(metrics, target_height, initial_height, duration, weights)
+    starts = candidates[np.argsort(costs)[:n_starts]]
+    screening_share = 0.1
+    if progress is not None:
+        progress(screening_share)
+
+    # Lokalne optymalizacje równolegle w puli procesów
+    args = (drone, target_height, initial_height, duration, dt, weights, maxfev)
+    results = []
+    if parallel:
+        pool = get_process_pool()
+        futures = [pool.submit(_local_search, x0, *args) for x0 in starts]
+        try:
+            for future in as_completed(futures):
+                results.append(future.result())
+                if progress is not None:
+                    progress(screening_share + (1 - screening_share) * len(results) / len(starts))
+        finally:
+            for future in futures:
+                future.cancel()
+    else:
+        for x0 in starts:
+            results.append(_local_search(x0, *args))
+            if progress is not None:
+                progress(screening_share + (1 - screening_share) * len(results) / len(starts))
+
+    _, best_x, _ = min(results, key=lambda r: r[0])
+    gains = _round_gains(np.exp(best_x))
+    cost = _evaluate(np.log(list(gains.values())), drone, target_height, initial_height, duration, dt, weights)
+    return dict(gains, cost=cost, evaluations=n_candidates + sum(r[2] for r in results) + 1)
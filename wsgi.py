@@ -0,0 +1,31 @@
+"""
+Punkt wejścia dla serwera produkcyjnego WSGI
+
+Przykład (aplikacja i rozgrzewka raz w procesie nadrzędnym, potem fork):
+    gunicorn --preload --workers 4 --bind 0.0.0.0:8050 wsgi:server
+
+Tryb wieloprocesowy i wielowątkowy (skalowanie poziome):
+    DRONE_SIM_CACHE_DIR=/srv/drone/cache DRONE_SIM_JOB_DIR=/srv/drone/jobs \\
+    gunicorn --preload --workers 4 --worker-class gthread --threads 8 --bind 0.0.0.0:8050 wsgi:server
+
+Callbacki nie trzymają stanu w procesie: stan użytkownika (wysokości,
+własne drony, historia scenariuszy) jest w magazynach dcc.Store sesji
+przeglądarki, a etykiety dronów niosą ich parametry. Wyniki symulacji
+współdzieli katalog DRONE_SIM_CACHE_DIR, a stan zadań w tle -
+DRONE_SIM_JOB_DIR, więc odpytanie o zadanie może trafić do dowolnego
+procesu. Bez DRONE_SIM_JOB_DIR zastępowanie zadań w kanale sesji i limity
+przyjęć działają osobno w każdym procesie - przy wielu procesach katalog
+jest wymagany (blokada pliku jobs.lock, patrz jobs.JobManager). Ciężkie
+obliczenia (zadania w tle, porównania, eksport) czekają w kolejce
+sprawiedliwej między sesjami z kontrolą przyjęć (jobs.py) na
+DRONE_SIM_JOB_WORKERS wątków na proces, więc nie zajmują wątków
+obsługujących interaktywne callbacki. Wyjątkiem jest symulacja na żywo
+(streaming.py) - jej stan żyje w procesie, który ją uruchomił, i wymaga
+przyklejania sesji na balanserze.
+
+Obciążenie sprawdza loadtest.py (N klientów przeciągających suwaki).
+"""
+from main import create_app
+
+app = create_app(warm=True)
+server = app.server